@@ -8,15 +8,20 @@ import httpx
 
 from utils.config import settings
 from utils.logging import logger
+from adapters.http_pool import HttpPool
+from adapters.rate_limit import RequestScheduler, ENDPOINT_ORDER, PRIORITY_DEFAULT, PRIORITY_ORDER, PRIORITY_ACCOUNT
 
 class CoinDCXBaseAdapter:
     BASE_URL = "https://api.coindcx.com"
     PUB_URL = "https://public.coindcx.com"
 
-    def __init__(self, api_key: str | None = None, api_secret: str | None = None):
+    def __init__(self, api_key: str | None = None, api_secret: str | None = None, pool: HttpPool | None = None):
         self.api_key = api_key or settings.COINDCX_API_KEY
         self.api_secret = api_secret or settings.COINDCX_API_SECRET
-        self.client = httpx.Client(timeout=10)
+        # Shared process-wide connection pool; adapters never own their own httpx clients
+        self.pool = pool or HttpPool.instance()
+        self.client: httpx.Client = self.pool.client
+        self.scheduler = RequestScheduler.instance()
 
     def _headers(self, payload: dict | None = None):
         headers = {"Content-Type": "application/json"}
@@ -26,16 +31,37 @@ class CoinDCXBaseAdapter:
             headers.update({"X-AUTH-APIKEY": self.api_key, "X-AUTH-SIGNATURE": signature})
         return headers
 
-    def get(self, path: str, params: dict | None = None, public: bool = False):
+    def get(self, path: str, params: dict | None = None, public: bool = False, priority: int = PRIORITY_DEFAULT):
         url = (self.PUB_URL if public else self.BASE_URL) + path
-        r = self.client.get(url, params=params)
+        endpoint_class = self.scheduler.classify(path, public)
+        r = self.scheduler.execute(endpoint_class, lambda: self.client.get(url, params=params), priority=priority)
         r.raise_for_status()
         return r.json()
 
-    def post(self, path: str, payload: dict):
-        headers = self._headers(payload)
+    async def aget(self, path: str, params: dict | None = None, public: bool = False, priority: int = PRIORITY_DEFAULT):
+        url = (self.PUB_URL if public else self.BASE_URL) + path
+        endpoint_class = self.scheduler.classify(path, public)
+        client = self.pool.async_client()
+        r = await self.scheduler.aexecute(endpoint_class, lambda: client.get(url, params=params), priority=priority)
+        r.raise_for_status()
+        return r.json()
+
+    def post(self, path: str, payload: dict, priority: int | None = None):
         url = self.BASE_URL + path
-        r = self.client.post(url, headers=headers, content=json.dumps(payload))
+        endpoint_class = self.scheduler.classify(path)
+        if priority is None:
+            priority = PRIORITY_ORDER if endpoint_class == ENDPOINT_ORDER else PRIORITY_ACCOUNT
+
+        def send():
+            # Re-stamp and re-sign on every attempt so a retried request is not rejected as stale
+            if "timestamp" in payload:
+                payload["timestamp"] = int(time.time() * 1000)
+            headers = self._headers(payload)
+            return self.client.post(url, headers=headers, content=json.dumps(payload))
+
+        # Order POSTs are not idempotent: only retried when the exchange provably did not process them
+        r = self.scheduler.execute(endpoint_class, send, priority=priority,
+                                   idempotent=endpoint_class != ENDPOINT_ORDER)
         r.raise_for_status()
         return r.json()
 
@@ -1,14 +1,15 @@
 #Description: Futures adapter (stubbed); ensure leverage parameter handling.
 
 from adapters.coindcx_common import CoinDCXBaseAdapter
+from adapters.http_pool import HttpPool
 from utils.logging import logger
 from utils.config import settings
 
 import time
 
 class CoinDCXFuturesAdapter(CoinDCXBaseAdapter):
-    def __init__(self):
-        super().__init__(settings.COINDCX_FUT_API_KEY, settings.COINDCX_FUT_API_SECRET)
+    def __init__(self, pool: HttpPool | None = None):
+        super().__init__(settings.COINDCX_FUT_API_KEY, settings.COINDCX_FUT_API_SECRET, pool=pool)
 
     def test_connectivity(self):
         try:
@@ -65,6 +66,43 @@ class CoinDCXFuturesAdapter(CoinDCXBaseAdapter):
             logger.exception(f"Futures order failed: {e}")
             raise
 
+    def list_orders(self, statuses: tuple = ("open", "partially_filled", "filled", "cancelled", "rejected"),
+                    page: int = 1, size: int = 100) -> list[dict]:
+        """One page of recent futures orders (newest first) with the given statuses."""
+        payload = {
+            "timestamp": int(time.time() * 1000),
+            "status": ",".join(statuses),
+            "page": str(page),
+            "size": str(size),
+            "margin_currency_short_name": ["USDT"],
+        }
+        return self.post("/exchange/v1/derivatives/futures/orders", payload)
+
+    def cancel_order(self, order_id: str) -> dict:
+        if settings.MODE != "live":
+            return {"status": "canceled", "order_id": order_id}
+        res = self.post("/exchange/v1/derivatives/futures/orders/cancel", {"id": order_id, "timestamp": int(time.time() * 1000)})
+        return {"status": "canceled", "order_id": order_id, "message": (res or {}).get("message")}
+
+    def close_position(self, symbol: str, side: str, qty: float, client_id: str) -> dict:
+        """Reduce-only market order against an open position (side is the closing side)."""
+        # WARNING: verify the reduce-only flag name against the CoinDCX futures docs before relying on it.
+        payload = {
+            "timestamp": int(time.time() * 1000),
+            "order": {
+                "side": side.lower(),
+                "pair": symbol,
+                "order_type": "market_order",
+                "total_quantity": qty,
+                "reduce_only": True,
+                "client_order_id": client_id,
+            },
+        }
+        if settings.MODE != "live":
+            return {"status": "filled", "order_id": "SIM-" + client_id}
+        res = self.post("/exchange/v1/derivatives/futures/orders/create", payload)
+        return {"status": res.get("status", "new"), "order_id": res.get("order_id")}
+
 
     # ----------------------------------- NOT IN USE ----------------------------------------------------- #
     # --------------------------------------------------------------------- #
@@ -1,13 +1,14 @@
 #Description: Spot adapter with connectivity test and basic order endpoints (stubbed for safety).
 
 from adapters.coindcx_common import CoinDCXBaseAdapter
+from adapters.http_pool import HttpPool
 from utils.logging import logger
 from utils.config import settings
 
 #TODO learn
 class CoinDCXSpotAdapter(CoinDCXBaseAdapter):
-    def __init__(self):
-        super().__init__(settings.COINDCX_API_KEY, settings.COINDCX_API_SECRET)
+    def __init__(self, pool: HttpPool | None = None):
+        super().__init__(settings.COINDCX_API_KEY, settings.COINDCX_API_SECRET, pool=pool)
 
     def test_connectivity(self):
         try:
@@ -50,4 +51,19 @@ class CoinDCXSpotAdapter(CoinDCXBaseAdapter):
             logger.exception(f"Spot order failed: {e}")
             raise
 
+    def get_orders_status(self, ids: list[str] | None = None, client_ids: list[str] | None = None) -> list[dict]:
+        """Status of many orders in one request, by exchange ids and/or client order ids."""
+        payload = {"timestamp": int(time.time() * 1000)}
+        if ids:
+            payload["ids"] = list(ids)
+        if client_ids:
+            payload["client_order_ids"] = list(client_ids)
+        return self.post("/exchange/v1/orders/status_multiple", payload)
+
+    def cancel_order(self, order_id: str) -> dict:
+        if settings.MODE != "live":
+            return {"status": "canceled", "order_id": order_id}
+        res = self.post("/exchange/v1/orders/cancel", {"id": order_id, "timestamp": int(time.time() * 1000)})
+        return {"status": "canceled", "order_id": order_id, "message": (res or {}).get("message")}
+
 import time  # placed here to keep imports minimal TODO:Why this import needed? 
@@ -0,0 +1,125 @@
+#Description: Process-wide pooled HTTP clients (sync + async) shared by all adapters; keep-alive, optional HTTP/2, connection reuse metrics.
+
+import asyncio
+import weakref
+from threading import Lock
+
+import httpx
+
+from utils.config import settings
+from utils.logging import logger
+
+
+def _h2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def outcome_unknown(exc: BaseException) -> bool:
+    """
+    True when a failed order request may still have reached the exchange: the connection broke or timed out
+    after sending, or the gateway answered 5xx. Only a 4xx response (or an error before sending) is a definite
+    rejection.
+    """
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    if isinstance(exc, httpx.ConnectError):
+        return False
+    return isinstance(exc, (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError))
+
+
+class HttpPool:
+    """
+    One connection pool per process. Inject `HttpPool.instance().client` (or `async_client()`)
+    into adapters instead of constructing httpx clients, so TLS sessions are reused across scans.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self):
+        self.limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        )
+        self.timeout = httpx.Timeout(settings.HTTP_TIMEOUT_SECONDS, connect=5.0)
+        self.http2 = bool(settings.HTTP2_ENABLED)
+        if self.http2 and not _h2_available():
+            logger.warning("HTTP2_ENABLED set but 'h2' is not installed; using HTTP/1.1 keep-alive.")
+            self.http2 = False
+
+        self._stats_lock = Lock()
+        self._stats = {"requests": 0, "new_connections": 0, "reused_connections": 0}
+        self._seen_streams: "weakref.WeakSet" = weakref.WeakSet()
+
+        self.client = httpx.Client(
+            limits=self.limits, timeout=self.timeout, http2=self.http2,
+            event_hooks={"response": [self._on_response]},
+        )
+        # AsyncClient connections are bound to the loop that opened them: one client per event loop
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = HttpPool()
+        return cls._instance
+
+    def async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(
+                    limits=self.limits, timeout=self.timeout, http2=self.http2,
+                    event_hooks={"response": [self._aon_response]},
+                )
+                self._async_clients[loop] = client
+        return client
+
+    # -----------------------
+    # Metrics
+    # -----------------------
+    def _track(self, response: httpx.Response) -> None:
+        stream = response.extensions.get("network_stream")
+        with self._stats_lock:
+            self._stats["requests"] += 1
+            if stream is None:
+                return
+            try:
+                if stream in self._seen_streams:
+                    self._stats["reused_connections"] += 1
+                else:
+                    self._seen_streams.add(stream)
+                    self._stats["new_connections"] += 1
+            except TypeError:
+                # Stream type not weak-referenceable; count the request only
+                pass
+
+    def _on_response(self, response: httpx.Response) -> None:
+        self._track(response)
+
+    async def _aon_response(self, response: httpx.Response) -> None:
+        self._track(response)
+
+    def stats(self) -> dict:
+        """Requests seen, new vs reused connections, and reuse ratio."""
+        with self._stats_lock:
+            out = dict(self._stats)
+        conns = out["new_connections"] + out["reused_connections"]
+        out["reuse_ratio"] = out["reused_connections"] / conns if conns else 0.0
+        out["http2"] = self.http2
+        return out
+
+    def close(self) -> None:
+        self.client.close()
+
+    async def aclose(self) -> None:
+        """Close the AsyncClient owned by the running event loop."""
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
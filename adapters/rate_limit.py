@@ -0,0 +1,235 @@
+#Description: Central CoinDCX request scheduler; per-endpoint-class token buckets, priority queueing, 429/5xx retry with jittered backoff and Retry-After.
+
+import asyncio
+import heapq
+import itertools
+import time
+from email.utils import parsedate_to_datetime
+from threading import Condition, Lock
+from typing import Awaitable, Callable, Dict
+
+import httpx
+from tenacity import AsyncRetrying, Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from utils.config import settings
+from utils.logging import logger
+from utils.tracing import span
+
+# Endpoint classes, each with its own budget
+ENDPOINT_PUBLIC = "public"      # market data: tickers, candles, markets
+ENDPOINT_ORDER = "order"        # order create / cancel / edit
+ENDPOINT_ACCOUNT = "account"    # balances, order status, positions
+
+# Lower value = served first when several callers wait on the same bucket
+PRIORITY_ORDER = 0
+PRIORITY_ACCOUNT = 3
+PRIORITY_DEFAULT = 5
+PRIORITY_BACKFILL = 9
+
+_MAX_RETRY_AFTER_SECONDS = 60.0
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket whose waiters are served in (priority, arrival) order.
+
+    Only the head waiter sleeps on the refill timer; everyone else waits to be notified, so a
+    low-priority backlog cannot starve a later high-priority request.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = max(1e-6, float(rate))
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._stamp = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = Condition(Lock())
+        self._waiters: list[tuple[int, int]] = []
+        self._seq = itertools.count()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def acquire(self, priority: int = PRIORITY_DEFAULT) -> float:
+        """Block until a token is available for this caller. Returns seconds spent waiting."""
+        start = time.monotonic()
+        ticket = (priority, next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] != ticket:
+                        self._cond.wait()
+                        continue
+                    if now >= self._paused_until and self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return now - start
+                    delay = max(self._paused_until - now, (1.0 - self._tokens) / self.rate)
+                    self._cond.wait(timeout=delay)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller of this bucket for `seconds` (e.g. after a 429 with Retry-After)."""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+
+class RateLimitedError(httpx.HTTPStatusError):
+    """Raised for 429/5xx responses so the retry policy can inspect status and Retry-After."""
+
+
+def _retry_after_seconds(response: httpx.Response | None) -> float | None:
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        secs = float(value)
+    except ValueError:
+        try:
+            secs = parsedate_to_datetime(value).timestamp() - time.time()
+        except Exception:
+            return None
+    return max(0.0, min(_MAX_RETRY_AFTER_SECONDS, secs))
+
+
+class RequestScheduler:
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self):
+        rates = {
+            ENDPOINT_PUBLIC: settings.RATE_LIMIT_PUBLIC_PER_SEC,
+            ENDPOINT_ORDER: settings.RATE_LIMIT_ORDER_PER_SEC,
+            ENDPOINT_ACCOUNT: settings.RATE_LIMIT_ACCOUNT_PER_SEC,
+        }
+        self.buckets: Dict[str, TokenBucket] = {k: TokenBucket(v) for k, v in rates.items()}
+        self._metrics_lock = Lock()
+        self._metrics = {
+            k: {"requests": 0, "throttled_seconds": 0.0, "retries": 0, "rate_limited": 0, "server_errors": 0}
+            for k in rates
+        }
+        self._backoff = wait_random_exponential(multiplier=0.5, max=8)
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = RequestScheduler()
+        return cls._instance
+
+    @staticmethod
+    def classify(path: str, public: bool = False) -> str:
+        if public:
+            return ENDPOINT_PUBLIC
+        p = path.lower()
+        if "/orders/" in p and any(x in p for x in ("create", "cancel", "edit", "exit")):
+            return ENDPOINT_ORDER
+        if p.startswith("/exchange/ticker") or "markets" in p:
+            return ENDPOINT_PUBLIC
+        return ENDPOINT_ACCOUNT
+
+    def _record(self, endpoint_class: str, key: str, value: float = 1) -> None:
+        with self._metrics_lock:
+            self._metrics[endpoint_class][key] += value
+
+    def _retry_policy(self, endpoint_class: str, idempotent: bool) -> dict:
+        def should_retry(exc: BaseException) -> bool:
+            if isinstance(exc, RateLimitedError):
+                return exc.response.status_code == 429 or idempotent
+            if isinstance(exc, httpx.ConnectError):
+                return True
+            return idempotent and isinstance(exc, httpx.TransportError)
+
+        def wait(retry_state) -> float:
+            exc = retry_state.outcome.exception()
+            retry_after = _retry_after_seconds(getattr(exc, "response", None))
+            return retry_after if retry_after is not None else self._backoff(retry_state)
+
+        def before_sleep(retry_state) -> None:
+            self._record(endpoint_class, "retries")
+            self._record(endpoint_class, "throttled_seconds", retry_state.next_action.sleep)
+            logger.warning(f"Retrying {endpoint_class} request in {retry_state.next_action.sleep:.2f}s "
+                           f"(attempt {retry_state.attempt_number}): {retry_state.outcome.exception()}")
+
+        return dict(
+            stop=stop_after_attempt(max(1, settings.HTTP_MAX_RETRIES)),
+            wait=wait,
+            retry=retry_if_exception(should_retry),
+            before_sleep=before_sleep,
+            reraise=True,
+        )
+
+    def _admitted(self, endpoint_class: str, waited: float) -> None:
+        self._record(endpoint_class, "requests")
+        if waited > 0:
+            self._record(endpoint_class, "throttled_seconds", waited)
+
+    def _check_response(self, endpoint_class: str, r: httpx.Response) -> httpx.Response:
+        if r.status_code == 429 or r.status_code >= 500:
+            if r.status_code == 429:
+                self._record(endpoint_class, "rate_limited")
+                retry_after = _retry_after_seconds(r)
+                self.buckets[endpoint_class].pause(retry_after if retry_after is not None else 1.0)
+            else:
+                self._record(endpoint_class, "server_errors")
+            raise RateLimitedError(f"CoinDCX returned {r.status_code}", request=r.request, response=r)
+        return r
+
+    def execute(
+        self,
+        endpoint_class: str,
+        send: Callable[[], httpx.Response],
+        priority: int = PRIORITY_DEFAULT,
+        idempotent: bool = True,
+    ) -> httpx.Response:
+        """
+        Run `send` under the endpoint class budget, retrying 429/5xx with jittered backoff.
+
+        Non-idempotent requests (order POSTs) are only retried when the exchange provably did not
+        process them: 429 responses and connection failures before the request was sent.
+        """
+        bucket = self.buckets[endpoint_class]
+        for attempt in Retrying(**self._retry_policy(endpoint_class, idempotent)):
+            with attempt:
+                self._admitted(endpoint_class, bucket.acquire(priority))
+                with span(f"http.{endpoint_class}"):
+                    resp = send()
+                return self._check_response(endpoint_class, resp)
+
+    async def aexecute(
+        self,
+        endpoint_class: str,
+        send: Callable[[], Awaitable[httpx.Response]],
+        priority: int = PRIORITY_DEFAULT,
+        idempotent: bool = True,
+    ) -> httpx.Response:
+        """Async counterpart of execute(); shares the same buckets and metrics."""
+        bucket = self.buckets[endpoint_class]
+        async for attempt in AsyncRetrying(**self._retry_policy(endpoint_class, idempotent)):
+            with attempt:
+                waited = await asyncio.to_thread(bucket.acquire, priority)
+                self._admitted(endpoint_class, waited)
+                with span(f"http.{endpoint_class}"):
+                    resp = await send()
+                return self._check_response(endpoint_class, resp)
+
+    def metrics(self) -> dict:
+        """Per endpoint class: queue depth, requests, throttle time, retries, 429 and 5xx counts."""
+        with self._metrics_lock:
+            out = {k: dict(v) for k, v in self._metrics.items()}
+        for k, bucket in self.buckets.items():
+            out[k]["queue_depth"] = bucket.queue_depth
+        return out
@@ -11,6 +11,7 @@ from ai.agents import RuleBasedResearchAgent, RuleBasedRiskAgent, LLMResearchAge
 
 from models.db import get_session
 from models.orm import Signal
+from utils.tracing import traced
 
 class CrewOrchestrator:
     """
@@ -51,6 +52,7 @@ class CrewOrchestrator:
                 cls._instance = CrewOrchestrator()
         return cls._instance
 
+    @traced("crew.enrich")
     def enrich_signals(self, signals: List[SignalOut], timeframe: str) -> List[SignalOut]:
         """
         Enrich a list of signals with:
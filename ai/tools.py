@@ -19,7 +19,7 @@ class FeatureTool:
 
     def latest_features(self, symbol: str, timeframe: str) -> Dict[str, Any]:
         df = self.market.get_candles_df(symbol, timeframe, limit=400)
-        df = self.signals.compute_features(df)
+        df = self.signals.compute_features(df, copy=False)
         if df is None or df.empty:
             return {}
         row = df.iloc[-1]
@@ -0,0 +1,58 @@
+#Description: Headless trading engine (`python -m engine`): scan/monitor/backfill jobs and the local control API, no Streamlit.
+
+import argparse
+import signal
+import threading
+
+from adapters.http_pool import HttpPool
+from models.db import init_db
+from services.engine_api import EngineApiServer, LocalEngine
+from services.event_log import AlertWriter
+from services.scan_queue import ScanWorker
+from services.scheduler import start_scheduler, stop_scheduler
+from utils.config import settings
+from utils.logging import logger
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the trading engine without the UI.")
+    parser.add_argument("--host", default=settings.ENGINE_API_HOST, help="control API bind address")
+    parser.add_argument("--port", type=int, default=settings.ENGINE_API_PORT, help="control API port")
+    parser.add_argument("--scan-worker", action="store_true",
+                        help="only process scan shards from the shared queue (start as many as needed, on any host)")
+    args = parser.parse_args(argv)
+
+    init_db()
+    stop = threading.Event()
+
+    def _request_stop(signum, _frame):
+        logger.info(f"Engine received signal {signum}; shutting down.")
+        stop.set()
+
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+
+    if args.scan_worker:
+        ScanWorker().run(stop)
+        HttpPool.instance().close()
+        return
+
+    start_scheduler()
+    api = EngineApiServer(LocalEngine(), host=args.host, port=args.port)
+    api.start()
+    logger.info(f"Engine running in {settings.MODE.upper()} mode. Ctrl+C to stop.")
+
+    # Short waits keep the main thread responsive to signals on every platform
+    while not stop.wait(1.0):
+        pass
+
+    api.stop()
+    # Let in-flight scan/monitor runs finish so no order is left half-recorded
+    stop_scheduler(wait=True)
+    AlertWriter.instance().stop()
+    HttpPool.instance().close()
+    logger.info("Engine stopped.")
+
+
+if __name__ == "__main__":
+    main()
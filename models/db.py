@@ -1,7 +1,8 @@
 #Description: SQLAlchemy engine/session factory and DB initializer.
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, scoped_session
 from utils.config import settings
+from utils.logging import logger
 
 engine = create_engine(settings.DATABASE_URL, echo=False, future=True, pool_pre_ping=True)
 SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocommit=False))
@@ -9,6 +10,35 @@ SessionLocal = scoped_session(sessionmaker(bind=engine, autoflush=False, autocom
 def get_session():
     return SessionLocal()
 
-def init_db():
+def init_db(bind=None):
     from models.orm import Base
-    Base.metadata.create_all(bind=engine)
+    bind = bind or engine
+    Base.metadata.create_all(bind=bind)
+    ensure_candle_index(bind)
+    ensure_scan_job_params(bind)
+
+def ensure_candle_index(bind) -> None:
+    """
+    create_all() never adds indexes to a table that already exists, and the candle store's upsert needs
+    the unique (symbol, timeframe, ts_open) index. On databases created before it, drop duplicate bars
+    (keeping the latest row of each) and rows without ts_open, then create the index.
+    """
+    from models.orm import Candle
+    index = next(ix for ix in Candle.__table__.indexes if ix.name == "ux_candles_symbol_tf_ts")
+    with bind.begin() as conn:
+        if any(ix["name"] == index.name for ix in inspect(conn).get_indexes("candles")):
+            return
+        removed = conn.execute(text(
+            "DELETE FROM candles WHERE ts_open IS NULL OR id NOT IN "
+            "(SELECT keep_id FROM (SELECT MAX(id) AS keep_id FROM candles GROUP BY symbol, timeframe, ts_open) AS k)"
+        )).rowcount
+        index.create(conn, checkfirst=True)
+    logger.info(f"Created candle index {index.name} ({removed} duplicate/invalid rows removed)")
+
+def ensure_scan_job_params(bind) -> None:
+    """create_all() never adds columns either; add scan_jobs.params on databases created before it."""
+    with bind.begin() as conn:
+        if any(c["name"] == "params" for c in inspect(conn).get_columns("scan_jobs")):
+            return
+        conn.execute(text("ALTER TABLE scan_jobs ADD COLUMN params JSON"))
+    logger.info("Added scan_jobs.params")
@@ -1,7 +1,7 @@
 #Description: ORM entity definitions.
 
 from sqlalchemy.orm import declarative_base, relationship, Mapped, mapped_column
-from sqlalchemy import Integer, String, Float, DateTime, JSON, ForeignKey, Boolean
+from sqlalchemy import Integer, String, Float, DateTime, JSON, ForeignKey, Boolean, Index
 from datetime import datetime,timezone
 
 #TODO check Base.metadata.create_all(bind=engine) <= orm.py
@@ -21,10 +21,12 @@ class Asset(Base):
 
 class Candle(Base):
     __tablename__ = "candles"
+    # One row per bar; also serves (symbol, timeframe) prefix lookups and ts range scans
+    __table_args__ = (Index("ux_candles_symbol_tf_ts", "symbol", "timeframe", "ts_open", unique=True),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    symbol: Mapped[str] = mapped_column(String, index=True)
+    symbol: Mapped[str] = mapped_column(String)
     timeframe: Mapped[str] = mapped_column(String)
-    ts_open: Mapped[datetime] = mapped_column(DateTime, default=datetime.now(timezone.utc))
+    ts_open: Mapped[datetime] = mapped_column(DateTime, nullable=False)  # bar open, naive UTC
     open: Mapped[float] = mapped_column(Float)
     high: Mapped[float] = mapped_column(Float)
     low: Mapped[float] = mapped_column(Float)
@@ -109,6 +111,26 @@ class Alert(Base):
     message: Mapped[str] = mapped_column(String)
     context: Mapped[dict] = mapped_column(JSON)
 
+class ScanJob(Base):
+    __tablename__ = "scan_jobs"
+    # Workers claim the oldest claimable shard: pending, or leased with an expired lease
+    __table_args__ = (Index("ix_scan_jobs_status_lease", "status", "lease_until"),)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    batch_id: Mapped[str] = mapped_column(String, index=True)
+    shard: Mapped[int] = mapped_column(Integer)
+    timeframe: Mapped[str] = mapped_column(String)
+    symbols: Mapped[list] = mapped_column(JSON)
+    skip_unchanged: Mapped[bool] = mapped_column(Boolean, default=False)
+    params: Mapped[dict | None] = mapped_column(JSON, nullable=True)  # submitter's signal params
+    status: Mapped[str] = mapped_column(String, default="pending")  # pending/leased/done/failed/cancelled
+    worker_id: Mapped[str | None] = mapped_column(String, nullable=True)
+    lease_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # naive UTC
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    result: Mapped[list | None] = mapped_column(JSON, nullable=True)  # SignalOut dicts
+    error: Mapped[str | None] = mapped_column(String, nullable=True)
+    ts_created: Mapped[datetime] = mapped_column(DateTime)
+    ts_updated: Mapped[datetime] = mapped_column(DateTime)
+
 class ApiCredentials(Base):
     __tablename__ = "api_credentials"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
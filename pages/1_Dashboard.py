@@ -2,23 +2,23 @@
 import streamlit as st
 import pandas as pd
 
-from services.portfolio import PortfolioService
+from services.engine_api import get_engine
 from services.market_data import MarketDataService
 from utils.charts import mini_price_chart
 
 st.title("Dashboard (Live)")
 
-portfolio = PortfolioService.instance()
+engine_state = get_engine().status()
 market = MarketDataService.instance()
 
 col1, col2, col3 = st.columns(3)
 with col1:
-    b = portfolio.get_balances()
+    b = engine_state["balances"]
     st.metric("Spot Balance (USDT)", f"{b.get('spot_usdt', 0):,.2f}")
 with col2:
     st.metric("Futures Balance (USDT)", f"{b.get('futures_usdt', 0):,.2f}")
 with col3:
-    st.metric("Equity (USDT)", f"{portfolio.get_equity():,.2f}")
+    st.metric("Equity (USDT)", f"{engine_state['equity']:,.2f}")
 
 st.divider()
 
@@ -5,7 +5,7 @@ import pandas as pd
 
 from services.signals import SignalService
 from services.portfolio import PortfolioService
-from services.execution import ExecutionService
+from services.engine_api import get_engine
 from ai.crew import CrewOrchestrator
 from utils.config import settings
 from utils.charts import signal_chart
@@ -15,7 +15,7 @@ st.title("Screener & Signals")
 
 signal_service = SignalService.instance()
 #portfolio = PortfolioService.instance()
-exec_service = ExecutionService.instance()
+engine = get_engine()
 crew = CrewOrchestrator.instance()
 
 # Controls
@@ -65,7 +65,7 @@ else:
     st.write(f"Candidates above threshold: {len(above)}")
     do_exec = st.button("Execute Orders for Candidates")
     if do_exec:
-        res = exec_service.allocate_and_execute(above)
+        res = engine.execute(above)
         st.success(f"Orders placed: {res['orders_placed']}, Skipped: {res['skipped']}, Errors: {res['errors']}")
 
     st.subheader("Chart & Edit")
@@ -82,5 +82,5 @@ else:
         sl = st.number_input("Stop", value=float(sel.sl))
         market_type = st.selectbox("Market", options=["spot","futures"], index=0)
         if st.button("Place Manual Order"):
-            out = exec_service.place_manual(sel.symbol, side, qty, entry, tp, sl, market_type)
+            out = engine.place_manual(sel.symbol, side, qty, entry, tp, sl, market_type)
             st.write(out)
@@ -2,13 +2,13 @@
 
 import streamlit as st
 from services.portfolio import PortfolioService
-from services.execution import ExecutionService
+from services.engine_api import get_engine
 from utils.charts import positions_table
 
 st.title("Portfolio & Orders")
 
 portfolio = PortfolioService.instance()
-exec_service = ExecutionService.instance()
+engine = get_engine()
 
 st.subheader("Open Positions")
 pos_df = portfolio.get_open_positions_df()
@@ -21,13 +21,13 @@ st.dataframe(orders, use_container_width=True)
 col1, col2 = st.columns(2)
 with col1:
     if st.button("Rebalance"):
-        out = exec_service.rebalance()
+        out = engine.rebalance()
         st.write(out)
 with col2:
     if st.button("Close All Positions"):
-        out = exec_service.close_all_positions()
+        out = engine.close_all_positions()
         st.write(out)
 
 st.subheader("Event Log")
-for log in portfolio.get_recent_events(50):
+for log in engine.recent_events(50):
     st.write(f"{log['ts']} [{log['level']}] {log['message']}")
\ No newline at end of file
@@ -4,6 +4,7 @@ import streamlit as st
 #import pandas as pd
 from services.signals import SignalService
 from services.market_data import MarketDataService
+from services.engine_api import get_engine
 from utils.charts import backtest_equity_chart
 
 st.title("Backtesting & Logs")
@@ -27,5 +28,5 @@ if run:
 
 st.subheader("System Logs")
 
-for line in sig.get_recent_logs(100):
+for line in get_engine().recent_logs(100):
     st.write(line)
@@ -1,23 +1,23 @@
 #Description: Global risk controls and circuit breakers.
 
+import pandas as pd
 import streamlit as st
-from services.monitor import MonitorService
-from services.portfolio import PortfolioService
+from services.engine_api import get_engine
 
 st.title("Risk Center")
 
-monitor = MonitorService.instance()
-portfolio = PortfolioService.instance()
+engine = get_engine()
+risk = engine.status()["risk_config"]
 
 with st.form("risk_form"):
     st.subheader("Global Limits")
-    max_daily_loss_pct = st.slider("Max Daily Loss (%)", 1.0, 20.0, value=float(monitor.config["max_daily_loss_pct"]), step=0.5)
-    per_asset_cap_pct = st.slider("Per-Asset Cap (% of Equity)", 1.0, 50.0, value=float(monitor.config["per_asset_cap_pct"]), step=1.0)
-    corr_cap = st.slider("Correlation Cap", 0.0, 1.0, value=float(monitor.config["correlation_cap"]), step=0.05)
-    cb_vol_spike = st.slider("Circuit Breaker Volatility Spike (ATRx)", 1.0, 5.0, value=float(monitor.config["vol_spike_atr_mult"]), step=0.5)
+    max_daily_loss_pct = st.slider("Max Daily Loss (%)", 1.0, 20.0, value=float(risk["max_daily_loss_pct"]), step=0.5)
+    per_asset_cap_pct = st.slider("Per-Asset Cap (% of Equity)", 1.0, 50.0, value=float(risk["per_asset_cap_pct"]), step=1.0)
+    corr_cap = st.slider("Correlation Cap", 0.0, 1.0, value=float(risk["correlation_cap"]), step=0.05)
+    cb_vol_spike = st.slider("Circuit Breaker Volatility Spike (ATRx)", 1.0, 5.0, value=float(risk["vol_spike_atr_mult"]), step=0.5)
     save = st.form_submit_button("Save Risk Settings")
     if save:
-        monitor.update_config(dict(
+        engine.control(risk_config=dict(
             max_daily_loss_pct=max_daily_loss_pct,
             per_asset_cap_pct=per_asset_cap_pct,
             correlation_cap=corr_cap,
@@ -25,11 +25,62 @@ with st.form("risk_form"):
         ))
         st.success("Risk settings updated.")
 
+st.subheader("Exposure")
+exposure = engine.status().get("risk_exposure") or {}
+if exposure:
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Daily PnL", f"{exposure['daily_pnl']:.2f}")
+    c2.metric("Spot Used", f"{exposure['margin'].get('spot', 0.0):.2f}")
+    c3.metric("Futures Margin Used", f"{exposure['margin'].get('futures', 0.0):.2f}")
+    if exposure["notional"]:
+        st.dataframe(pd.DataFrame([{"asset": k, "notional": v} for k, v in exposure["notional"].items()]),
+                     use_container_width=True, hide_index=True)
+    st.caption("New orders are checked against these counters: over the per-asset cap or market budget they are "
+               "resized or denied, and past the daily loss limit every new order is denied.")
+
+breaker = engine.status().get("vol_breaker") or {}
+if breaker.get("tripped"):
+    st.warning(f"Volatility breaker: new entries paused for {', '.join(breaker['tripped'])}")
+    st.dataframe(pd.DataFrame([{"symbol": s, **t} for s, t in breaker["tripped"].items()])[["symbol", "price", "move", "atr", "seconds_left"]],
+                 use_container_width=True, hide_index=True)
+
 st.subheader("Kill Switch")
-st.write("Immediate disable of new orders and optional cancel of open ones.")
+st.write("Immediately blocks new orders, cancels open orders and closes every open position. "
+         "Pressing it again while it is on retries anything that is still open.")
 if st.button("Activate Kill Switch"):
-    monitor.set_kill_switch(True)
+    state = engine.control(kill_switch=True, flatten=True)
     st.success("Kill Switch activated.")
+    report = state.get("last_flatten") or {}
+    if report:
+        st.write(f"Flat in {report.get('time_to_flat_ms')} ms: {report.get('orders_canceled', 0)} orders canceled, "
+                 f"{report.get('positions_closed', 0)} positions closed, {len(report.get('failed', []))} failed.")
+        if report.get("positions"):
+            st.dataframe(pd.DataFrame(report["positions"]), use_container_width=True, hide_index=True)
+        if report.get("failed"):
+            st.error(f"Not confirmed: {report['failed']}")
+
+st.subheader("Profiling")
+prof = engine.status()["profiling"]
+with st.form("profiling_form"):
+    jobs = st.multiselect("Jobs", ["scan_job", "monitor_job"], default=["scan_job"])
+    runs = st.number_input("Profile next N runs", 1, 20, value=1)
+    mode = st.selectbox("Profiler", ["cprofile", "sample"], help="sample: low-overhead stack sampling, writes collapsed stacks")
+    with_malloc = st.checkbox("Tracemalloc snapshot (memory)", value=False)
+    if st.form_submit_button("Arm Profiler"):
+        prof = engine.control(profiling=dict(jobs=jobs, runs=int(runs), mode=mode, tracemalloc=with_malloc))["profiling"]
+        st.success("Profiler armed.")
+if prof["remaining"]:
+    st.write(f"Pending profiled runs: {prof['remaining']}")
+if prof["artifacts"]:
+    st.dataframe(pd.DataFrame(prof["artifacts"]), use_container_width=True, hide_index=True)
 
 st.subheader("Diagnostics")
-st.json(monitor.get_status())
+trace = engine.trace_stats()
+st.caption("Stage timings since engine start (also scrapeable as Prometheus metrics at /metrics on the engine API).")
+if trace["stages"]:
+    st.dataframe(pd.DataFrame(trace["stages"]), use_container_width=True, hide_index=True)
+    st.caption("Slowest symbols")
+    st.dataframe(pd.DataFrame(trace["symbols"]), use_container_width=True, hide_index=True)
+else:
+    st.info("No spans recorded yet (or TRACING_ENABLED is off).")
+st.json(engine.status())
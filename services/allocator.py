@@ -0,0 +1,181 @@
+#Description: Covariance-aware allocation: shrunk covariance, risk-parity or mean-variance weights with per-asset and per-bucket caps (NumPy).
+
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from services.correlation import CorrelationTracker
+from utils.config import settings
+
+METHODS = ("risk_parity", "mean_variance", "score")
+
+
+@dataclass
+class Candidate:
+    symbol: str
+    bucket: str                  # "spot" / "futures": each bucket has its own budget
+    score: float                 # confidence * expected return; the risk budget in risk parity
+    expected_return: float       # fraction per trade, e.g. 0.02
+
+
+def ledoit_wolf(returns: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Sample covariance of a T x N returns matrix shrunk towards a constant-variance diagonal, with the
+    Ledoit-Wolf optimal intensity. NaN returns (missing bars) count as 0 after demeaning.
+    """
+    x = np.asarray(returns, dtype=np.float64)
+    x = np.nan_to_num(x - np.nanmean(x, axis=0))
+    t, n = x.shape
+    s = x.T @ x / max(t, 1)
+    mu = np.trace(s) / n
+    d2 = np.sum((s - mu * np.eye(n)) ** 2)
+    # sum_t ||x_t x_t' - S||^2 = sum_t ||x_t||^4 - T ||S||^2
+    b2 = (np.sum(np.sum(x ** 2, axis=1) ** 2) / max(t, 1) - np.sum(s ** 2)) / max(t, 1)
+    delta = float(min(max(b2, 0.0), d2) / d2) if d2 > 0 else 1.0
+    return shrink(s, delta), delta
+
+
+def shrink(cov: np.ndarray, delta: float) -> np.ndarray:
+    n = cov.shape[0]
+    return (1.0 - delta) * cov + delta * (np.trace(cov) / max(n, 1)) * np.eye(n)
+
+
+def project_capped_simplex(v: np.ndarray, cap: np.ndarray) -> np.ndarray:
+    """Euclidean projection onto {0 <= w <= cap, sum(w) = 1}; all caps when they sum to 1 or less."""
+    if cap.sum() <= 1.0:
+        return cap.copy()
+    # sum(clip(v - tau, 0, cap)) is piecewise linear and non-increasing in tau, with kinks at v and v - cap:
+    # evaluate it at every kink at once and interpolate inside the bracketing segment
+    kinks = np.sort(np.concatenate((v, v - cap)))
+    total = np.clip(v[None, :] - kinks[:, None], 0.0, cap).sum(axis=1)
+    k = int(np.searchsorted(-total, -1.0, side="left"))
+    k = min(max(k, 1), len(kinks) - 1)
+    t0, t1, f0, f1 = kinks[k - 1], kinks[k], total[k - 1], total[k]
+    tau = t0 if f0 == f1 else t0 + (f0 - 1.0) * (t1 - t0) / (f0 - f1)
+    return np.clip(v - tau, 0.0, cap)
+
+
+def _water_fill(w: np.ndarray, cap: np.ndarray) -> np.ndarray:
+    """Clip weights at their caps and hand the excess to the uncapped ones pro rata, until none exceeds its cap."""
+    w = w / w.sum()
+    fixed = np.zeros(len(w), dtype=bool)
+    for _ in range(len(w)):
+        over = ~fixed & (w > cap)
+        if not over.any():
+            break
+        fixed |= over
+        w = np.where(fixed, cap, w)
+        free = ~fixed
+        room = 1.0 - w[fixed].sum()
+        if not free.any() or room <= 0:
+            break
+        w[free] *= room / w[free].sum()
+    return np.minimum(w, cap)
+
+
+def risk_parity(cov: np.ndarray, budgets: np.ndarray, iters: int = 500, tol: float = 1e-10) -> np.ndarray:
+    """Long-only weights whose risk contributions w_i * (cov w)_i are proportional to the budgets (sum to 1)."""
+    b = budgets / budgets.sum()
+    w = b / np.sqrt(np.maximum(np.diagonal(cov), 1e-18))
+    w /= w.sum()
+    for _ in range(iters):
+        # Geometric mean of w and the fixed point b / (cov w): a damped, vectorized update
+        w_new = np.sqrt(w * b / np.maximum(cov @ w, 1e-18))
+        w_new /= w_new.sum()
+        if np.max(np.abs(w_new - w)) < tol:
+            return w_new
+        w = w_new
+    return w
+
+
+def mean_variance(cov: np.ndarray, mu: np.ndarray, cap: np.ndarray, risk_aversion: float, iters: int = 500,
+                  tol: float = 1e-10) -> np.ndarray:
+    """max mu'w - (risk_aversion / 2) w' cov w over the capped simplex, by projected gradient ascent."""
+    step = 1.0 / max(risk_aversion * float(np.linalg.eigvalsh(cov)[-1]), 1e-12)
+    w = project_capped_simplex(np.full(len(mu), 1.0 / len(mu)), cap)
+    for _ in range(iters):
+        w_new = project_capped_simplex(w + step * (mu - risk_aversion * (cov @ w)), cap)
+        if np.max(np.abs(w_new - w)) < tol:
+            return w_new
+        w = w_new
+    return w
+
+
+class Allocator:
+    """
+    Splits each bucket's budget among its candidates. Covariances come from the CorrelationTracker's
+    exponentially weighted bar returns, or from a returns matrix, e.g. in a backtest. Candidates
+    without enough history get the median known variance and zero covariance. The matrix is shrunk
+    towards a constant-variance diagonal by ALLOCATION_SHRINKAGE.
+
+    Methods (ALLOCATION_METHOD):
+    - risk_parity: each candidate's risk contribution is proportional to its score.
+    - mean_variance: maximizes expected return minus ALLOCATION_RISK_AVERSION/2 times variance.
+    - score: the original weighting by confidence * expected return, ignoring covariance.
+
+    Every amount is capped at asset_cap. When the caps cannot absorb a bucket's whole budget, the
+    remainder is left unallocated.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, correlation: CorrelationTracker | None = None):
+        self.correlation = correlation or CorrelationTracker.instance()
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = Allocator()
+        return cls._instance
+
+    def covariance(self, symbols: List[str]) -> np.ndarray:
+        cov, known = self.correlation.covariance(symbols)
+        var = np.diagonal(cov)[known]
+        fill = float(np.median(var)) if var.size and np.median(var) > 0 else 1.0
+        cov[np.diag_indices_from(cov)] = np.where(known, np.diagonal(cov), fill)
+        return shrink(cov, settings.ALLOCATION_SHRINKAGE)
+
+    def weights(self, scores: np.ndarray, expected: np.ndarray, cov: np.ndarray, cap: np.ndarray,
+                method: str | None = None) -> np.ndarray:
+        """Weights summing to at most 1 within one bucket; `cap` is each candidate's maximum weight."""
+        method = method or settings.ALLOCATION_METHOD
+        if method not in METHODS:
+            raise ValueError(f"Unknown allocation method {method!r}; expected one of {METHODS}")
+        w = np.zeros(len(scores))
+        live = scores > 0
+        if not live.any():
+            return w
+        cap_live = cap[live]
+        if method == "mean_variance":
+            sub = cov[np.ix_(live, live)]
+            w[live] = mean_variance(sub, expected[live], cap_live, settings.ALLOCATION_RISK_AVERSION)
+        elif method == "risk_parity":
+            w[live] = _water_fill(risk_parity(cov[np.ix_(live, live)], scores[live]), cap_live)
+        else:
+            w[live] = _water_fill(scores[live], cap_live)
+        return w
+
+    def allocate(self, candidates: List[Candidate], budgets: Dict[str, float], asset_cap: float,
+                 cov: np.ndarray | None = None, method: str | None = None) -> np.ndarray:
+        """Amount per candidate. `cov` (aligned with candidates) overrides the tracker, e.g. from ledoit_wolf()."""
+        out = np.zeros(len(candidates))
+        if not candidates:
+            return out
+        if cov is None and (method or settings.ALLOCATION_METHOD) != "score":
+            cov = self.covariance([c.symbol for c in candidates])
+        elif cov is None:
+            cov = np.eye(len(candidates))
+        buckets = np.array([c.bucket for c in candidates])
+        scores = np.array([max(0.0, c.score) for c in candidates])
+        expected = np.array([c.expected_return for c in candidates])
+        for bucket, budget in budgets.items():
+            idx = np.flatnonzero(buckets == bucket)
+            if not idx.size or budget <= 0:
+                continue
+            cap = np.full(idx.size, min(1.0, asset_cap / budget))
+            w = self.weights(scores[idx], expected[idx], cov[np.ix_(idx, idx)], cap, method)
+            out[idx] = budget * w
+        return out
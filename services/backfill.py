@@ -0,0 +1,170 @@
+#Description: Candle history gap detection and parallel paged backfill into the candle store; reports coverage per symbol.
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from threading import Lock
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from adapters.rate_limit import PRIORITY_BACKFILL
+from services.candle_store import CandleStore
+from services.market_data import MarketDataService
+from utils.config import settings
+from utils.logging import logger
+
+# CoinDCX returns at most this many candles per request
+MAX_PAGE_BARS = 1000
+
+Gap = Tuple[int, int]    # (first missing bar open, last missing bar open), epoch ms
+Page = Tuple[int, int]   # (start ms, end ms) inclusive bar-open range for one request
+
+
+def _step_ms(step: timedelta) -> int:
+    return int(step.total_seconds() * 1000)
+
+
+def expected_window(step: timedelta, lookback_bars: int, now: pd.Timestamp | None = None) -> Tuple[int, int]:
+    """Bar-open range [start, end] (epoch ms) of the last `lookback_bars` bars, including the forming one."""
+    step_ms = _step_ms(step)
+    now = now if now is not None else pd.Timestamp.now(tz="UTC")
+    now_ms = int(now.timestamp() * 1000)
+    end = now_ms - now_ms % step_ms
+    return end - (lookback_bars - 1) * step_ms, end
+
+
+def find_gaps(ts: np.ndarray, step: timedelta, start_ms: int | None = None, end_ms: int | None = None) -> List[Gap]:
+    """
+    Missing bar ranges in a sorted timestamp array, found with one vectorized diff.
+    `start_ms`/`end_ms` extend the check to leading/trailing bars absent from the series.
+    """
+    step_ms = _step_ms(step)
+    t = np.asarray(ts).astype("datetime64[ms]").astype(np.int64)
+    if start_ms is not None:
+        t = t[t >= start_ms]
+    if end_ms is not None:
+        t = t[t <= end_ms]
+    if t.size == 0:
+        return [(start_ms, end_ms)] if start_ms is not None and end_ms is not None else []
+
+    gaps: List[Gap] = []
+    if start_ms is not None and t[0] > start_ms:
+        gaps.append((start_ms, int(t[0]) - step_ms))
+    idx = np.nonzero(np.diff(t) > step_ms)[0]
+    gaps.extend((int(t[i]) + step_ms, int(t[i + 1]) - step_ms) for i in idx)
+    if end_ms is not None and t[-1] < end_ms:
+        gaps.append((int(t[-1]) + step_ms, end_ms))
+    return gaps
+
+
+def plan_pages(gaps: List[Gap], step: timedelta, page_bars: int = MAX_PAGE_BARS) -> List[Page]:
+    """
+    Minimal set of paged requests covering all gaps: nearby gaps that fit in one page share a
+    request, and gaps longer than a page are split.
+    """
+    step_ms = _step_ms(step)
+    span = (page_bars - 1) * step_ms
+    pages: List[Page] = []
+    cur_start = cur_end = None
+    for g_start, g_end in sorted(gaps):
+        pos = g_start
+        while pos <= g_end:
+            if cur_start is not None and min(g_end, cur_start + span) >= pos:
+                cur_end = min(g_end, cur_start + span)
+            else:
+                if cur_start is not None:
+                    pages.append((cur_start, cur_end))
+                cur_start, cur_end = pos, min(g_end, pos + span)
+            pos = cur_end + step_ms
+    if cur_start is not None:
+        pages.append((cur_start, cur_end))
+    return pages
+
+
+class BackfillService:
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, market: MarketDataService | None = None, store: CandleStore | None = None):
+        self.market = market or MarketDataService.instance()
+        self.store = store or CandleStore.instance()
+        self._last_report: Dict[str, dict] = {}
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = BackfillService()
+        return cls._instance
+
+    def coverage(self, symbol: str, timeframe: str, lookback_bars: int) -> dict:
+        step = self.market._parse_timeframe_to_timedelta(timeframe)
+        start, end = expected_window(step, lookback_bars)
+        ts = self.store.read_range(symbol, timeframe, start=pd.Timestamp(start, unit="ms"),
+                                   end=pd.Timestamp(end, unit="ms") + step)["ts"]
+        gaps = find_gaps(ts, step, start, end)
+        missing = sum((g_end - g_start) // _step_ms(step) + 1 for g_start, g_end in gaps)
+        return {
+            "expected": lookback_bars,
+            "present": int(ts.size),
+            "missing": int(missing),
+            "coverage_pct": round(100.0 * ts.size / lookback_bars, 2) if lookback_bars else 100.0,
+            "gaps": len(gaps),
+        }
+
+    def _fetch_page(self, symbol: str, timeframe: str, step: timedelta, page: Page) -> int:
+        start, end = page
+        bars = (end - start) // _step_ms(step) + 1
+        df = self.market._fetch_coindcx_candles(
+            symbol, timeframe, limit=min(MAX_PAGE_BARS, bars + 1),
+            start_ms=start, end_ms=end + _step_ms(step), priority=PRIORITY_BACKFILL,
+        )
+        return self.store.upsert(symbol, timeframe, df)
+
+    def run(
+        self,
+        symbols: List[str],
+        timeframes: List[str],
+        lookback_bars: int | None = None,
+        max_workers: int | None = None,
+    ) -> Dict[str, dict]:
+        """
+        Detect gaps for every (symbol, timeframe), fetch the planned pages concurrently (the
+        shared rate limiter paces them at backfill priority) and return coverage per symbol.
+        """
+        lookback_bars = lookback_bars or settings.BACKFILL_LOOKBACK_BARS
+        jobs = []
+        for tf in timeframes:
+            step = self.market._parse_timeframe_to_timedelta(tf)
+            start, end = expected_window(step, lookback_bars)
+            for symbol in symbols:
+                try:
+                    ts = self.store.read_range(symbol, tf, start=pd.Timestamp(start, unit="ms"))["ts"]
+                except Exception as e:
+                    logger.warning(f"Backfill: cannot read stored candles for {symbol} {tf}: {e}")
+                    continue
+                for page in plan_pages(find_gaps(ts, step, start, end), step):
+                    jobs.append((symbol, tf, step, page))
+
+        errors = 0
+        if jobs:
+            workers = max_workers or settings.BACKFILL_CONCURRENCY
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+                futures = [pool.submit(self._fetch_page, *job) for job in jobs]
+                for job, fut in zip(jobs, futures):
+                    try:
+                        fut.result()
+                    except Exception as e:
+                        errors += 1
+                        logger.warning(f"Backfill page failed for {job[0]} {job[1]} {job[3]}: {e}")
+
+        report: Dict[str, dict] = {}
+        for symbol in symbols:
+            report[symbol] = {tf: self.coverage(symbol, tf, lookback_bars) for tf in timeframes}
+        self._last_report = report
+        logger.info(f"Backfill done: {len(jobs)} page requests, {errors} failed, {len(symbols)} symbols.")
+        return report
+
+    def get_last_report(self) -> Dict[str, dict]:
+        return dict(self._last_report)
@@ -0,0 +1,176 @@
+#Description: SQL-backed candle time-series store; bulk upsert on (symbol, timeframe, ts_open) and range reads into NumPy arrays.
+
+from datetime import datetime
+from threading import Lock
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, select, tuple_
+
+from models.db import engine as default_engine
+from models.orm import Candle
+from utils.tracing import traced
+
+OHLCV = ("open", "high", "low", "close", "volume")
+
+
+def _naive_utc(ts) -> pd.Series:
+    """Timestamps as naive UTC datetimes (how DateTime columns are stored)."""
+    ts = pd.to_datetime(ts, utc=True)
+    return ts.dt.tz_convert(None)
+
+
+class CandleStore:
+    """
+    Shared, warm candle history for every process pointing at DATABASE_URL.
+
+    Writes are set-based: one executemany INSERT ... ON CONFLICT DO UPDATE per batch (SQLite and
+    PostgreSQL), so refreshing the forming bar overwrites it in place. Reads return contiguous
+    NumPy arrays keyed by column name, oldest first.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, engine=None):
+        self.engine = engine or default_engine
+        self.table = Candle.__table__
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = CandleStore()
+        return cls._instance
+
+    # -----------------------
+    # Writes
+    # -----------------------
+    @traced("db.candles_upsert")
+    def upsert(self, symbol: str, timeframe: str, df: pd.DataFrame) -> int:
+        """Insert or overwrite bars from a DataFrame with ts + OHLCV columns. Returns rows written."""
+        if df is None or df.empty:
+            return 0
+        ts = _naive_utc(df["ts"]).astype(object).to_numpy()
+        cols = {c: df[c].to_numpy(dtype=np.float64, na_value=np.nan) if c in df else np.zeros(len(df)) for c in OHLCV}
+        rows = [
+            {"symbol": symbol, "timeframe": timeframe, "ts_open": ts[i],
+             "open": float(cols["open"][i]), "high": float(cols["high"][i]), "low": float(cols["low"][i]),
+             "close": float(cols["close"][i]), "volume": float(cols["volume"][i])}
+            for i in range(len(ts))
+        ]
+        t = self.table
+        stmt = self._upsert_stmt()
+        with self.engine.begin() as conn:
+            if stmt is not None:
+                conn.execute(stmt, rows)
+            else:
+                # Dialects without ON CONFLICT: delete overlapping keys, then executemany insert
+                keys = [(r["symbol"], r["timeframe"], r["ts_open"]) for r in rows]
+                conn.execute(delete(t).where(tuple_(t.c.symbol, t.c.timeframe, t.c.ts_open).in_(keys)))
+                conn.execute(t.insert(), rows)
+        return len(rows)
+
+    def _upsert_stmt(self):
+        dialect = self.engine.dialect.name
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        elif dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            return None
+        stmt = insert(self.table)
+        return stmt.on_conflict_do_update(
+            index_elements=["symbol", "timeframe", "ts_open"],
+            set_={c: stmt.excluded[c] for c in OHLCV},
+        )
+
+    # -----------------------
+    # Reads
+    # -----------------------
+    def read_range(
+        self,
+        symbol: str,
+        timeframe: str,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        limit: int | None = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Bars with start <= ts_open < end (naive UTC or tz-aware), oldest first.
+        With a limit, the most recent `limit` bars of that range are returned.
+        Keys: ts (datetime64[ms], UTC) and open/high/low/close/volume (float64).
+        """
+        t = self.table
+        stmt = select(t.c.ts_open, *[t.c[c] for c in OHLCV]).where(t.c.symbol == symbol, t.c.timeframe == timeframe)
+        if start is not None:
+            stmt = stmt.where(t.c.ts_open >= _to_naive(start))
+        if end is not None:
+            stmt = stmt.where(t.c.ts_open < _to_naive(end))
+        if limit:
+            stmt = stmt.order_by(t.c.ts_open.desc()).limit(int(limit))
+        else:
+            stmt = stmt.order_by(t.c.ts_open.asc())
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(stmt).all()
+        if limit:
+            rows.reverse()
+        cols = list(zip(*rows)) if rows else [()] * (len(OHLCV) + 1)
+        out = {"ts": np.array(cols[0], dtype="datetime64[ms]")}
+        for i, c in enumerate(OHLCV, start=1):
+            out[c] = np.array(cols[i], dtype=np.float64)
+        return out
+
+    def read_recent(self, timeframe: str, since: datetime,
+                    symbols: List[str] | None = None) -> Dict[str, Dict[str, np.ndarray]]:
+        """
+        Bars of every symbol (or of `symbols`) on `timeframe` with ts_open >= since, in one query;
+        {symbol: read_range-style arrays}.
+        """
+        t = self.table
+        stmt = (select(t.c.symbol, t.c.ts_open, *[t.c[c] for c in OHLCV])
+                .where(t.c.timeframe == timeframe, t.c.ts_open >= _to_naive(since))
+                .order_by(t.c.symbol, t.c.ts_open))
+        if symbols is not None:
+            stmt = stmt.where(t.c.symbol.in_(list(symbols)))
+        with self.engine.connect() as conn:
+            rows = conn.execute(stmt).all()
+        if not rows:
+            return {}
+        cols = list(zip(*rows))
+        symbols = np.array(cols[0], dtype=object)
+        ts = np.array(cols[1], dtype="datetime64[ms]")
+        data = {c: np.array(cols[i], dtype=np.float64) for i, c in enumerate(OHLCV, start=2)}
+        starts = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]])
+        ends = np.r_[starts[1:], len(symbols)]
+        return {symbols[a]: {"ts": ts[a:b], **{c: v[a:b] for c, v in data.items()}} for a, b in zip(starts, ends)}
+
+    def last_ts(self, symbol: str, timeframe: str) -> datetime | None:
+        t = self.table
+        with self.engine.connect() as conn:
+            return conn.execute(
+                select(func.max(t.c.ts_open)).where(t.c.symbol == symbol, t.c.timeframe == timeframe)
+            ).scalar()
+
+    def count(self, symbol: str, timeframe: str) -> int:
+        t = self.table
+        with self.engine.connect() as conn:
+            return int(conn.execute(
+                select(func.count()).select_from(t).where(t.c.symbol == symbol, t.c.timeframe == timeframe)
+            ).scalar() or 0)
+
+    @staticmethod
+    def to_frame(arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """DataFrame in the same shape MarketDataService returns (tz-aware UTC ts)."""
+        df = pd.DataFrame({c: arrays[c] for c in OHLCV})
+        df.insert(0, "ts", pd.to_datetime(arrays["ts"]).tz_localize("UTC"))
+        return df
+
+
+def _to_naive(ts) -> datetime:
+    ts = pd.Timestamp(ts)
+    if ts.tzinfo is not None:
+        ts = ts.tz_convert("UTC").tz_localize(None)
+    return ts.to_pydatetime()
+
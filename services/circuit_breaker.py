@@ -0,0 +1,182 @@
+#Description: Volatility circuit breaker: rolling ATR per symbol from the candle windows or the candle store; flags moves beyond vol_spike_atr_mult x ATR.
+
+import time
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Dict, List
+
+import numpy as np
+
+from services.candle_store import CandleStore
+from services.ring_buffer import RingBufferRegistry
+from utils.config import settings
+from utils.logging import logger
+
+
+class VolatilityBreaker:
+    """
+    Trips a symbol when price moves more than vol_spike_atr_mult x ATR away from the last closed bar's
+    close, or when the last closed bar's range exceeds that. A tripped symbol gets no new entries for
+    VOL_BREAKER_COOLDOWN_SECONDS, and a further spike restarts the cooldown.
+
+    ATR is the mean true range of the last VOL_BREAKER_ATR_PERIOD closed VOL_BREAKER_TIMEFRAME bars.
+    It comes from this process's market data ring buffers, which every candle fetch already fills, so
+    nothing is refetched. When the scans run elsewhere (scan queue workers, shared-memory readers), the
+    windows here are empty, partial or stale. Symbols without a current window (last bar within two bar
+    lengths of now) are then read from the shared candle store, in one query at most every VOL_BREAKER_STORE_REFRESH_SECONDS. With neither source, nothing
+    can trip, and refresh() logs a warning. refresh() recomputes a symbol only when it gained a closed
+    bar. evaluate() checks all priced symbols in a few array operations, so the whole universe can be
+    checked on every monitor cycle.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, windows: RingBufferRegistry | None = None, timeframe: str | None = None, period: int | None = None,
+                 store: CandleStore | None = None, step: timedelta | None = None):
+        self._windows = windows
+        self.store = store or CandleStore.instance()
+        self._step = step
+        self._store_read = 0.0
+        self._empty_warned = 0.0
+        self.timeframe = timeframe or settings.VOL_BREAKER_TIMEFRAME
+        self.period = period or settings.VOL_BREAKER_ATR_PERIOD
+        self._mu = Lock()
+        self._idx: Dict[str, int] = {}
+        self._seen: Dict[str, int] = {}      # symbol -> last bar ts (ms) its ATR was computed at
+        self._atr = np.zeros(0)
+        self._ref = np.zeros(0)              # close of the last closed bar
+        self._range = np.zeros(0)            # high - low of the last closed bar
+        self._tripped: Dict[str, dict] = {}  # symbol -> {"until", "move", "atr", "ts"}
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = VolatilityBreaker()
+        return cls._instance
+
+    @property
+    def windows(self) -> RingBufferRegistry:
+        if self._windows is None:
+            # Imported lazily: the market data service is heavy and only needed once the breaker first runs
+            from services.market_data import MarketDataService
+            self._windows = MarketDataService.instance().windows
+        return self._windows
+
+    @property
+    def step(self) -> timedelta:
+        if self._step is None:
+            from services.market_data import MarketDataService
+            self._step = MarketDataService.instance()._parse_timeframe_to_timedelta(self.timeframe)
+        return self._step
+
+    def _row(self, symbol: str) -> int:
+        i = self._idx.get(symbol)
+        if i is None:
+            i = self._idx[symbol] = len(self._idx)
+            if i >= len(self._atr):
+                grow = max(16, len(self._atr))
+                self._atr, self._ref, self._range = (np.pad(a, (0, grow)) for a in (self._atr, self._ref, self._range))
+        return i
+
+    def refresh(self, now: float | None = None) -> int:
+        """Recompute ATR for symbols with a new closed bar; returns symbols updated."""
+        now = now or time.time()
+        updated = 0
+        local = set()
+        # A window not updated for two bars is stale (its symbol is no longer scanned here); the store may have newer bars
+        fresh_after = int(now * 1000) - 2 * int(self.step.total_seconds() * 1000)
+        for symbol, tf in self.windows.keys():
+            if tf != self.timeframe:
+                continue
+            buf = self.windows.get(symbol, tf)
+            last = buf.last_ts if buf is not None else None
+            if last is None or last < fresh_after:
+                continue
+            local.add(symbol)
+            if self._seen.get(symbol) == last or len(buf) < 3:
+                continue
+            # The newest bar is still forming; ATR uses the closed bars before it
+            v = buf.view(self.period + 2)
+            self._update(symbol, last, v["high"][:-1], v["low"][:-1], v["close"][:-1])
+            updated += 1
+        if now - self._store_read >= settings.VOL_BREAKER_STORE_REFRESH_SECONDS:
+            self._store_read = now
+            updated += self._refresh_from_store(local, now)
+        if not self._idx and now - self._empty_warned >= 3600:
+            self._empty_warned = now
+            logger.warning(f"Volatility breaker has no {self.timeframe} candles (no local windows, none in the candle store); "
+                           f"it cannot trip until {self.timeframe} bars are fetched")
+        return updated
+
+    def _refresh_from_store(self, skip: set, now: float) -> int:
+        """ATR from the shared candle store for symbols without a window in this process."""
+        step_ms = int(self.step.total_seconds() * 1000)
+        since = datetime.fromtimestamp(now - (self.period + 3) * step_ms / 1000, tz=timezone.utc)
+        try:
+            recent = self.store.read_recent(self.timeframe, since)
+        except Exception as e:
+            logger.warning(f"Volatility breaker could not read the candle store: {e}")
+            return 0
+        updated = 0
+        for symbol, bars in recent.items():
+            if symbol in skip:
+                continue
+            # The store also holds the forming bar; only bars whose close is past count
+            n = int(np.count_nonzero(bars["ts"].astype(np.int64) + step_ms <= now * 1000))
+            if n < 2:
+                continue
+            last = int(bars["ts"][n - 1].astype(np.int64))
+            if self._seen.get(symbol) == last:
+                continue
+            k = slice(max(0, n - self.period - 1), n)
+            self._update(symbol, last, bars["high"][k], bars["low"][k], bars["close"][k])
+            updated += 1
+        return updated
+
+    def _update(self, symbol: str, last: int, high: np.ndarray, low: np.ndarray, close: np.ndarray) -> None:
+        """Store ATR, last close and last range from closed bars (oldest first)."""
+        prev = close[:-1]
+        tr = np.maximum(high[1:] - low[1:], np.maximum(np.abs(high[1:] - prev), np.abs(low[1:] - prev)))
+        with self._mu:
+            i = self._row(symbol)
+            self._atr[i] = float(np.nanmean(tr)) if tr.size else 0.0
+            self._ref[i] = float(close[-1])
+            self._range[i] = float(high[-1] - low[-1])
+            self._seen[symbol] = last
+
+    def evaluate(self, prices: Dict[str, float], mult: float, now: float | None = None) -> List[str]:
+        """Trip symbols whose price or last closed bar moved more than mult x ATR; returns newly tripped symbols."""
+        now = now or time.time()
+        with self._mu:
+            symbols = [s for s in prices if s in self._idx]
+            rows = np.array([self._idx[s] for s in symbols], dtype=np.int64)
+            px = np.array([prices[s] for s in symbols], dtype=np.float64)
+            atr, ref, rng = self._atr[rows], self._ref[rows], self._range[rows]
+            move = np.maximum(np.abs(px - ref), rng)
+            spike = (atr > 0) & (px > 0) & (move > mult * atr)
+            new = []
+            for k in np.flatnonzero(spike):
+                s = symbols[k]
+                if s not in self._tripped or self._tripped[s]["until"] <= now:
+                    new.append(s)
+                self._tripped[s] = {"until": now + settings.VOL_BREAKER_COOLDOWN_SECONDS, "move": round(float(move[k]), 8),
+                                    "atr": round(float(atr[k]), 8), "price": float(px[k]), "ts": now}
+            for s in [s for s, t in self._tripped.items() if t["until"] <= now]:
+                del self._tripped[s]
+        if new:
+            logger.warning(f"Volatility breaker tripped for {new} (> {mult} x ATR)")
+        return new
+
+    def is_tripped(self, symbol: str, now: float | None = None) -> bool:
+        t = self._tripped.get(symbol)
+        return t is not None and t["until"] > (now or time.time())
+
+    def atr(self, symbol: str) -> float | None:
+        i = self._idx.get(symbol)
+        return float(self._atr[i]) if i is not None and self._atr[i] > 0 else None
+
+    def status(self) -> dict:
+        now = time.time()
+        return {"symbols": len(self._idx),
+                "tripped": {s: dict(t, seconds_left=round(t["until"] - now)) for s, t in list(self._tripped.items()) if t["until"] > now}}
@@ -0,0 +1,263 @@
+#Description: Exponentially weighted returns correlation, updated incrementally as bars close; O(holdings) candidate-vs-book lookups.
+
+import time
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from services.candle_store import CandleStore
+from utils.config import settings
+from utils.logging import logger
+
+
+class CorrelationTracker:
+    """
+    Exponentially weighted means, variances and covariances of per-bar log returns for every
+    scanned symbol (up to CORRELATION_MAX_SYMBOLS), on the CORRELATION_TIMEFRAME bars.
+
+    observe() buffers a symbol's newly closed bars, and commit() folds the buffered bars into the
+    statistics in bar order. A scan therefore observes every symbol and commits once at the end,
+    so all symbols' returns for a bar go into one update. Each bar is one vectorized rank-1 update
+    over the symbols that have a return for it; pairs where only one side moved keep their covariance.
+    Lookups read single matrix entries, so checking a candidate against the book costs O(holdings).
+
+    The first observation of a symbol seeds up to CORRELATION_WARMUP_BARS of its history. Bars not yet
+    committed are buffered as usual. Bars that were already committed, e.g. for a symbol that joins the
+    universe later, cannot go through the joint update again. Instead, the tracker keeps the returns of
+    the last CORRELATION_WARMUP_BARS committed bars, and the new symbol's row is replayed against them as
+    if it had been tracked all along. In that replay the other symbols' means restart at 0 at the start
+    of the window.
+
+    Scans in this process feed observe() directly. When scans run elsewhere (scan queue workers,
+    shared-memory readers), refresh() reads the closed bars of the other symbols from the shared candle
+    store, at most every CORRELATION_STORE_REFRESH_SECONDS. It folds them in one bar behind, so that
+    an in-process scan still working on the newest bar does not lose its returns for that bar.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, halflife_bars: float | None = None, min_obs: int | None = None, max_symbols: int | None = None,
+                 store: CandleStore | None = None, step: timedelta | None = None):
+        halflife = halflife_bars or settings.CORRELATION_HALFLIFE_BARS
+        self.alpha = 1.0 - 0.5 ** (1.0 / max(halflife, 1e-9))
+        self.min_obs = min_obs if min_obs is not None else settings.CORRELATION_MIN_OBS
+        self.max_symbols = max_symbols or settings.CORRELATION_MAX_SYMBOLS
+        self._mu = Lock()
+        self._idx: Dict[str, int] = {}
+        self._last: Dict[str, Tuple[int, float]] = {}   # symbol -> (last bar ts ms, close)
+        self._pending: Dict[int, Dict[int, float]] = {}  # bar ts ms -> {row: log return}
+        self._mean = np.zeros(0)
+        self._cov = np.zeros((0, 0))
+        self._nobs = np.zeros((0, 0), dtype=np.int32)
+        self._committed_ts = 0
+        self._full_warned = False
+        # Returns of the last CORRELATION_WARMUP_BARS committed bars (circular rows, NaN = no return), for seeding
+        self._hist = np.zeros((settings.CORRELATION_WARMUP_BARS, 0))
+        self._hist_ts = np.zeros(settings.CORRELATION_WARMUP_BARS, dtype=np.int64)
+        self._hist_n = 0
+        self.store = store or CandleStore.instance()
+        self._step = step
+        self._local: set = set()          # symbols scanned in this process; the store path leaves them alone
+        self._store_read = 0.0
+        self._store_seeded = False
+        self._empty_warned = 0.0
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = CorrelationTracker()
+        return cls._instance
+
+    def _row(self, symbol: str) -> int | None:
+        i = self._idx.get(symbol)
+        if i is not None:
+            return i
+        n = len(self._idx)
+        if n >= self.max_symbols:
+            if not self._full_warned:
+                logger.warning(f"Correlation tracker full at {n} symbols; {symbol} and later symbols are not tracked")
+                self._full_warned = True
+            return None
+        if n >= len(self._mean):
+            # Grow capacity geometrically so adding symbols stays amortized O(n^2)
+            cap = min(self.max_symbols, max(16, 2 * n))
+            grow = cap - len(self._mean)
+            self._mean = np.pad(self._mean, (0, grow))
+            self._cov = np.pad(self._cov, ((0, grow), (0, grow)))
+            self._nobs = np.pad(self._nobs, ((0, grow), (0, grow)))
+            self._hist = np.pad(self._hist, ((0, 0), (0, grow)), constant_values=np.nan)
+        self._idx[symbol] = n
+        return n
+
+    # -----------------------
+    # Updates
+    # -----------------------
+    @property
+    def step(self) -> timedelta:
+        if self._step is None:
+            from services.market_data import MarketDataService
+            self._step = MarketDataService.instance()._parse_timeframe_to_timedelta(settings.CORRELATION_TIMEFRAME)
+        return self._step
+
+    def observe(self, symbol: str, ts_ms, closes, local: bool = True) -> int:
+        """Buffer the returns of bars newer than the last one seen for this symbol; returns bars buffered."""
+        ts_ms = np.asarray(ts_ms, dtype=np.int64)
+        closes = np.asarray(closes, dtype=np.float64)
+        with self._mu:
+            if local:
+                self._local.add(symbol)
+            row = self._row(symbol)
+            if row is None or not len(ts_ms):
+                return 0
+            prev = self._last.get(symbol)
+            if prev is None:
+                start = max(0, len(ts_ms) - settings.CORRELATION_WARMUP_BARS - 1)
+                ts_ms, closes = ts_ms[start:], closes[start:]
+            else:
+                keep = ts_ms > prev[0]
+                ts_ms = np.concatenate(([prev[0]], ts_ms[keep]))
+                closes = np.concatenate(([prev[1]], closes[keep]))
+            if len(ts_ms) < 2:
+                return 0
+            with np.errstate(divide="ignore", invalid="ignore"):
+                rets = np.log(closes[1:] / closes[:-1])
+            bar_ts = ts_ms[1:]
+            ok = np.isfinite(rets)
+            old = ok & (bar_ts <= self._committed_ts)
+            n = 0
+            if prev is None and old.any():
+                n += self._seed(row, bar_ts[old], rets[old])
+            for ts, r in zip(bar_ts[ok & ~old].tolist(), rets[ok & ~old].tolist()):
+                self._pending.setdefault(ts, {})[row] = r
+                n += 1
+            self._last[symbol] = (int(ts_ms[-1]), float(closes[-1]))
+            return n
+
+    def _seed(self, row: int, ts_ms: np.ndarray, rets: np.ndarray) -> int:
+        """Replay a new symbol's already committed bars against the kept history; returns bars seeded."""
+        w = len(self._hist_ts)
+        kept = min(self._hist_n, w)
+        if not kept:
+            return 0
+        order = np.arange(self._hist_n - kept, self._hist_n) % w   # oldest first
+        hist_ts = self._hist_ts[order]
+        pos = np.minimum(np.searchsorted(hist_ts, ts_ms), kept - 1)
+        hit = hist_ts[pos] == ts_ms
+        if not hit.any():
+            return 0
+        self._hist[order[pos[hit]], row] = rets[hit]
+        n = len(self._idx)
+        a = self.alpha
+        mean = np.zeros(n)
+        cov = np.zeros(n)
+        nobs = np.zeros(n, dtype=np.int32)
+        for r in self._hist[order, :n]:
+            has = np.isfinite(r)
+            diff = np.where(has, r - mean, 0.0)
+            if has[row]:
+                cov[has] = (1.0 - a) * (cov[has] + a * diff[row] * diff[has])
+                nobs[has] += 1
+            mean[has] += a * diff[has]
+        self._mean[row] = mean[row]
+        self._cov[row, :n] = cov
+        self._cov[:n, row] = cov
+        self._nobs[row, :n] = nobs
+        self._nobs[:n, row] = nobs
+        return int(hit.sum())
+
+    def commit(self, upto: int | None = None) -> int:
+        """Fold buffered bars (those at or before `upto` ms, if given) into the statistics, oldest first; returns bars applied."""
+        with self._mu:
+            bars = sorted(b for b in self._pending.items() if upto is None or b[0] <= upto)
+            for ts, _ in bars:
+                del self._pending[ts]
+            a = self.alpha
+            for ts, rets in bars:
+                rows = np.fromiter(rets.keys(), dtype=np.int64, count=len(rets))
+                r = np.fromiter(rets.values(), dtype=np.float64, count=len(rets))
+                # Means start at 0 (a fair prior for bar log returns): seeding from one noisy return biases
+                # every later deviation when the half-life is long
+                diff = r - self._mean[rows]
+                self._mean[rows] += a * diff
+                block = np.ix_(rows, rows)
+                self._cov[block] = (1.0 - a) * (self._cov[block] + a * np.outer(diff, diff))
+                self._nobs[block] += 1
+                self._committed_ts = max(self._committed_ts, ts)
+                if len(self._hist_ts):
+                    k = self._hist_n % len(self._hist_ts)
+                    self._hist[k] = np.nan
+                    self._hist[k, rows] = r
+                    self._hist_ts[k] = ts
+                    self._hist_n += 1
+            return len(bars)
+
+    def refresh(self, now: float | None = None) -> int:
+        """Feed closed bars of symbols not scanned here from the candle store; returns bars applied."""
+        now = now or time.time()
+        if now - self._store_read < settings.CORRELATION_STORE_REFRESH_SECONDS:
+            return 0
+        self._store_read = now
+        tf = settings.CORRELATION_TIMEFRAME
+        step_ms = int(self.step.total_seconds() * 1000)
+        # The first read seeds the warmup window; later ones only need the last few bars
+        back = settings.CORRELATION_WARMUP_BARS + 2 if not self._store_seeded else 3
+        try:
+            recent = self.store.read_recent(tf, datetime.fromtimestamp(now - back * step_ms / 1000, tz=timezone.utc))
+            for symbol, bars in recent.items():
+                if symbol in self._local:
+                    continue
+                if self._store_seeded and symbol not in self._last:
+                    # A symbol new to the store gets its whole warmup history
+                    bars = self.store.read_range(symbol, tf, limit=settings.CORRELATION_WARMUP_BARS + 2)
+                ts = bars["ts"].astype(np.int64)
+                closed = ts + step_ms <= now * 1000
+                self.observe(symbol, ts[closed], bars["close"][closed], local=False)
+        except Exception as e:
+            logger.warning(f"Correlation tracker could not read the candle store: {e}")
+            return 0
+        self._store_seeded = True
+        if not self._idx and now - self._empty_warned >= 3600:
+            self._empty_warned = now
+            logger.warning(f"Correlation tracker has no {tf} candles (no scans in this process, none in the candle store); "
+                           f"correlation_cap and covariance-aware allocation are inactive")
+        # One bar behind: the newest closed bar is left to an in-process scan's commit, or the next refresh
+        newest_closed = (int(now * 1000) // step_ms - 1) * step_ms
+        return self.commit(upto=newest_closed - step_ms)
+
+    # -----------------------
+    # Lookups
+    # -----------------------
+    def correlation(self, a: str, b: str) -> float | None:
+        i, j = self._idx.get(a), self._idx.get(b)
+        if i is None or j is None or self._nobs[i, j] < self.min_obs:
+            return None
+        den = np.sqrt(self._cov[i, i] * self._cov[j, j])
+        return float(self._cov[i, j] / den) if den > 0 else None
+
+    def covariance(self, symbols: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Covariance among the symbols and a mask of those with CORRELATION_MIN_OBS bars; entries lacking data are 0."""
+        with self._mu:
+            rows = np.array([self._idx.get(s, -1) for s in symbols], dtype=np.int64)
+            known = rows >= 0
+            if not self._cov.size:
+                return np.zeros((len(symbols), len(symbols))), np.zeros(len(symbols), dtype=bool)
+            block = np.ix_(np.where(known, rows, 0), np.where(known, rows, 0))
+            enough = known[:, None] & known[None, :] & (self._nobs[block] >= self.min_obs)
+            return np.where(enough, self._cov[block], 0.0), np.diagonal(enough).copy()
+
+    def max_correlation(self, candidate: str, holdings: List[str]) -> Tuple[str | None, float]:
+        """The holding most correlated with the candidate, and that correlation (None, 0.0 without enough data)."""
+        best, best_rho = None, 0.0
+        for h in holdings:
+            if h == candidate:
+                continue
+            rho = self.correlation(candidate, h)
+            if rho is not None and (best is None or rho > best_rho):
+                best, best_rho = h, rho
+        return best, best_rho
+
+    def stats(self) -> dict:
+        return {"symbols": len(self._idx), "pending_bars": len(self._pending), "min_obs": self.min_obs}
@@ -0,0 +1,337 @@
+#Description: Engine control surface: in-process handle, local HTTP API served by `python -m engine`, and the client the UI uses.
+
+import hmac
+import json
+import os
+import secrets
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlparse
+
+import httpx
+
+from adapters.http_pool import HttpPool
+from models.schemas import SignalOut
+from services.event_log import AlertWriter
+from services.execution import ExecutionService
+from services.monitor import MonitorService
+from services.portfolio import PortfolioService
+from services.scheduler import get_scan_plan, get_scheduler, start_scheduler
+from services.signals import SignalService
+from utils.config import settings
+from utils.logging import logger
+from utils.profiling import profiler
+from utils.tracing import tracer
+
+# Keys accepted by control(); anything else is ignored
+CONTROL_KEYS = (
+    "kill_switch", "flatten", "auto_trade", "confidence_threshold", "risk_config", "signal_params", "portfolio_config",
+    "profiling",
+)
+
+TOKEN_HEADER = "X-Engine-Token"
+
+
+def api_token(create: bool = False) -> str:
+    """
+    Shared secret for the control API: ENGINE_API_TOKEN, else the token file. With create (the server side),
+    a missing file is filled with a random token readable only by this user.
+    """
+    if settings.ENGINE_API_TOKEN:
+        return settings.ENGINE_API_TOKEN
+    path = Path(settings.ENGINE_API_TOKEN_FILE)
+    if path.exists():
+        return path.read_text().strip()
+    if not create:
+        return ""
+    token = secrets.token_urlsafe(32)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(token)
+    return token
+
+
+class LocalEngine:
+    """Runs engine operations against this process's services (the engine itself, or the UI in embedded mode)."""
+
+    remote = False
+
+    def __init__(self):
+        self.signals = SignalService.instance()
+        self.portfolio = PortfolioService.instance()
+        self.monitor = MonitorService.instance()
+        self.execution = ExecutionService.instance()
+        self.started_at = time.time()
+
+    def status(self) -> dict:
+        sched = get_scheduler()
+        jobs = [{"id": j.id, "next_run": j.next_run_time.isoformat() if j.next_run_time else None}
+                for j in (sched.get_jobs() if sched else [])]
+        mon = self.monitor.get_status()
+        return {
+            "pid": os.getpid(),
+            "mode": settings.MODE,
+            "uptime_seconds": round(time.time() - self.started_at, 1),
+            "kill_switch": mon["kill_switch"],
+            "last_flatten": mon["last_flatten"],
+            "risk_config": dict(mon["config"]),
+            "risk_exposure": mon["exposure"],
+            "vol_breaker": mon["vol_breaker"],
+            "auto_trade": self.portfolio._auto_trade,
+            "confidence_threshold": self.portfolio._confidence_threshold,
+            "balances": self.portfolio.get_balances(),
+            "equity": self.portfolio.get_equity(),
+            "signal_params": dict(self.signals.params),
+            "portfolio_config": dict(self.portfolio.config),
+            "jobs": jobs,
+            "scan_plan": get_scan_plan()[:20],
+            "profiling": profiler.status(),
+            "alert_writer": AlertWriter.instance().stats(),
+        }
+
+    def control(self, **changes) -> dict:
+        """Apply only the values that differ from the current state; returns the new status."""
+        current = self.status()
+        if changes.get("flatten"):
+            # Explicit action: engage the kill switch if needed and flatten, retrying whatever is still open
+            self.monitor.set_kill_switch(True, flatten=True)
+        elif "kill_switch" in changes and bool(changes["kill_switch"]) != current["kill_switch"]:
+            self.monitor.set_kill_switch(bool(changes["kill_switch"]))
+        if "auto_trade" in changes and bool(changes["auto_trade"]) != current["auto_trade"]:
+            self.portfolio.set_auto_trade(bool(changes["auto_trade"]))
+        if "confidence_threshold" in changes and float(changes["confidence_threshold"]) != current["confidence_threshold"]:
+            self.portfolio.set_confidence_threshold(float(changes["confidence_threshold"]))
+        if changes.get("risk_config"):
+            self.monitor.update_config(changes["risk_config"])
+        if changes.get("signal_params"):
+            self.signals.update_params(changes["signal_params"])
+        if changes.get("portfolio_config"):
+            self.portfolio.update_config(changes["portfolio_config"])
+        if changes.get("profiling"):
+            p = changes["profiling"]
+            profiler.arm(p.get("jobs", []), int(p.get("runs", 1)), p.get("mode", "cprofile"), bool(p.get("tracemalloc", False)))
+        return self.status()
+
+    def recent_events(self, limit: int = 20) -> list[dict]:
+        return self.portfolio.get_recent_events(limit)
+
+    def recent_logs(self, limit: int = 100) -> list[str]:
+        return list(self.signals.get_recent_logs(limit))
+
+    def trace_stats(self) -> dict:
+        return {"stages": tracer.stage_stats(), "symbols": tracer.symbol_stats()}
+
+    def execute(self, signals: list[SignalOut]) -> dict:
+        return self.execution.allocate_and_execute(signals)
+
+    def place_manual(self, symbol: str, side: str, qty: float, entry: float, tp: float, sl: float, market_type: str) -> dict:
+        return self.execution.place_manual(symbol, side, qty, entry, tp, sl, market_type)
+
+    def close_all_positions(self) -> dict:
+        return self.execution.close_all_positions()
+
+    def rebalance(self) -> dict:
+        return self.execution.rebalance()
+
+
+class RemoteEngine:
+    """Same interface as LocalEngine, served by a separate `python -m engine` process over the local API."""
+
+    remote = True
+
+    def __init__(self, base_url: str, timeout: float = 5.0, token: str | None = None):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.token = api_token() if token is None else token
+        self.client = HttpPool.instance().client
+
+    def _get(self, path: str, **params):
+        r = self.client.get(f"{self.base_url}{path}", params=params or None, timeout=self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def _post(self, path: str, payload: dict | None = None, timeout: float | None = None):
+        r = self.client.post(f"{self.base_url}{path}", json=payload or {}, headers={TOKEN_HEADER: self.token},
+                             timeout=timeout or self.timeout)
+        r.raise_for_status()
+        return r.json()
+
+    def available(self) -> bool:
+        try:
+            self.client.get(f"{self.base_url}/health", timeout=0.5).raise_for_status()
+            return True
+        except httpx.HTTPError:
+            return False
+
+    def status(self) -> dict:
+        return self._get("/status")
+
+    def control(self, **changes) -> dict:
+        # Engaging the kill switch flattens synchronously, for up to KILL_SWITCH_TIMEOUT_SECONDS plus the DB write
+        return self._post("/control", {k: v for k, v in changes.items() if k in CONTROL_KEYS},
+                          timeout=max(60.0, settings.KILL_SWITCH_TIMEOUT_SECONDS + 30.0))
+
+    def recent_events(self, limit: int = 20) -> list[dict]:
+        return self._get("/events", limit=limit)
+
+    def recent_logs(self, limit: int = 100) -> list[str]:
+        return self._get("/logs", limit=limit)
+
+    def trace_stats(self) -> dict:
+        return self._get("/trace")
+
+    def execute(self, signals: list[SignalOut]) -> dict:
+        # Order placement can take several round trips to the exchange
+        return self._post("/actions/execute", {"signals": [s.model_dump(mode="json") for s in signals]}, timeout=60.0)
+
+    def place_manual(self, symbol: str, side: str, qty: float, entry: float, tp: float, sl: float, market_type: str) -> dict:
+        return self._post("/actions/manual_order", dict(symbol=symbol, side=side, qty=qty, entry=entry, tp=tp, sl=sl,
+                                                          market_type=market_type), timeout=60.0)
+
+    def close_all_positions(self) -> dict:
+        return self._post("/actions/close_all", timeout=60.0)
+
+    def rebalance(self) -> dict:
+        return self._post("/actions/rebalance", timeout=60.0)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    engine: LocalEngine = None  # set per server
+    token: str = ""             # set per server
+
+    def log_message(self, fmt, *args):
+        logger.debug(f"Engine API {self.address_string()} {fmt % args}")
+
+    def _send(self, code: int, body) -> None:
+        data = json.dumps(body, default=str).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_text(self, code: int, text: str, content_type: str) -> None:
+        data = text.encode()
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _limit(self, query: dict, default: int) -> int:
+        return int(query.get("limit", [default])[0])
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        try:
+            if url.path == "/health":
+                self._send(200, {"ok": True, "pid": os.getpid()})
+            elif url.path == "/status":
+                self._send(200, self.engine.status())
+            elif url.path == "/events":
+                self._send(200, self.engine.recent_events(self._limit(query, 20)))
+            elif url.path == "/logs":
+                self._send(200, self.engine.recent_logs(self._limit(query, 100)))
+            elif url.path == "/trace":
+                self._send(200, self.engine.trace_stats())
+            elif url.path == "/metrics":
+                # Prometheus scrape target; spans are recorded in this (the engine) process
+                self._send_text(200, tracer.render_prometheus(), "text/plain; version=0.0.4")
+            else:
+                self._send(404, {"error": f"unknown path {url.path}"})
+        except Exception as e:
+            logger.exception(f"Engine API GET {url.path} failed: {e}")
+            self._send(500, {"error": str(e)})
+
+    def _reject_post(self) -> bool:
+        # POSTs change state: JSON only (a cross-site form or text/plain POST cannot send it without a CORS
+        # preflight, which this server never grants) and only with the shared token
+        content_type = (self.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+        if content_type != "application/json":
+            self._send(415, {"error": "Content-Type must be application/json"})
+            return True
+        if not self.token or not hmac.compare_digest(self.headers.get(TOKEN_HEADER, ""), self.token):
+            self._send(401, {"error": f"missing or invalid {TOKEN_HEADER}"})
+            return True
+        return False
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if self._reject_post():
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if path == "/control":
+                out = self.engine.control(**{k: v for k, v in payload.items() if k in CONTROL_KEYS})
+            elif path == "/actions/execute":
+                out = self.engine.execute([SignalOut(**s) for s in payload.get("signals", [])])
+            elif path == "/actions/manual_order":
+                out = self.engine.place_manual(**payload)
+            elif path == "/actions/close_all":
+                out = self.engine.close_all_positions()
+            elif path == "/actions/rebalance":
+                out = self.engine.rebalance()
+            else:
+                self._send(404, {"error": f"unknown path {path}"})
+                return
+            self._send(200, out)
+        except (ValueError, TypeError) as e:
+            self._send(400, {"error": str(e)})
+        except Exception as e:
+            logger.exception(f"Engine API POST {path} failed: {e}")
+            self._send(500, {"error": str(e)})
+
+
+class EngineApiServer:
+    """Threaded JSON-over-HTTP server exposing a LocalEngine; binds to localhost by default."""
+
+    def __init__(self, engine: LocalEngine, host: str | None = None, port: int | None = None, token: str | None = None):
+        handler = type("EngineHandler", (_Handler,), {"engine": engine, "token": api_token(create=True) if token is None else token})
+        self.httpd = ThreadingHTTPServer((host or settings.ENGINE_API_HOST,
+                                          settings.ENGINE_API_PORT if port is None else port), handler)
+        self.httpd.daemon_threads = True
+        self._thread: Thread | None = None
+
+    @property
+    def address(self) -> tuple:
+        return self.httpd.server_address
+
+    def start(self) -> None:
+        self._thread = Thread(target=self.httpd.serve_forever, name="engine-api", daemon=True)
+        self._thread.start()
+        logger.info(f"Engine API listening on http://{self.address[0]}:{self.address[1]}")
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+
+_engine: LocalEngine | RemoteEngine | None = None
+_engine_lock = Lock()
+
+
+def get_engine() -> LocalEngine | RemoteEngine:
+    """
+    Engine handle for the UI. Uses a running `python -m engine` when one answers on the API port;
+    otherwise (if ENGINE_EMBEDDED_FALLBACK) starts the scheduler in this process as before.
+    The choice is made once per process so two schedulers never run side by side.
+    """
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            remote = RemoteEngine(f"http://{settings.ENGINE_API_HOST}:{settings.ENGINE_API_PORT}")
+            if remote.available():
+                logger.info(f"Using headless engine at {remote.base_url}")
+                _engine = remote
+            else:
+                if settings.ENGINE_EMBEDDED_FALLBACK:
+                    logger.warning("No headless engine found; running scheduler inside the UI process.")
+                    start_scheduler()
+                _engine = LocalEngine()
+    return _engine
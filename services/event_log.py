@@ -0,0 +1,132 @@
+#Description: Event pipeline: fixed-capacity in-memory rings for the UI and a background writer batching Alert rows.
+
+import atexit
+import queue
+from collections import deque
+from datetime import datetime
+from threading import Event, Lock, Thread
+from typing import Any, List
+
+from models.db import engine as default_engine
+from models.orm import Alert
+from utils.config import settings
+from utils.logging import logger
+from utils.tracing import span
+
+
+class EventRing:
+    """Keeps the newest `capacity` items; older ones fall off so a long-running process stays bounded."""
+
+    def __init__(self, capacity: int):
+        self._items: deque = deque(maxlen=capacity)
+        self._lock = Lock()
+
+    def append(self, item: Any) -> None:
+        with self._lock:
+            self._items.append(item)
+
+    def recent(self, n: int = 100) -> list:
+        """Up to n newest items, oldest first."""
+        with self._lock:
+            if n >= len(self._items):
+                return list(self._items)
+            return [self._items[i] for i in range(len(self._items) - n, len(self._items))]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class AlertWriter:
+    """
+    Persists Alert rows off the caller's thread. submit() only enqueues; a daemon thread inserts
+    everything queued so far in one transaction every ALERT_FLUSH_INTERVAL_SECONDS (sooner once
+    ALERT_BATCH_SIZE rows are waiting). When the queue is full new alerts are dropped and counted, so
+    a slow database never stalls order placement. Pending alerts are flushed on stop() and at exit.
+    """
+
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, engine=None, interval: float | None = None, batch_size: int | None = None,
+                 max_queue: int | None = None):
+        self.engine = engine or default_engine
+        self.interval = interval or settings.ALERT_FLUSH_INTERVAL_SECONDS
+        self.batch_size = batch_size or settings.ALERT_BATCH_SIZE
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue or settings.ALERT_QUEUE_MAX)
+        self._wake = Event()
+        self._stop = Event()
+        self._flush_lock = Lock()
+        self._thread: Thread | None = None
+        self.written = 0
+        self.dropped = 0
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = AlertWriter()
+        return cls._instance
+
+    def start(self) -> None:
+        with self._flush_lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = Thread(target=self._run, name="alert-writer", daemon=True)
+            self._thread.start()
+        atexit.register(self.stop)
+
+    def submit(self, level: str, message: str, context: dict | None = None, ts: datetime | None = None) -> bool:
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait({"ts": ts or datetime.now(), "level": level, "message": message, "context": context or {}})
+        except queue.Full:
+            self.dropped += 1
+            return False
+        if self._queue.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def _drain(self) -> List[dict]:
+        rows = []
+        while True:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                return rows
+
+    def flush(self) -> int:
+        """Write everything queued so far in one transaction; returns the number of rows written."""
+        with self._flush_lock:
+            rows = self._drain()
+            if not rows:
+                return 0
+            try:
+                with span("db.alerts_flush"), self.engine.begin() as conn:
+                    conn.execute(Alert.__table__.insert(), rows)
+            except Exception as e:
+                self.dropped += len(rows)
+                logger.warning(f"Dropping {len(rows)} alerts, batch insert failed: {e}")
+                return 0
+            self.written += len(rows)
+            return len(rows)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        thread.join(timeout)
+        self._thread = None
+        self.flush()
+
+    def stats(self) -> dict:
+        return {"queued": self._queue.qsize(), "written": self.written, "dropped": self.dropped}
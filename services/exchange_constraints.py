@@ -0,0 +1,163 @@
+#Description: Exchange trading constraints (tick/lot size, min notional) cached in the assets table and memory; vectorized order pre-validation.
+
+import time
+from dataclasses import dataclass
+from threading import Lock
+from typing import Callable, Dict, List
+
+import numpy as np
+from sqlalchemy import select
+
+from models.db import engine as default_engine
+from models.orm import Asset
+from services.market_index import MarketIndex, MarketRecord, _spellings
+from utils.config import settings
+from utils.logging import logger
+
+# Guards floor() against representation error, e.g. 0.3 / 0.1 = 2.9999999999999996
+_EPS = 1e-9
+
+
+@dataclass
+class ConstraintCheck:
+    qty: np.ndarray        # quantities floored to the lot size
+    price: np.ndarray      # prices rounded to the nearest tick
+    ok: np.ndarray         # bool mask of orders the exchange should accept
+    reasons: List[str | None]
+
+
+class ExchangeConstraints:
+    """
+    Per-symbol tick size, lot size and minimum notional, loaded from markets_details (via MarketIndex)
+    into the `assets` table and kept as NumPy arrays. check() rounds and validates a whole batch of
+    orders in a few array operations, so orders the exchange would reject never leave the process.
+
+    The index is re-synced after MARKET_INDEX_TTL_SECONDS. If it is unavailable, the last synced
+    copy in the database is used. Symbols with no known constraints pass through unchanged.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, index_fn: Callable[[], MarketIndex] | None = None, engine=None, ttl_seconds: float | None = None):
+        self.index_fn = index_fn or _default_index
+        self.engine = engine or default_engine
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.MARKET_INDEX_TTL_SECONDS
+        self._sync_lock = Lock()
+        self._row: Dict[str, int] = {}
+        self._tick = np.zeros(0)
+        self._lot = np.zeros(0)
+        self._min_notional = np.zeros(0)
+        self._synced = 0.0
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = ExchangeConstraints()
+        return cls._instance
+
+    # -----------------------
+    # Loading
+    # -----------------------
+    def sync(self) -> int:
+        """Copy the market index into `assets` (upsert on symbol) and memory; returns markets loaded."""
+        with self._sync_lock:
+            records: List[MarketRecord] = []
+            try:
+                records = self.index_fn().records()
+            except Exception as e:
+                logger.warning(f"Market index unavailable for constraints: {e}")
+            if records:
+                self._upsert_assets(records)
+            else:
+                records = self._load_assets()
+            self._set(records)
+            self._synced = time.time()
+            return len(records)
+
+    def _upsert_assets(self, records: List[MarketRecord]) -> None:
+        rows = [{"symbol": r.symbol, "market": "spot", "base": r.base, "quote": r.quote, "tick_size": r.tick_size,
+                 "lot_size": r.lot_size, "min_notional": r.min_notional, "leverage_max": r.leverage_max} for r in records]
+        # markets_details can list one symbol twice; keep the first like the index does
+        rows = list({r["symbol"]: r for r in reversed(rows)}.values())
+        t = Asset.__table__
+        dialect = self.engine.dialect.name
+        with self.engine.begin() as conn:
+            if dialect in ("sqlite", "postgresql"):
+                if dialect == "sqlite":
+                    from sqlalchemy.dialects.sqlite import insert
+                else:
+                    from sqlalchemy.dialects.postgresql import insert
+                stmt = insert(t)
+                conn.execute(stmt.on_conflict_do_update(
+                    index_elements=["symbol"], set_={c: stmt.excluded[c] for c in rows[0] if c != "symbol"}), rows)
+            else:
+                conn.execute(t.delete().where(t.c.symbol.in_([r["symbol"] for r in rows])))
+                conn.execute(t.insert(), rows)
+
+    def _load_assets(self) -> List[MarketRecord]:
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(Asset.__table__)).mappings().all()
+        return [MarketRecord(symbol=r["symbol"], pair=f"{r['base']}_{r['quote']}", base=r["base"], quote=r["quote"],
+                             tick_size=r["tick_size"], lot_size=r["lot_size"], min_notional=r["min_notional"],
+                             leverage_max=r["leverage_max"]) for r in rows]
+
+    def _set(self, records: List[MarketRecord]) -> None:
+        row: Dict[str, int] = {}
+        for i, r in enumerate(records):
+            for k in _spellings(r.base, r.quote, r.pair, r.symbol):
+                row.setdefault(k, i)
+        tick = np.array([r.tick_size for r in records], dtype=np.float64)
+        lot = np.array([r.lot_size for r in records], dtype=np.float64)
+        min_notional = np.array([r.min_notional for r in records], dtype=np.float64)
+        self._row, self._tick, self._lot, self._min_notional = row, tick, lot, min_notional
+
+    def _ensure_synced(self) -> None:
+        if not self._synced or time.time() - self._synced > self.ttl_seconds:
+            self.sync()
+
+    # -----------------------
+    # Validation
+    # -----------------------
+    def check(self, symbols: List[str], qty, price) -> ConstraintCheck:
+        """Round quantities down to the lot and prices to the tick, then validate lot and min notional per order."""
+        self._ensure_synced()
+        qty = np.asarray(qty, dtype=np.float64)
+        price = np.asarray(price, dtype=np.float64)
+        idx = np.array([self._row.get(s.strip().upper(), -1) for s in symbols], dtype=np.int64)
+        known = idx >= 0
+        safe = np.where(known, idx, 0)
+        if self._tick.size:
+            tick, lot, min_notional = self._tick[safe], self._lot[safe], self._min_notional[safe]
+        else:
+            tick = lot = min_notional = np.zeros(len(symbols))
+
+        has_lot = known & (lot > 0)
+        has_tick = known & (tick > 0)
+        r_qty = np.where(has_lot, _snap(np.floor(qty / np.where(has_lot, lot, 1.0) + _EPS) * lot, lot), qty)
+        r_price = np.where(has_tick, _snap(np.round(price / np.where(has_tick, tick, 1.0)) * tick, tick), price)
+
+        below_lot = r_qty <= 0
+        below_notional = known & (r_qty * r_price < min_notional)
+        ok = ~(below_lot | below_notional)
+        reasons: List[str | None] = []
+        for i in range(len(symbols)):
+            if below_lot[i]:
+                reasons.append(f"qty {qty[i]:.8g} below lot size {lot[i]:.8g}")
+            elif below_notional[i]:
+                reasons.append(f"notional {r_qty[i] * r_price[i]:.8g} below minimum {min_notional[i]:.8g}")
+            else:
+                reasons.append(None)
+        return ConstraintCheck(qty=r_qty, price=r_price, ok=ok, reasons=reasons)
+
+
+def _snap(values: np.ndarray, step: np.ndarray) -> np.ndarray:
+    """Strip float noise from step multiples by rounding to each step's decimal places (e.g. 0.01 -> 2)."""
+    scale = 10.0 ** np.clip(np.ceil(-np.log10(np.where(step > 0, step, 1.0)) - _EPS), 0, 12)
+    return np.round(values * scale) / scale
+
+
+def _default_index() -> MarketIndex:
+    # Imported lazily: the market data service is heavy and only needed once constraints are first used
+    from services.market_data import MarketDataService
+    return MarketDataService.instance().markets
@@ -1,17 +1,52 @@
 #Description: Execution service for allocation and order placement (simulation or live adapters).
+import math
 import uuid
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from typing import List
 from threading import Lock
 from datetime import datetime,timezone
 
 from utils.config import settings
 from utils.logging import logger
-from models.db import get_session
-from models.orm import Order, Position
 from models.schemas import SignalOut
+from services.allocator import Allocator, Candidate
+from services.exchange_constraints import ExchangeConstraints
+from services.kill_switch import KillSwitchExecutor
+from services.monitor import MonitorService
+from services.order_store import OrderStore
 from services.portfolio import PortfolioService
+from services.risk_gate import RiskGate, RiskOrder
 from adapters.coindcx_spot import CoinDCXSpotAdapter
 from adapters.coindcx_futures import CoinDCXFuturesAdapter
+from adapters.http_pool import outcome_unknown
+from utils.tracing import span, traced
+
+
+@dataclass
+class OrderTicket:
+    signal: SignalOut
+    qty: float            # base-asset quantity funded by the allocation
+    leverage: int = 1
+    client_id: str = field(default_factory=lambda: f"cli-{uuid.uuid4().hex[:10]}")
+    order_qty: float = 0.0  # quantity sent to the exchange (futures positions are levered); rounded to the lot
+    price: float = 0.0      # limit/reference price, rounded to the tick
+    reserved: float = 0.0   # notional the risk gate holds for this order until it is counted or released
+
+    def __post_init__(self):
+        self.order_qty = self.order_qty or self.qty * self.leverage
+        self.price = self.price or self.signal.entry
+
+
+@dataclass
+class OrderResult:
+    ticket: OrderTicket
+    status: str                      # exchange status, or "unknown" (timed out / transport error) / "error" (rejected, nothing recorded)
+    price: float | None = None
+    side: str | None = None
+    order_type: str = "market"
+    exchange_order_id: str | None = None
+    error: str | None = None
 
 
 class ExecutionService:
@@ -22,6 +57,14 @@ class ExecutionService:
         self.portfolio = PortfolioService.instance()
         self.spot = CoinDCXSpotAdapter()
         self.futures = CoinDCXFuturesAdapter()
+        self.store = OrderStore.instance()
+        self.constraints = ExchangeConstraints.instance()
+        self.monitor = MonitorService.instance()
+        self.flattener = KillSwitchExecutor.instance()
+        self.gate = RiskGate.instance()
+        self.allocator = Allocator.instance()
+        # Orders of one batch go out together; the adapters' rate limiter still paces the actual requests
+        self._pool = ThreadPoolExecutor(max_workers=settings.ORDER_SUBMIT_CONCURRENCY, thread_name_prefix="order")
 
     @classmethod
     def instance(cls):
@@ -31,108 +74,229 @@ class ExecutionService:
         return cls._instance
 
     def _allocation_amounts(self, signals: List[SignalOut]) -> dict:
-        # Compute per-signal allocation using confidence * exp_return weighting, within spot/futures buckets
+        # Split the spot/futures budgets across signals by ALLOCATION_METHOD, each capped at the per-asset cap
         total_equity = self.portfolio.get_equity()
-        spot_budget = total_equity * settings.SPOT_ALLOCATION_PCT
-        fut_budget = total_equity * settings.FUTURES_ALLOCATION_PCT
-
-        spot_sigs = [s for s in signals if s.market == "spot"]
-        fut_sigs = [s for s in signals if s.market == "futures"]
-
-        def weights(sigs):
-            raw = [max(0.0, s.confidence * max(0.0, s.expected_return_pct)) for s in sigs]
-            tot = sum(raw) if sum(raw) > 0 else 1.0
-            return [x / tot for x in raw]
-
-        allocs = {}
-        for sigs, budget in [(spot_sigs, spot_budget), (fut_sigs, fut_budget)]:
-            ws = weights(sigs)
-            for s, w in zip(sigs, ws):
-                allocs[(s.symbol, s.market)] = budget * w
-        return allocs
+        budgets = {"spot": total_equity * settings.SPOT_ALLOCATION_PCT, "futures": total_equity * settings.FUTURES_ALLOCATION_PCT}
+        asset_cap = total_equity * self.monitor.config.get("per_asset_cap_pct", 100.0) / 100.0
+        candidates = [Candidate(s.symbol, s.market, s.confidence * max(0.0, s.expected_return_pct),
+                                s.confidence * s.expected_return_pct / 100.0) for s in signals]
+        amounts = self.allocator.allocate(candidates, budgets, asset_cap)
+        return {(s.symbol, s.market): float(a) for s, a in zip(signals, amounts)}
 
     def allocate_and_execute(self, signals: List[SignalOut]) -> dict:
+        if self.monitor._kill:
+            logger.warning(f"Kill switch on: not executing {len(signals)} signals")
+            return {"orders_placed": 0, "skipped": len(signals), "rejected": 0, "errors": 0, "unknown": 0, "blocked": "kill_switch"}
         # Filter by confidence and max positions
         signals = [s for s in signals if s.confidence >= self.portfolio._confidence_threshold]
         signals = signals[: self.portfolio.config["max_positions"]]
         allocs = self._allocation_amounts(signals)
 
-        placed = 0; skipped = 0; errors = 0
+        tickets = []; skipped = 0
         for s in signals:
-            try:
-                amt = allocs.get((s.symbol, s.market), 0.0)
-                if amt <= 0:
-                    skipped += 1; continue
-                qty = max(0.0, amt / s.entry)
-                if s.market == "spot":
-                    self._place_spot_order(s, qty)
+            amt = allocs.get((s.symbol, s.market), 0.0)
+            if amt <= 0:
+                skipped += 1; continue
+            leverage = 1 if s.market == "spot" else s.suggested_leverage
+            tickets.append(OrderTicket(s, max(0.0, amt / s.entry), leverage))
+        tickets, denied = self._apply_risk(tickets)
+        try:
+            kept, rejected = self._apply_constraints(tickets)
+            results = self._submit_all(kept)
+            placed = self._persist(results)
+        finally:
+            # Orders dropped by the constraint check, rejected by the exchange or lost to an error free their headroom
+            self._release(tickets)
+        errors = sum(1 for r in results if r.status == "error")
+        unknown = sum(1 for r in results if r.status == "unknown")
+        return {"orders_placed": placed, "skipped": skipped, "denied": denied, "rejected": rejected, "errors": errors,
+                "unknown": unknown}
+
+    def _apply_risk(self, tickets: List[OrderTicket]) -> tuple[List[OrderTicket], int]:
+        """Pre-trade risk gate: drop denied orders and shrink resized ones (before lot rounding, which only rounds down)."""
+        if not tickets:
+            return tickets, 0
+        decisions = self.gate.check_batch(
+            [RiskOrder(t.signal.symbol, t.signal.market, t.order_qty * t.price, t.leverage) for t in tickets],
+            self.monitor.config, halted=self.monitor._kill)
+        kept = []
+        for t, d in zip(tickets, decisions):
+            if d.action == "deny":
+                self.portfolio.log_event("WARN", f"Order for {t.signal.symbol} blocked by risk gate: {d.reason}")
+                continue
+            if d.action == "resize":
+                t.order_qty = d.notional / t.price
+                t.qty = t.order_qty / t.leverage
+                self.portfolio.log_event("INFO", f"Order for {t.signal.symbol} {d.reason}")
+            t.reserved = d.notional
+            kept.append(t)
+        return kept, len(tickets) - len(kept)
+
+    def _release(self, tickets: List[OrderTicket]) -> None:
+        for t in tickets:
+            if t.reserved:
+                self.gate.release(t.signal.symbol, t.signal.market, t.reserved, t.leverage)
+                t.reserved = 0.0
+
+    def _apply_constraints(self, tickets: List[OrderTicket]) -> tuple[List[OrderTicket], int]:
+        """
+        Round the batch's spot orders to tick/lot sizes and drop those below lot or min notional before anything
+        is sent. The constraints come from the spot markets_details, so futures orders pass through unchanged:
+        their instruments have their own lot and tick sizes, and the exchange validates them. If the check
+        fails in live mode, the spot orders are rejected and the futures orders are kept.
+        """
+        spot = [t for t in tickets if t.signal.market == "spot"]
+        if not spot:
+            return tickets, 0
+        try:
+            chk = self.constraints.check([t.signal.symbol for t in spot], [t.order_qty for t in spot],
+                                         [t.price for t in spot])
+        except Exception as e:
+            if settings.MODE in ("paper","dryrun"):
+                logger.warning(f"Constraint check unavailable, simulating unrounded orders: {e}")
+                return tickets, 0
+            # Only the spot orders depend on the check; futures orders still go out
+            logger.error(f"Constraint check unavailable, not sending {len(spot)} spot orders: {e}")
+            self.portfolio.log_event("ERROR", f"{len(spot)} spot orders not sent: exchange constraint check failed ({e})")
+            return [t for t in tickets if t.signal.market != "spot"], len(spot)
+        kept = [t for t in tickets if t.signal.market != "spot"]
+        for i, t in enumerate(spot):
+            if not chk.ok[i]:
+                self.portfolio.log_event("WARN", f"Order for {t.signal.symbol} not sent: {chk.reasons[i]}")
+                continue
+            t.order_qty, t.price = float(chk.qty[i]), float(chk.price[i])
+            t.qty = t.order_qty / t.leverage
+            kept.append(t)
+        return kept, len(tickets) - len(kept)
+
+    # -----------------------
+    # Submission
+    # -----------------------
+    def _submit_all(self, tickets: List[OrderTicket]) -> List[OrderResult]:
+        """
+        Send all orders at once through the bounded pool (the adapters' rate limiter still paces them)
+        and collect one result per ticket. Orders still in flight at the deadline, and orders whose request
+        failed in transit (timeouts, dropped connections, 5xx), are reported as "unknown": they may have
+        reached the exchange, so they are recorded and reconciliation looks them up by client id.
+        """
+        if not tickets:
+            return []
+        waves = math.ceil(len(tickets) / settings.ORDER_SUBMIT_CONCURRENCY)
+        futures = [self._pool.submit(self._submit_one, t) for t in tickets]
+        done, _ = wait(futures, timeout=settings.ORDER_SUBMIT_TIMEOUT_SECONDS * waves)
+        results = []
+        for t, f in zip(tickets, futures):
+            if f not in done:
+                f.cancel()
+                logger.warning(f"Order {t.client_id} for {t.signal.symbol} timed out; outcome unknown")
+                results.append(OrderResult(t, "unknown"))
+            elif f.exception() is not None and outcome_unknown(f.exception()):
+                # The request may have been accepted before the connection failed: record it for reconciliation
+                logger.warning(f"Order {t.client_id} for {t.signal.symbol} failed in transit ({f.exception()!r}); outcome unknown")
+                results.append(OrderResult(t, "unknown", error=str(f.exception())))
+            elif f.exception() is not None:
+                logger.opt(exception=f.exception()).error(f"Order failed for {t.signal.symbol}: {f.exception()}")
+                results.append(OrderResult(t, "error", error=str(f.exception())))
+            else:
+                results.append(f.result())
+        return results
+
+    def _submit_one(self, t: OrderTicket) -> OrderResult:
+        with span("order.place", t.signal.symbol):
+            if t.signal.market == "spot":
+                return self._submit_spot(t)
+            return self._submit_futures(t)
+
+    @traced("order.spot")
+    def _submit_spot(self, t: OrderTicket) -> OrderResult:
+        s = t.signal
+        if settings.MODE in ("paper","dryrun"):
+            return OrderResult(t, "filled", price=s.entry, side=s.side)
+        res = self.spot.place_market_order(symbol=s.symbol, side="buy", qty=t.order_qty, client_id=t.client_id)
+        return OrderResult(t, res.get("status","filled"), price=res.get("avg_price", s.entry), side="BUY",
+                           exchange_order_id=res.get("order_id"))
+
+    @traced("order.futures")
+    def _submit_futures(self, t: OrderTicket) -> OrderResult:
+        s = t.signal
+        if settings.MODE in ("paper","dryrun"):
+            return OrderResult(t, "filled", price=t.price, side=s.side, order_type="limit")
+        res = self.futures.place_limit_order(symbol=s.symbol, side="buy", qty=t.order_qty, price=t.price, client_id=t.client_id,
+                                             leverage=t.leverage, stop_loss=s.sl, take_profit=s.tp)
+        return OrderResult(t, res.get("status","new"), price=t.price, side="BUY", order_type="limit",
+                           exchange_order_id=res.get("order_id"))
+
+    # -----------------------
+    # Persistence
+    # -----------------------
+    def _persist(self, results: List[OrderResult]) -> int:
+        """Record every submitted order (and a position for each accepted one) in one bulk transaction; returns orders placed."""
+        recorded = [r for r in results if r.status != "error"]
+        if not recorded:
+            return 0
+        orders, positions, counted = [], [], []
+        for r in recorded:
+            t, s = r.ticket, r.ticket.signal
+            side, price = r.side or s.side, r.price or s.entry
+            orders.append(dict(symbol=s.symbol, market=s.market, side=side, type=r.order_type, qty=t.order_qty, price=price,
+                               status=r.status, exchange_order_id=r.exchange_order_id, tp_price=s.tp, sl_price=s.sl,
+                               client_id=t.client_id))
+            # An unknown order may be live: it holds its exposure until reconciliation settles it
+            counted.append((t, t.order_qty * price))
+            if r.status != "unknown":
+                positions.append(dict(symbol=s.symbol, market=s.market, side=side, entry_price=price, qty=t.order_qty,
+                                      leverage=t.leverage, sl=s.sl, tp=s.tp, status="open"))
+        self.store.record_batch(orders, positions)
+        for t, notional in counted:
+            self.gate.on_fill(t.signal.symbol, t.signal.market, notional, t.leverage, reserved=t.reserved)
+            t.reserved = 0.0
+
+        placed = 0
+        for r in recorded:
+            t, s = r.ticket, r.ticket.signal
+            if r.status == "unknown":
+                self.portfolio.log_event("WARN", f"Order {t.client_id} {s.symbol} timed out; status unknown until reconciled")
+                continue
+            placed += 1
+            live = settings.MODE not in ("paper","dryrun")
+            if s.market == "spot":
+                if not live:
+                    self.portfolio.adjust_balance("spot", delta=-(t.qty * s.entry))
+                    self.portfolio.log_event("INFO", f"SIM SPOT BUY {s.symbol} qty={t.qty:.6f} @ {s.entry:.6f}")
+                else:
+                    self.portfolio.log_event("INFO", f"LIVE SPOT BUY {s.symbol} qty={t.qty:.6f}")
+            else:
+                if not live:
+                    # Deduct margin estimate
+                    self.portfolio.adjust_balance("futures", delta=-(t.qty * s.entry / t.leverage))
+                    self.portfolio.log_event("INFO", f"SIM FUT BUY {s.symbol} qty={t.order_qty:.6f} lev={t.leverage} @ {s.entry:.6f}")
                 else:
-                    self._place_futures_order(s, qty, leverage=s.suggested_leverage)
-                placed += 1
+                    self.portfolio.log_event("INFO", f"LIVE FUT BUY {s.symbol} qty={t.order_qty:.6f}")
+        return placed
+
+    def _place_single(self, t: OrderTicket):
+        kept, _ = self._apply_risk([t])
+        if not kept:
+            raise ValueError(f"Order for {t.signal.symbol} blocked by the risk gate")
+        try:
+            kept, _ = self._apply_constraints(kept)
+            if not kept:
+                raise ValueError(f"Order for {t.signal.symbol} rejected by the exchange constraint check")
+            try:
+                result = self._submit_one(t)
             except Exception as e:
-                logger.exception(f"Order failed for {s.symbol}: {e}")
-                errors += 1
-        return {"orders_placed": placed, "skipped": skipped, "errors": errors}
+                if outcome_unknown(e):
+                    self._persist([OrderResult(t, "unknown", error=str(e))])
+                raise
+            self._persist([result])
+        finally:
+            self._release([t])
 
     def _place_spot_order(self, s: SignalOut, qty: float):
-        client_id = f"cli-{uuid.uuid4().hex[:10]}"
-        # Simulation or live
-        if settings.MODE in ("paper","dryrun"):
-            with get_session() as db:
-                order = Order(symbol=s.symbol, market="spot", side=s.side, qty=qty, price=s.entry, status="filled",
-                              tp_price=s.tp, sl_price=s.sl, client_id=client_id, type="market")
-                db.add(order)
-                db.flush()
-                pos = Position(symbol=s.symbol, market="spot", side=s.side, entry_price=s.entry, qty=qty, leverage=1,
-                               sl=s.sl, tp=s.tp, status="open")
-                db.add(pos)
-                db.commit()
-            self.portfolio.adjust_balance("spot", delta=-(qty * s.entry))
-            self.portfolio.log_event("INFO", f"SIM SPOT BUY {s.symbol} qty={qty:.6f} @ {s.entry:.6f}")
-        else:
-            # Implement live order via adapter
-            res = self.spot.place_market_order(symbol=s.symbol, side="buy", qty=qty, client_id=client_id)
-            with get_session() as db:
-                order = Order(symbol=s.symbol, market="spot", side="BUY", qty=qty, price=res.get("avg_price", s.entry),
-                              status=res.get("status","filled"), exchange_order_id=res.get("order_id"), tp_price=s.tp, sl_price=s.sl, client_id=client_id)
-                db.add(order)
-                db.flush()
-                pos = Position(symbol=s.symbol, market="spot", side="BUY", entry_price=order.price, qty=qty, leverage=1,
-                               sl=s.sl, tp=s.tp, status="open")
-                db.add(pos)
-                db.commit()
-            self.portfolio.log_event("INFO", f"LIVE SPOT BUY {s.symbol} qty={qty:.6f}")
+        self._place_single(OrderTicket(s, qty, 1))
 
     def _place_futures_order(self, s: SignalOut, qty: float, leverage: int):
-        client_id = f"cli-{uuid.uuid4().hex[:10]}"
-        eff_qty = qty * leverage
-        if settings.MODE in ("paper","dryrun"):
-            with get_session() as db:
-                order = Order(symbol=s.symbol, market="futures", side=s.side, qty=eff_qty, price=s.entry, status="filled",
-                              tp_price=s.tp, sl_price=s.sl, client_id=client_id, type="limit")
-                db.add(order)
-                db.flush()
-                pos = Position(symbol=s.symbol, market="futures", side=s.side, entry_price=s.entry, qty=eff_qty, leverage=leverage,
-                               sl=s.sl, tp=s.tp, status="open")
-                db.add(pos)
-                db.commit()
-            # Deduct margin estimate
-            margin = qty * s.entry / leverage
-            self.portfolio.adjust_balance("futures", delta=-margin)
-            self.portfolio.log_event("INFO", f"SIM FUT BUY {s.symbol} qty={eff_qty:.6f} lev={leverage} @ {s.entry:.6f}")
-        else:
-            res = self.futures.place_limit_order(symbol=s.symbol, side="buy", qty=eff_qty, price=s.entry, client_id=client_id, leverage=leverage,
-                                                 stop_loss=s.sl,take_profit=s.tp)
-            with get_session() as db:
-                order = Order(symbol=s.symbol, market="futures", side="BUY", qty=eff_qty, price=s.entry,
-                              status=res.get("status","new"), exchange_order_id=res.get("order_id"), tp_price=s.tp, sl_price=s.sl, client_id=client_id)
-                db.add(order)
-                db.flush()
-                pos = Position(symbol=s.symbol, market="futures", side="BUY", entry_price=s.entry, qty=eff_qty, leverage=leverage,
-                               sl=s.sl, tp=s.tp, status="open")
-                db.add(pos)
-                db.commit()
-            self.portfolio.log_event("INFO", f"LIVE FUT BUY {s.symbol} qty={eff_qty:.6f}")
+        self._place_single(OrderTicket(s, qty, leverage))
 
     def place_manual(self, symbol: str, side: str, qty: float, entry: float, tp: float, sl: float, market_type: str):
         s = SignalOut(symbol=symbol, market=market_type, timeframe="manual", ts=datetime.now(timezone.utc), confidence=1.0,
@@ -144,12 +308,10 @@ class ExecutionService:
         return {"status": "ok", "symbol": symbol}
 
     def close_all_positions(self):
-        with get_session() as db:
-            pos = db.query(Position).filter(Position.status == "open").all()
-            for p in pos:
-                p.status = "closed"; p.ts_close = datetime.now(timezone.utc)
-            db.commit()
-        return {"closed": len(pos)}
+        # Real reduce-only closes on the exchange in live mode; open orders are left alone
+        report = self.flattener.flatten(cancel_orders=False, reason="close all")
+        return {"closed": report.get("positions_closed", 0), "failed": len(report.get("failed", [])),
+                "time_to_flat_ms": report.get("time_to_flat_ms")}
 
     def rebalance(self):
         # Placeholder
@@ -0,0 +1,161 @@
+#Description: Historical candle loader for data/; Parquet, Arrow IPC (memory-mapped) and CSV with typed columns, tail-only reads and an mtime-keyed cache.
+
+import io
+import os
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+from utils.logging import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency; CSV still works without it
+    pa = None
+    pq = None
+
+OHLCV_COLUMNS = ("open", "high", "low", "close", "volume")
+
+# Search order when several formats exist for the same symbol/timeframe
+SUFFIXES = (".parquet", ".arrow", ".feather", ".csv")
+
+_CSV_BLOCK = 1 << 16
+
+
+class HistoryLoader:
+    """
+    Loads `{symbol}_{timeframe}.{parquet|arrow|feather|csv}` from a data directory.
+
+    With a limit, only the trailing rows are read: the last row groups of a Parquet file, the last
+    record batches of a memory-mapped Arrow file, or the last lines of a CSV (read backwards in
+    blocks). Results are cached per (path, mtime, size, limit), so an edited file is re-read.
+    """
+
+    def __init__(self, data_dir: Path, float_dtype: str = "float64", cache_size: int = 32):
+        self.data_dir = Path(data_dir)
+        self.float_dtype = np.dtype(float_dtype)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[tuple, pd.DataFrame]" = OrderedDict()
+        self._lock = Lock()
+
+    def find(self, symbol: str, timeframe: str) -> Path | None:
+        for suffix in SUFFIXES:
+            if suffix != ".csv" and pa is None:
+                continue
+            path = self.data_dir / f"{symbol}_{timeframe}{suffix}"
+            if path.exists():
+                return path
+        return None
+
+    def load(self, symbol: str, timeframe: str, limit: int | None = None) -> pd.DataFrame | None:
+        """Return the (tail of the) stored history sorted by ts, or None if no file exists."""
+        path = self.find(symbol, timeframe)
+        if path is None:
+            return None
+        st = path.stat()
+        key = (str(path), st.st_mtime_ns, st.st_size, int(limit) if limit else None)
+        with self._lock:
+            df = self._cache.get(key)
+            if df is not None:
+                self._cache.move_to_end(key)
+                return df
+
+        try:
+            if path.suffix == ".parquet":
+                df = self._read_parquet(path, limit)
+            elif path.suffix in (".arrow", ".feather"):
+                df = self._read_ipc(path, limit)
+            else:
+                df = self._read_csv(path, limit)
+        except Exception as e:
+            logger.warning(f"Failed to load history from {path}: {e}")
+            return None
+        df = self._normalize(df, limit)
+
+        with self._lock:
+            # Drop entries for older versions of this file before caching the new one
+            for k in [k for k in self._cache if k[0] == key[0] and k[1:3] != key[1:3]]:
+                del self._cache[k]
+            self._cache[key] = df
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return df
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+
+    # -----------------------
+    # Readers
+    # -----------------------
+    def _read_csv(self, path: Path, limit: int | None) -> pd.DataFrame:
+        engine = "pyarrow" if pa is not None else "c"
+        dtypes = {c: self.float_dtype for c in OHLCV_COLUMNS}
+        if not limit:
+            return pd.read_csv(path, engine=engine, dtype=dtypes)
+
+        with open(path, "rb") as f:
+            header = f.readline()
+            body_start = f.tell()
+            end = f.seek(0, os.SEEK_END)
+            pos, chunks, newlines = end, [], 0
+            # Read backwards until we hold limit+1 line breaks (one may be the trailing newline)
+            while pos > body_start and newlines <= limit:
+                step = min(_CSV_BLOCK, pos - body_start)
+                pos -= step
+                f.seek(pos)
+                chunk = f.read(step)
+                chunks.append(chunk)
+                newlines += chunk.count(b"\n")
+        tail = b"".join(reversed(chunks))
+        if pos > body_start:
+            # Drop the partial first line
+            tail = tail[tail.index(b"\n") + 1:]
+        return pd.read_csv(io.BytesIO(header + tail), engine=engine, dtype=dtypes)
+
+    def _read_parquet(self, path: Path, limit: int | None) -> pd.DataFrame:
+        pf = pq.ParquetFile(path)
+        if not limit:
+            return pf.read().to_pandas()
+        groups, rows = [], 0
+        for i in range(pf.num_row_groups - 1, -1, -1):
+            groups.append(i)
+            rows += pf.metadata.row_group(i).num_rows
+            if rows >= limit:
+                break
+        return pf.read_row_groups(sorted(groups)).to_pandas()
+
+    def _read_ipc(self, path: Path, limit: int | None) -> pd.DataFrame:
+        with pa.memory_map(str(path), "r") as source:
+            reader = pa.ipc.open_file(source)
+            if not limit:
+                return reader.read_all().to_pandas()
+            batches, rows = [], 0
+            for i in range(reader.num_record_batches - 1, -1, -1):
+                batch = reader.get_batch(i)
+                batches.append(batch)
+                rows += batch.num_rows
+                if rows >= limit:
+                    break
+            return pa.Table.from_batches(list(reversed(batches))).to_pandas()
+
+    # -----------------------
+    # Normalization
+    # -----------------------
+    def _normalize(self, df: pd.DataFrame, limit: int | None) -> pd.DataFrame:
+        ts = df["ts"]
+        if pd.api.types.is_numeric_dtype(ts):
+            df["ts"] = pd.to_datetime(ts, unit="ms", utc=True)
+        elif not isinstance(ts.dtype, pd.DatetimeTZDtype):
+            df["ts"] = pd.to_datetime(ts, utc=True, format="ISO8601")
+        for c in OHLCV_COLUMNS:
+            if c in df.columns and df[c].dtype != self.float_dtype:
+                df[c] = df[c].astype(self.float_dtype)
+        if limit and len(df) > limit:
+            df = df.iloc[-int(limit):]
+        return df.reset_index(drop=True)
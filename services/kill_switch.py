@@ -0,0 +1,191 @@
+#Description: Kill-switch fast path: cancel every open order and close every open position concurrently, with time-to-flat per position.
+
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+from threading import Lock
+from typing import List
+
+from sqlalchemy import or_, select
+
+from models.db import engine as default_engine
+from adapters.http_pool import outcome_unknown
+from models.orm import Order, Position
+from services.order_store import OrderStore, close_client_id, closed_position_id
+from services.reconciler import OPEN_STATUSES
+from services.risk_gate import RiskGate
+from utils.config import settings
+from utils.logging import logger
+from utils.tracing import span
+
+# Close-order statuses that mean the exchange took the order (market orders fill immediately)
+ACCEPTED = ("new", "open", "filled", "partial", "partially_filled")
+
+
+class KillSwitchExecutor:
+    """
+    Flattens the book as fast as the rate limits allow.
+
+    Every cancel (open orders) and every reduce-only close (open positions) is submitted at once
+    through a dedicated pool. The adapters' order-class rate limiter paces the requests and gives
+    them order priority over other traffic. A position counts as flat when the exchange accepts its
+    close order, and its time-to-flat is measured from the start of the flatten. Anything unconfirmed
+    within KILL_SWITCH_TIMEOUT_SECONDS stays open in the database and is listed as failed; a close
+    that timed out or broke off in transit is also recorded as an "unknown" reduce-only order, so
+    the reconciler finds it by client id. Flattening again retries whatever is still open, except
+    positions whose earlier close is still unknown: that close may yet fill (a running request cannot
+    be recalled), so a second one could sell twice. Those wait until reconciliation settles the
+    close: filled closes the position, never found marks it rejected and the next flatten retries.
+    All database changes are written in one transaction after the responses are in.
+
+    In paper/dryrun mode nothing is sent: positions close at their last marked PnL (from the
+    monitor) and simulated orders are canceled.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, spot=None, futures=None, store: OrderStore | None = None, engine=None, portfolio=None,
+                 gate: RiskGate | None = None):
+        if spot is None or futures is None:
+            from adapters.coindcx_futures import CoinDCXFuturesAdapter
+            from adapters.coindcx_spot import CoinDCXSpotAdapter
+            spot = spot or CoinDCXSpotAdapter()
+            futures = futures or CoinDCXFuturesAdapter()
+        if portfolio is None:
+            from services.portfolio import PortfolioService
+            portfolio = PortfolioService.instance()
+        self.spot, self.futures, self.portfolio = spot, futures, portfolio
+        self.store = store or OrderStore.instance()
+        self.engine = engine or default_engine
+        self.gate = gate or RiskGate.instance()
+        self._pool = ThreadPoolExecutor(max_workers=settings.KILL_SWITCH_CONCURRENCY, thread_name_prefix="flatten")
+        self._running = Lock()
+        self.last_report: dict = {}
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = KillSwitchExecutor()
+        return cls._instance
+
+    def _load(self, cancel_orders: bool):
+        o, p = Order.__table__, Position.__table__
+        with self.engine.connect() as conn:
+            positions = [dict(r) for r in conn.execute(select(p).where(p.c.status == "open")).mappings().all()]
+            unconfirmed = conn.execute(select(o.c.client_id).where(o.c.status == "unknown", o.c.reduce_only.is_(True))).scalars().all()
+            orders = []
+            if cancel_orders:
+                orders = [dict(r) for r in conn.execute(select(o).where(
+                    o.c.status.in_(OPEN_STATUSES), o.c.status != "unknown",
+                    or_(o.c.exchange_order_id.is_(None), ~o.c.exchange_order_id.like("SIM-%")))).mappings().all()]
+        pending = {closed_position_id(c): c for c in unconfirmed}
+        return orders, [p for p in positions if p["id"] not in pending], \
+            [dict(p, client_id=pending[p["id"]]) for p in positions if p["id"] in pending]
+
+    def flatten(self, cancel_orders: bool = True, reason: str = "kill switch") -> dict:
+        # A second trigger while one flatten is in flight would only double the close orders
+        if not self._running.acquire(blocking=False):
+            return {"status": "busy"}
+        try:
+            with span("kill_switch.flatten"):
+                report = self._flatten(cancel_orders, reason)
+        finally:
+            self._running.release()
+        self.last_report = report
+        return report
+
+    def _flatten(self, cancel_orders: bool, reason: str) -> dict:
+        t0 = time.perf_counter()
+        orders, positions, pending = self._load(cancel_orders)
+        live = settings.MODE == "live"
+
+        def _cancel(o: dict) -> dict:
+            if live and o["exchange_order_id"]:
+                adapter = self.spot if o["market"] == "spot" else self.futures
+                adapter.cancel_order(o["exchange_order_id"])
+            return {"elapsed": time.perf_counter() - t0}
+
+        def _close(p: dict, client_id: str) -> dict:
+            side = _close_side(p)
+            res = {"status": "filled", "order_id": None}
+            if live:
+                if p["market"] == "spot":
+                    res = self.spot.place_market_order(symbol=p["symbol"], side=side.lower(), qty=p["qty"], client_id=client_id)
+                else:
+                    res = self.futures.close_position(symbol=p["symbol"], side=side.lower(), qty=p["qty"], client_id=client_id)
+            return {"elapsed": time.perf_counter() - t0, **res}
+
+        cancel_futs = [self._pool.submit(_cancel, o) for o in orders]
+        client_ids = [close_client_id(p["id"]) for p in positions]
+        close_futs = [self._pool.submit(_close, p, c) for p, c in zip(positions, client_ids)]
+        wait(cancel_futs + close_futs, timeout=settings.KILL_SWITCH_TIMEOUT_SECONDS)
+        now = datetime.now(timezone.utc)
+
+        order_updates, pos_updates, close_orders, failed = [], [], [], []
+        for o, f in zip(orders, cancel_futs):
+            if f.done() and f.exception() is None:
+                order_updates.append({"id": o["id"], "status": "canceled"})
+            else:
+                failed.append({"kind": "cancel", "symbol": o["symbol"], "order_id": o["exchange_order_id"],
+                               "error": _error(f)})
+        for p in pending:
+            failed.append({"kind": "close_pending", "symbol": p["symbol"], "position_id": p["id"], "client_id": p["client_id"],
+                           "error": "earlier close unconfirmed; awaiting reconciliation"})
+        flat: List[dict] = []
+        for p, client_id, f in zip(positions, client_ids, close_futs):
+            res = f.result() if f.done() and f.exception() is None else None
+            if res is None or str(res.get("status", "")).lower() not in ACCEPTED:
+                # A close still in flight, or one whose request broke off after sending, may yet fill
+                in_doubt = res is None and (not f.done() or outcome_unknown(f.exception()))
+                failed.append({"kind": "close", "symbol": p["symbol"], "position_id": p["id"], "client_id": client_id,
+                               "error": _error(f) if res is None else f"status {res.get('status')}"})
+                if live and in_doubt:
+                    close_orders.append(_close_order(p, "unknown", None, client_id))
+                continue
+            pos_updates.append({"id": p["id"], "status": "closed", "ts_close": now})
+            if live:
+                close_orders.append(_close_order(p, str(res.get("status", "new")).lower(), res.get("order_id"), client_id))
+            flat.append({"symbol": p["symbol"], "market": p["market"], "qty": p["qty"],
+                         "time_to_flat_ms": round(res["elapsed"] * 1000, 1)})
+
+        self.store.apply_changes(order_updates, pos_updates, new_orders=close_orders)
+        closed = {u["id"] for u in pos_updates}
+        for p in positions:
+            if p["id"] in closed:
+                pnl = p["unrealized_pnl"] or 0.0
+                self.gate.on_close(p["id"], p["symbol"], p["market"], p["qty"] * p["entry_price"], p["leverage"] or 1, pnl)
+                if not live:
+                    self.portfolio.adjust_balance(p["market"], delta=pnl)
+
+        report = {
+            "reason": reason,
+            "orders_canceled": len(order_updates),
+            "positions_closed": len(flat),
+            "failed": failed,
+            "positions": flat,
+            "time_to_flat_ms": round((time.perf_counter() - t0) * 1000, 1),
+        }
+        if failed:
+            logger.error(f"Flatten ({reason}) left {len(failed)} items unconfirmed: {failed}")
+        level = "WARN" if not failed else "ERROR"
+        self.portfolio.log_event(level, f"Flatten ({reason}): {len(order_updates)} orders canceled, {len(flat)} positions closed, "
+                                        f"{len(failed)} failed in {report['time_to_flat_ms']} ms", {"failed": failed})
+        return report
+
+
+def _close_side(p: dict) -> str:
+    return "SELL" if p["side"].upper() == "BUY" else "BUY"
+
+
+def _close_order(p: dict, status: str, order_id: str | None, client_id: str) -> dict:
+    return dict(symbol=p["symbol"], market=p["market"], side=_close_side(p), type="market", qty=p["qty"],
+                price=p["entry_price"], status=status, exchange_order_id=order_id, tp_price=None, sl_price=None,
+                reduce_only=True, client_id=client_id)
+
+
+def _error(f) -> str:
+    if not f.done():
+        f.cancel()
+        return "timeout"
+    return str(f.exception())
@@ -1,6 +1,5 @@
 #Description: Market data service using CoinDCX public ticker; candles via CSV fallback and synthetic if needed.
 
-import httpx
 import pandas as pd
 import numpy as np
 from typing import Optional,Tuple,Dict,Any,List
@@ -14,20 +13,43 @@ from sympy import true
 
 from utils.logging import logger
 from adapters.coindcx_common import CoinDCXBaseAdapter
+from adapters.rate_limit import PRIORITY_DEFAULT
 from utils.config import settings
+from services.market_index import MarketIndex, MarketRecord
+from utils.singleflight import SingleFlight
+from services.history_loader import HistoryLoader
+from services.candle_store import CandleStore
+from services.ring_buffer import RingBufferRegistry
+from services.shm_cache import SharedMarketCache
+from utils.tracing import span
+
+KNOWN_QUOTES = ("USDT", "USDC", "BUSD", "BTC", "ETH", "INR", "USD", "EUR")
 
 class MarketDataService:
     _instance = None
     _lock = Lock()
     # reuse one session and cache for speed
     _cg_coins_cache: Optional[List[Dict[str, Any]]] = None
-    _coindcx_markets_cache: Optional[List[Dict[str, Any]]] = None
 
     def __init__(self):
-        self.client = httpx.Client(timeout=10)
-        self.csv_dir = Path(__file__).resolve().parents[2] / "data"
+        self.csv_dir = Path(__file__).resolve().parents[1] / "data"
         self.csv_dir.mkdir(parents=True, exist_ok=True)
+        self.history = HistoryLoader(self.csv_dir, float_dtype=settings.HISTORY_FLOAT_DTYPE)
+        self.candles = CandleStore.instance()
+        # Rolling per-(symbol, timeframe) windows fed by every live fetch; hot paths read views from here
+        self.windows = RingBufferRegistry(capacity=settings.RING_BUFFER_BARS, dtype=settings.RING_BUFFER_DTYPE)
+        # One process writes fetched candles/tickers to mapped files; the others read them instead of refetching
+        self.shared = None
+        if settings.SHM_CACHE_ENABLED:
+            try:
+                self.shared = SharedMarketCache(Path(settings.CACHE_DIR) / "shm", capacity=settings.RING_BUFFER_BARS,
+                                                dtype=settings.RING_BUFFER_DTYPE, role=settings.SHM_CACHE_ROLE)
+            except OSError as e:
+                logger.warning(f"Shared market cache disabled: {e}")
         self.coindcx= CoinDCXBaseAdapter(settings.COINDCX_FUT_API_KEY, settings.COINDCX_FUT_API_SECRET)
+        self.markets = MarketIndex(lambda: self.coindcx.get("/exchange/v1/markets_details"))
+        # Streamlit pages and the scheduler share this singleton; identical concurrent requests share one HTTP call
+        self._flight = SingleFlight()
 
     @classmethod
     def instance(cls):
@@ -36,10 +58,20 @@ class MarketDataService:
                 cls._instance = MarketDataService()
         return cls._instance
 
-    def get_tickers(self, limit: int = 10):
+    def _fetch_ticker_rows(self) -> list:
+        shared = self.shared
+        if shared is not None and not shared.is_writer:
+            rows = shared.read_tickers(max_age_seconds=settings.SHM_CACHE_MAX_AGE_SECONDS)
+            if rows:
+                return rows
+        rows = self.coindcx.get("/exchange/ticker")
+        if shared is not None and shared.is_writer:
+            shared.publish_tickers(rows)
+        return rows
+
+    def get_tickers(self, limit: int = 10, fallback: bool = True):
         try:
-            r = self.client.get("https://api.coindcx.com/exchange/ticker")
-            arr = r.json()
+            arr = self._flight.do(("tickers",), self._fetch_ticker_rows)
             # Normalize to USDT quote and sort by volume or price change
             df = pd.DataFrame(arr)
             # Fallback if fields differ by API updates
@@ -59,24 +91,61 @@ class MarketDataService:
             return out
         except Exception as e:
             logger.warning(f"Ticker fetch failed: {e}")
+            if not fallback:
+                return []
             # Return a synthetic minimal set
             # TODO learn
             return [{"symbol":"BTCUSDT","last":60000.0,"change_pct":0.0}, {"symbol":"ETHUSDT","last":3000.0,"change_pct":0.0}]
         
-    def _load_csv(self, symbol: str, timeframe: str) -> pd.DataFrame | None:
-        fname = f"{symbol}_{timeframe}.csv"
-        fpath = self.csv_dir / fname
-        if fpath.exists():
-            df = pd.read_csv(fpath)
-            df["ts"] = pd.to_datetime(df["ts"])
-            return df
-        return None
+    async def aget_candles_df(self, symbol: str, timeframe: str, limit: int = 300, source: str = "coindcx") -> pd.DataFrame:
+        """Asyncio entry point; coalesces with concurrent sync and async callers."""
+        key = ("candles_df", symbol.strip().upper(), timeframe, int(limit), source)
+        df = await self._flight.do_async(key, self.get_candles_df, symbol, timeframe, limit, source)
+        return df.copy()
+
+    def get_candle_window(self, symbol: str, timeframe: str, n: int | None = None) -> Dict[str, np.ndarray] | None:
+        """Zero-copy OHLCV views of the last n bars already held in memory (no fetch); None if unseen."""
+        buf = self.windows.get(symbol, timeframe)
+        return buf.view(n) if buf is not None and len(buf) else None
+
+    def get_candle_window_df(self, symbol: str, timeframe: str, n: int | None = None) -> pd.DataFrame | None:
+        """DataFrame copy of the in-memory window for UI rendering; not for the scan loop."""
+        buf = self.windows.get(symbol, timeframe)
+        return buf.to_frame(n) if buf is not None and len(buf) else None
+
+    def get_singleflight_stats(self) -> dict:
+        """Counters for coalesced market data calls (calls, executions, coalesced, errors, in_flight)."""
+        return self._flight.stats()
+
+    def _load_csv(self, symbol: str, timeframe: str, limit: int | None = None) -> pd.DataFrame | None:
+        # Parquet / Arrow / CSV under data/, tail-only read when a limit is given, cached by file mtime
+        return self.history.load(symbol, timeframe, limit=limit)
+
+    def _update_side_caches(self, symbol: str, timeframe: str, df: pd.DataFrame) -> None:
+        # Best effort, each cache on its own: a failing side cache must never turn fetched candles into the demo fallback
+        try:
+            self.windows.ingest_frame(symbol, timeframe, df)
+        except Exception as e:
+            logger.warning(f"Ring buffer ingest failed for {symbol} {timeframe}: {e}")
+        shared = self.shared
+        if shared is not None and shared.is_writer:
+            try:
+                shared.publish_candles(symbol, timeframe, df)
+            except Exception as e:
+                logger.warning(f"Shared cache publish failed for {symbol} {timeframe}: {e}")
+
+    def _fetch_and_cache(self, symbol: str, timeframe: str, limit: int) -> pd.DataFrame:
+        # Runs once per coalesced flight: only the leader feeds the side caches, followers share its frame
+        df = self._get_coindcx_candles_stored(symbol, timeframe, limit)
+        if df is not None and not df.empty:
+            self._update_side_caches(symbol, timeframe, df)
+        return df
 
     #Source hardcoded to coindcx 
     def get_candles_df(self, symbol: str, timeframe: str, limit: int = 300, source: str = "coindcx") -> pd.DataFrame:
         # 1) CSV fast-path
         if source in ("csv", "auto"):
-            df = self._load_csv(symbol, timeframe)
+            df = self._load_csv(symbol, timeframe, limit)
             if df is not None and not df.empty:
                 return df.tail(limit).copy()
 
@@ -84,12 +153,19 @@ class MarketDataService:
         errors = []
 
         if source in ("coindcx", "auto"):
+            shared = self.shared
+            if shared is not None and not shared.is_writer:
+                df = shared.read_candles_df(symbol, timeframe, limit, max_age_seconds=settings.SHM_CACHE_MAX_AGE_SECONDS)
+                if df is not None:
+                    return df
+            df = None
             try:
-                df = self._fetch_coindcx_candles(symbol, timeframe, limit)
-                if df is not None and not df.empty:
-                    return df.tail(limit).copy()
+                key = ("candles", symbol.strip().upper(), timeframe, int(limit))
+                df = self._flight.do(key, self._fetch_and_cache, symbol, timeframe, limit)
             except Exception as e:
                 errors.append(f"CoinDCX error: {e}")
+            if df is not None and not df.empty:
+                return df.tail(limit).copy()
         
         # if source in ("coingecko", "auto"):
 
@@ -102,19 +178,61 @@ class MarketDataService:
     # -----------------------
     # CoinDCX
     # -----------------------
-    def _fetch_coindcx_candles(self, symbol: str, timeframe: str, limit: int) -> pd.DataFrame:
+    def _get_coindcx_candles_stored(self, symbol: str, timeframe: str, limit: int) -> pd.DataFrame:
+        """
+        Serve candles from the shared SQL store, fetching only the bars it is missing.
+        A warm store costs one small request (forming bar + anything since the last write).
+        """
+        try:
+            stored = self.candles.read_range(symbol, timeframe, limit=limit)
+        except Exception as e:
+            logger.warning(f"Candle store read failed for {symbol} {timeframe}: {e}")
+            return self._fetch_coindcx_candles(symbol, timeframe, limit)
+
+        fetch_n = limit
+        if len(stored["ts"]) >= limit:
+            step = self._parse_timeframe_to_timedelta(timeframe)
+            last = pd.Timestamp(stored["ts"][-1], tz="UTC")
+            behind = int((pd.Timestamp.now(tz="UTC") - last) / step) + 2
+            fetch_n = min(limit, max(2, behind))
+
+        fresh = self._fetch_coindcx_candles(symbol, timeframe, fetch_n)
+        try:
+            self.candles.upsert(symbol, timeframe, fresh)
+        except Exception as e:
+            logger.warning(f"Candle store write failed for {symbol} {timeframe}: {e}")
+            return fresh
+        if fetch_n >= limit:
+            return fresh
+        return self.candles.to_frame(self.candles.read_range(symbol, timeframe, limit=limit))
+
+    def _fetch_coindcx_candles(
+        self,
+        symbol: str,
+        timeframe: str,
+        limit: int,
+        start_ms: int | None = None,
+        end_ms: int | None = None,
+        priority: int = PRIORITY_DEFAULT,
+    ) -> pd.DataFrame:
         pair = self._coindcx_resolve_pair(symbol)
         interval = self._coindcx_interval(timeframe)
 
-        data = self.coindcx.get(
-            "/market_data/candles",
-            params={"pair": pair, "interval": interval, "limit": int(limit)},
-            public=True,
-        )
+        params = {"pair": pair, "interval": interval, "limit": int(limit)}
+        if start_ms is not None:
+            params["startTime"] = int(start_ms)
+        if end_ms is not None:
+            params["endTime"] = int(end_ms)
+        data = self.coindcx.get("/market_data/candles", params=params, public=True, priority=priority)
         if not isinstance(data, list) or not data:
             raise ValueError("CoinDCX returned empty candles")
 
         # Common CoinDCX payload shape: [{'t': 1716947100000, 'o': '...', 'h': '...', 'l': '...', 'c': '...', 'v': '...'}, ...]
+        with span("parse.candles"):
+            return self._parse_coindcx_candles(data)
+
+    @staticmethod
+    def _parse_coindcx_candles(data: list) -> pd.DataFrame:
         # Convert to DataFrame
         records = []
         for row in data:
@@ -170,40 +288,23 @@ class MarketDataService:
         return "1M"
 
     def _coindcx_resolve_pair(self, symbol: str) -> str:
-        # Accepts:
-        # - "BTCUSDT", "BTC/USDT", "BTC-USDT", "BTC_USDT", or a raw CoinDCX pair like "BTC_USDT"
+        # Accepts "BTCUSDT", "BTC/USDT", "BTC-USDT", "BTC_USDT" or a raw CoinDCX pair like "B-BTC_USDT"
+        rec = self.markets.lookup(symbol)
+        if rec is not None:
+            return rec.pair
+
         s = symbol.strip().upper()
-        # If user already passed a CoinDCX-style pair, try to use it directly
+        # Unknown to the index (or index unavailable): best-effort guess
         if "_" in s and s.replace("_", "").isalnum():
             return s
-
         base, quote = self._split_base_quote(s)
         if not base or not quote:
             raise ValueError(f"Cannot parse symbol '{symbol}' into base/quote")
-
-        # Try cached market list first
-        markets = self._get_coindcx_markets_cache()
-        # Look for exact base/quote short names
-        for m in markets:
-            b = (m.get("target_currency_short_name") or m.get("base_currency") or "").upper()
-            q = (m.get("base_currency_short_name") or m.get("target_currency") or "").upper()
-            if b == base and q == quote:
-                # Prefer coindcx_name if present; otherwise compose base_quote
-                return m.get("pair") or f"{base}_{quote}"
-
-        # Fallback guess
         return f"{base}_{quote}"
 
-    def _get_coindcx_markets_cache(self) -> List[Dict[str, Any]]:
-        if self._coindcx_markets_cache is not None:
-            return self._coindcx_markets_cache
-        try:
-            data = self.coindcx.get("/exchange/v1/markets_details")
-            if isinstance(data, list) and data:
-                self._coindcx_markets_cache = data
-        except Exception:
-            self._coindcx_markets_cache = []
-        return self._coindcx_markets_cache
+    def get_market_meta(self, symbol: str) -> Optional[MarketRecord]:
+        """Canonical market record (pair, base, quote, tick/lot size, min notional) for any accepted spelling."""
+        return self.markets.lookup(symbol)
 
     def _parse_timeframe_to_timedelta(self, tf: str) -> timedelta:
         tf = tf.strip().lower()
@@ -232,7 +333,9 @@ class MarketDataService:
     # -----------------------
     # Utilities
     # -----------------------
-    def _split_base_quote(self, symbol: str) -> Tuple[Optional[str], Optional[str]]:
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _split_base_quote(symbol: str) -> Tuple[Optional[str], Optional[str]]:
         s = symbol.strip().upper()
         # Handle common separators
         for sep in ["/", "-", "_"]:
@@ -240,8 +343,7 @@ class MarketDataService:
                 base, quote = s.split(sep, 1)
                 return base, quote
         # No separator: try to split by known quote tokens
-        known_quotes = ["USDT", "USDC", "BUSD", "BTC", "ETH", "INR", "USD", "EUR"]
-        for q in known_quotes:
+        for q in KNOWN_QUOTES:
             if s.endswith(q) and len(s) > len(q):
                 return s[: -len(q)], q
         return None, None
@@ -0,0 +1,196 @@
+#Description: CoinDCX market metadata index; maps every accepted symbol spelling to one canonical record, persisted to disk with a TTL.
+
+import json
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from threading import Lock, Thread
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.config import settings
+from utils.logging import logger
+
+
+@dataclass(frozen=True)
+class MarketRecord:
+    symbol: str          # CoinDCX short name, e.g. "BTCUSDT"
+    pair: str            # Candle/websocket pair, e.g. "B-BTC_USDT"
+    base: str
+    quote: str
+    tick_size: float
+    lot_size: float
+    min_notional: float
+    leverage_max: int = 1
+
+
+def _spellings(base: str, quote: str, pair: str, symbol: str) -> List[str]:
+    keys = [f"{base}{quote}", f"{base}/{quote}", f"{base}_{quote}", f"{base}-{quote}", pair, symbol]
+    return [k.upper() for k in keys if k]
+
+
+def _to_float(value: Any, default: float) -> float:
+    try:
+        return float(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def record_from_market(m: Dict[str, Any]) -> Optional[MarketRecord]:
+    """Build a MarketRecord from one /exchange/v1/markets_details entry (None if unusable)."""
+    # CoinDCX naming is inverted: target currency is the base asset, base currency is the quote.
+    base = (m.get("target_currency_short_name") or m.get("base_currency") or "").upper()
+    quote = (m.get("base_currency_short_name") or m.get("target_currency") or "").upper()
+    if not base or not quote:
+        return None
+    symbol = (m.get("symbol") or m.get("coindcx_name") or f"{base}{quote}").upper()
+    pair = m.get("pair") or f"{base}_{quote}"
+
+    price_precision = m.get("base_currency_precision")
+    qty_precision = m.get("target_currency_precision")
+    tick = 10.0 ** -int(price_precision) if price_precision is not None else 0.0001
+    lot = _to_float(m.get("step"), 10.0 ** -int(qty_precision) if qty_precision is not None else 0.0001)
+
+    return MarketRecord(
+        symbol=symbol,
+        pair=pair,
+        base=base,
+        quote=quote,
+        tick_size=tick,
+        lot_size=lot if lot > 0 else 0.0001,
+        min_notional=_to_float(m.get("min_notional"), 0.0),
+        leverage_max=int(_to_float(m.get("max_leverage"), 1) or 1),
+    )
+
+
+_RETRY_SECONDS = 60
+
+
+class MarketIndex:
+    """
+    Symbol -> MarketRecord lookup built once from CoinDCX markets_details.
+
+    The index is persisted as JSON under CACHE_DIR. A fresh disk copy is used as-is; a stale one
+    is served immediately while a background refresh runs, so cold starts never block on the API
+    unless there is no disk copy at all.
+    """
+
+    def __init__(self, fetch_markets, cache_path: Path | None = None, ttl_seconds: int | None = None):
+        self._fetch_markets = fetch_markets
+        self.cache_path = cache_path or Path(settings.CACHE_DIR) / "markets_index.json"
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else settings.MARKET_INDEX_TTL_SECONDS
+        self._lock = Lock()
+        self._records: List[MarketRecord] = []
+        self._by_key: Dict[str, MarketRecord] = {}
+        self._updated: float = 0.0
+        self._next_check: float = 0.0
+        self._loaded = False
+        self._refreshing = False
+
+    # -----------------------
+    # Lookup
+    # -----------------------
+    def lookup(self, symbol: str) -> Optional[MarketRecord]:
+        self._ensure_loaded()
+        return self._by_key.get(symbol.strip().upper())
+
+    def records(self) -> List[MarketRecord]:
+        self._ensure_loaded()
+        return list(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    # -----------------------
+    # Build / refresh
+    # -----------------------
+    def build(self, markets: Iterable[Dict[str, Any]], updated: float | None = None) -> None:
+        records = [r for r in (record_from_market(m) for m in markets if isinstance(m, dict)) if r]
+        self._set_records(records, updated or time.time())
+
+    def refresh(self) -> bool:
+        """Fetch markets_details and rebuild the index. Returns False if the fetch failed."""
+        try:
+            data = self._fetch_markets()
+        except Exception as e:
+            logger.warning(f"Market index refresh failed: {e}")
+            return False
+        if not isinstance(data, list) or not data:
+            logger.warning("Market index refresh returned no markets; keeping current index.")
+            return False
+        self.build(data)
+        self._save()
+        logger.info(f"Market index refreshed ({len(self._records)} markets).")
+        return True
+
+    def _set_records(self, records: List[MarketRecord], updated: float) -> None:
+        by_key: Dict[str, MarketRecord] = {}
+        for r in records:
+            for k in _spellings(r.base, r.quote, r.pair, r.symbol):
+                # First writer wins so an active spot market is not shadowed by a later duplicate spelling
+                by_key.setdefault(k, r)
+        with self._lock:
+            self._records = records
+            self._by_key = by_key
+            self._updated = updated
+            self._loaded = True
+
+    def _ensure_loaded(self) -> None:
+        now = time.time()
+        if self._loaded and (now - self._updated <= self.ttl_seconds or now < self._next_check):
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            loaded = self._loaded
+        if not loaded and self._load():
+            loaded = True
+        if not loaded:
+            # Nothing usable on disk: this is the only path that blocks on the API.
+            if not self.refresh():
+                self._set_records([], 0.0)
+                self._next_check = time.time() + _RETRY_SECONDS
+            return
+        if time.time() - self._updated > self.ttl_seconds:
+            self._refresh_in_background()
+
+    def _refresh_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def _run():
+            try:
+                if not self.refresh():
+                    self._next_check = time.time() + _RETRY_SECONDS
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        Thread(target=_run, name="market-index-refresh", daemon=True).start()
+
+    # -----------------------
+    # Persistence
+    # -----------------------
+    def _load(self) -> bool:
+        try:
+            payload = json.loads(self.cache_path.read_text())
+            records = [MarketRecord(**r) for r in payload.get("records", [])]
+        except FileNotFoundError:
+            return False
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable market index cache {self.cache_path}: {e}")
+            return False
+        if not records:
+            return False
+        self._set_records(records, float(payload.get("updated", 0.0)))
+        return True
+
+    def _save(self) -> None:
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.cache_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({"updated": self._updated, "records": [asdict(r) for r in self._records]}))
+            tmp.replace(self.cache_path)
+        except Exception as e:
+            logger.warning(f"Could not persist market index to {self.cache_path}: {e}")
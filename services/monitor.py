@@ -5,8 +5,12 @@ from datetime import datetime,timezone
 
 from services.market_data import MarketDataService
 from services.portfolio import PortfolioService
+from services.kill_switch import KillSwitchExecutor
+from services.risk_gate import RiskGate
+from services.circuit_breaker import VolatilityBreaker
 from models.db import get_session
 from models.orm import Position
+from utils.config import settings
 from utils.logging import logger
 
 class MonitorService:
@@ -16,7 +20,10 @@ class MonitorService:
     def __init__(self):
         self.market = MarketDataService.instance()
         self.portfolio = PortfolioService.instance()
+        self.gate = RiskGate.instance()
+        self.breaker = VolatilityBreaker.instance()
         self._kill = False
+        self.last_flatten: dict = {}
         self.config = {
             "max_daily_loss_pct": 10.0,
             "per_asset_cap_pct": 20.0,
@@ -30,22 +37,39 @@ class MonitorService:
                 cls._instance = MonitorService()
         return cls._instance
 
-    def set_kill_switch(self, enabled: bool):
-        self._kill = enabled
-        self.portfolio.log_event("WARN", f"Kill Switch set to {enabled}")
+    def set_kill_switch(self, enabled: bool, flatten: bool | None = None):
+        """
+        Engage/release the kill switch; engaging also flattens the book unless KILL_SWITCH_FLATTEN is off.
+        Engaging it again while it is on re-runs the flatten, retrying the closes that failed.
+        """
+        if enabled == self._kill and not enabled:
+            return
+        if enabled != self._kill:
+            self._kill = enabled
+            self.portfolio.log_event("WARN", f"Kill Switch set to {enabled}")
+        if enabled and (settings.KILL_SWITCH_FLATTEN if flatten is None else flatten):
+            self.last_flatten = KillSwitchExecutor.instance().flatten(reason="kill switch")
 
     def update_config(self, cfg: dict):
         self.config.update(cfg)
 
     def get_status(self):
-        return {"kill_switch": self._kill, "config": self.config}
+        return {"kill_switch": self._kill, "config": self.config, "last_flatten": self.last_flatten,
+                "exposure": self.gate.snapshot(), "vol_breaker": self.breaker.status()}
 
     def monitor_once(self):
+        # One ticker snapshot prices the volatility check (whole universe) and the open positions
+        prices = {t["symbol"]: float(t["last"]) for t in self.market.get_tickers(limit=100_000, fallback=False)}
+        self._check_volatility(prices)
+        # Scans may run in another process; keep the correlation cap fed from the candle store
+        self.gate.correlation.refresh()
         # Update positions P&L and enforce TP/SL
         with get_session() as db:
             positions = db.query(Position).filter(Position.status == "open").all()
             for p in positions:
-                last_price = self._get_last_price(p.symbol)
+                last_price = prices.get(p.symbol) or self._get_last_price(p.symbol)
+                if settings.VOL_BREAKER_TIGHTEN_STOPS and self.breaker.is_tripped(p.symbol):
+                    self._tighten_stop(p, last_price)
                 if p.side.upper() == "BUY":
                     p.unrealized_pnl = (last_price - p.entry_price) * p.qty
                     hit_tp = p.tp and last_price >= p.tp
@@ -54,14 +78,37 @@ class MonitorService:
                     p.unrealized_pnl = (p.entry_price - last_price) * p.qty
                     hit_tp = p.tp and last_price <= p.tp
                     hit_sl = p.sl and last_price >= p.sl
+                self.gate.on_mark(p.id, p.unrealized_pnl)
                 if hit_tp or hit_sl:
                     p.status = "closed"; p.ts_close = datetime.now(timezone.utc)
                     self.portfolio.adjust_balance(p.market, delta=p.unrealized_pnl)
+                    self.gate.on_close(p.id, p.symbol, p.market, p.qty * p.entry_price, p.leverage or 1, p.unrealized_pnl)
                     self.portfolio.log_event("INFO", f"Exit {p.symbol} {'TP' if hit_tp else 'SL'} @ {last_price:.6f} pnl={p.unrealized_pnl:.2f}")
             db.commit()
         # Record snapshot
         self.portfolio.record_snapshot()
         
+    def _check_volatility(self, prices: dict):
+        self.breaker.refresh()
+        for symbol in self.breaker.evaluate(prices, float(self.config["vol_spike_atr_mult"])):
+            self.portfolio.log_event("WARN", f"Volatility breaker: {symbol} moved > {self.config['vol_spike_atr_mult']} x ATR; "
+                                             f"new entries paused", self.breaker.status()["tripped"].get(symbol))
+
+    def _tighten_stop(self, p: Position, price: float):
+        # Pull the stop to VOL_BREAKER_STOP_ATR x ATR from price; stops only ever move towards price
+        atr = self.breaker.atr(p.symbol)
+        if not atr or price <= 0:
+            return
+        if p.side.upper() == "BUY":
+            sl = price - settings.VOL_BREAKER_STOP_ATR * atr
+            tighter = p.sl is None or sl > p.sl
+        else:
+            sl = price + settings.VOL_BREAKER_STOP_ATR * atr
+            tighter = p.sl is None or sl < p.sl
+        if tighter:
+            self.portfolio.log_event("INFO", f"Stop for {p.symbol} tightened to {sl:.6f} after volatility spike")
+            p.sl = sl
+
     def _get_last_price(self, symbol: str) -> float:
         # Try tickers; else last candle
         tickers = self.market.get_tickers(limit=20)
@@ -0,0 +1,104 @@
+#Description: Set-based persistence for the execution path: bulk order/position inserts and status updates, one transaction per batch.
+
+from datetime import datetime, timezone
+import uuid
+from threading import Lock
+from typing import Dict, List
+
+from sqlalchemy import bindparam, update
+
+from models.db import engine as default_engine
+from models.orm import Order, Position
+from utils.tracing import traced
+
+
+def close_client_id(position_id: int) -> str:
+    """Client id for a close order: carries the position it closes, so an unconfirmed close can be traced back."""
+    return f"ks-{position_id}-{uuid.uuid4().hex[:8]}"
+
+
+def closed_position_id(client_id: str | None) -> int | None:
+    """The position a close_client_id() order was sent for (None for other orders)."""
+    parts = (client_id or "").split("-")
+    if len(parts) == 3 and parts[0] == "ks" and parts[1].isdigit():
+        return int(parts[1])
+    return None
+
+
+class OrderStore:
+    """
+    Writes Order and Position rows with SQLAlchemy Core: each batch is one transaction of executemany
+    INSERTs, and status changes are single UPDATE statements. The statement count per batch stays
+    constant however many orders it holds.
+
+    Rows in one insert batch must share the same keys (executemany binds one parameter set shape).
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, engine=None):
+        self.engine = engine or default_engine
+        self.orders = Order.__table__
+        self.positions = Position.__table__
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = OrderStore()
+        return cls._instance
+
+    @traced("db.orders_batch")
+    def record_batch(self, orders: List[dict], positions: List[dict]) -> None:
+        if not orders and not positions:
+            return
+        now = datetime.now(timezone.utc)
+        with self.engine.begin() as conn:
+            if orders:
+                conn.execute(self.orders.insert(), [{"ts_created": now, "ts_updated": now, **o} for o in orders])
+            if positions:
+                conn.execute(self.positions.insert(), [{"ts_open": now, **p} for p in positions])
+
+    @traced("db.orders_update")
+    def update_orders(self, updates: List[dict]) -> int:
+        """Apply per-order changes keyed by "id" in one transaction; returns rows updated."""
+        with self.engine.begin() as conn:
+            return self._bulk_update(conn, self.orders, updates)
+
+    @traced("db.orders_apply")
+    def apply_changes(self, order_updates: List[dict] = (), position_updates: List[dict] = (),
+                      new_orders: List[dict] = (), new_positions: List[dict] = ()) -> None:
+        """Order/position updates (keyed by "id") and inserts, committed together."""
+        now = datetime.now(timezone.utc)
+        with self.engine.begin() as conn:
+            self._bulk_update(conn, self.orders, order_updates)
+            self._bulk_update(conn, self.positions, position_updates)
+            if new_orders:
+                conn.execute(self.orders.insert(), [{"ts_created": now, "ts_updated": now, **o} for o in new_orders])
+            if new_positions:
+                conn.execute(self.positions.insert(), [{"ts_open": now, **p} for p in new_positions])
+
+    @staticmethod
+    def _bulk_update(conn, table, updates: List[dict]) -> int:
+        """One executemany UPDATE ... WHERE id = :id per distinct set of changed columns."""
+        groups: Dict[tuple, List[dict]] = {}
+        for u in updates:
+            groups.setdefault(tuple(sorted(k for k in u if k != "id")), []).append(u)
+        touched = 0
+        now = datetime.now(timezone.utc)
+        for cols, rows in groups.items():
+            values = {c: bindparam(f"_{c}") for c in cols}
+            if "ts_updated" in table.c and "ts_updated" not in cols:
+                values["ts_updated"] = now
+            stmt = update(table).where(table.c.id == bindparam("_id")).values(values)
+            touched += conn.execute(stmt, [{"_id": u["id"], **{f"_{c}": u[c] for c in cols}} for u in rows]).rowcount
+        return touched
+
+    @traced("db.positions_close")
+    def close_open_positions(self, symbols: List[str] | None = None, ts: datetime | None = None) -> int:
+        """UPDATE positions SET status='closed' WHERE status='open' (optionally only these symbols); returns rows closed."""
+        stmt = update(self.positions).where(self.positions.c.status == "open")
+        if symbols is not None:
+            stmt = stmt.where(self.positions.c.symbol.in_(symbols))
+        with self.engine.begin() as conn:
+            return conn.execute(stmt.values(status="closed", ts_close=ts or datetime.now(timezone.utc))).rowcount
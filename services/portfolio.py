@@ -6,8 +6,9 @@ from threading import Lock
 from utils.logging import logger
 from utils.config import settings
 from models.db import get_session
-from models.orm import Order, Position, PortfolioSnapshot, Alert
+from models.orm import Order, Position, PortfolioSnapshot
 from models.schemas import SignalOut
+from services.event_log import AlertWriter, EventRing
 
 class PortfolioService:
     _instance = None
@@ -21,7 +22,7 @@ class PortfolioService:
         }
         # Simulation balances
         self._balances = {"spot_usdt": 10000.0, "futures_usdt": 5000.0}
-        self._events: list[dict] = []
+        self._events = EventRing(settings.EVENT_BUFFER_SIZE)
         self._auto_trade = False
         self._confidence_threshold = settings.CONFIDENCE_THRESHOLD
 
@@ -35,10 +36,8 @@ class PortfolioService:
     def log_event(self, level: str, message: str, context: dict | None = None):
         evt = {"ts": datetime.now().isoformat(timespec="seconds"), "level": level, "message": message, "context": context or {}}
         self._events.append(evt)
-        # Persist minimal alert
-        with get_session() as s:
-            s.add(Alert(level=level, message=message, context=context or {}))
-            s.commit()
+        # Persist minimal alert; batched by the background writer so callers (order path included) never wait on a commit
+        AlertWriter.instance().submit(level, message, evt["context"])
 
     def set_auto_trade(self, enabled: bool):
         self._auto_trade = enabled
@@ -46,6 +45,9 @@ class PortfolioService:
     def set_confidence_threshold(self, th: float):
         self._confidence_threshold = th
 
+    def update_config(self, cfg: dict):
+        self.config.update(cfg)
+
     def get_equity(self) -> float:
         return self._balances["spot_usdt"] + self._balances["futures_usdt"]
 
@@ -102,4 +104,4 @@ class PortfolioService:
             s.commit()
 
     def get_recent_events(self, limit=20) -> list[dict]:
-        return self._events[-limit:]
+        return self._events.recent(limit)
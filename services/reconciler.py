@@ -0,0 +1,252 @@
+#Description: Live-mode order reconciliation: bulk status fetches for non-terminal orders, diffed and applied in one transaction.
+
+import math
+import time
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Callable, Dict, List
+
+from sqlalchemy import or_, select
+
+from models.db import engine as default_engine
+from models.orm import Order, Position
+from services.order_store import OrderStore, closed_position_id
+from utils.config import settings
+from utils.logging import logger
+from utils.tracing import span
+
+# Our order statuses that can still change on the exchange ("unknown": submission timed out, not yet found)
+OPEN_STATUSES = ("new", "open", "partial", "unknown")
+
+# Exchange (spot and futures) status -> ours
+STATUS_MAP = {
+    "init": "new", "initial": "new", "untriggered": "new", "open": "new", "new": "new",
+    "partially_filled": "partial",
+    "filled": "filled",
+    "cancelled": "canceled", "partially_cancelled": "canceled", "canceled": "canceled",
+    "rejected": "rejected",
+}
+
+
+def _f(value, default: float = 0.0) -> float:
+    try:
+        return float(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+def filled_qty(row: dict) -> float:
+    """Executed quantity of an exchange order row."""
+    total = _f(row.get("total_quantity"))
+    return max(0.0, total - _f(row.get("remaining_quantity")) - _f(row.get("cancelled_quantity")))
+
+
+class OrderReconciler:
+    """
+    Brings Order rows placed in live mode up to date with the exchange and adjusts their positions.
+
+    Each run loads the non-terminal orders and fetches their state in as few calls as the API allows:
+    spot through status_multiple in chunks of RECONCILE_BATCH_SIZE ids, futures by paging the
+    account's recent order list until every open order has been seen. Changed rows are applied in one
+    transaction. Positions are created with the order and have the same quantity until it is final:
+    - A fill sets the position's entry to the average fill price.
+    - A cancel after a partial fill shrinks the position to the filled quantity.
+    - A cancel or reject with nothing filled closes the position.
+    - An "unknown" (timed-out) order that turns up with a fill gets its position created.
+    - One never found within RECONCILE_UNKNOWN_GRACE_SECONDS is marked rejected.
+    - Reduce-only closes leave positions alone, except an "unknown" close that turns up accepted,
+      which closes the position it was sent for.
+
+    The cadence adapts to the open order count. With nothing open, each run costs one DB query
+    and no API call; with RECONCILE_BUSY_ORDERS or more open, it polls every
+    RECONCILE_MIN_INTERVAL_SECONDS. In between, the interval shrinks linearly from
+    RECONCILE_MAX_INTERVAL_SECONDS.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, spot=None, futures=None, store: OrderStore | None = None, engine=None,
+                 clock: Callable[[], float] = time.monotonic):
+        if spot is None or futures is None:
+            from adapters.coindcx_futures import CoinDCXFuturesAdapter
+            from adapters.coindcx_spot import CoinDCXSpotAdapter
+            spot = spot or CoinDCXSpotAdapter()
+            futures = futures or CoinDCXFuturesAdapter()
+        self.spot, self.futures = spot, futures
+        self.store = store or OrderStore.instance()
+        self.engine = engine or default_engine
+        self.clock = clock
+        self._next_run = 0.0
+        self.last_run: dict = {}
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = OrderReconciler()
+        return cls._instance
+
+    # -----------------------
+    # Cadence
+    # -----------------------
+    def interval_for(self, n_open: int) -> float:
+        lo, hi = settings.RECONCILE_MIN_INTERVAL_SECONDS, settings.RECONCILE_MAX_INTERVAL_SECONDS
+        if n_open <= 0:
+            return hi
+        busy = max(settings.RECONCILE_BUSY_ORDERS, 1)
+        frac = min(n_open - 1, busy - 1) / max(busy - 1, 1)
+        return hi - (hi - lo) * frac
+
+    def run_if_due(self) -> dict | None:
+        now = self.clock()
+        if now < self._next_run:
+            return None
+        report = self.reconcile()
+        self._next_run = now + self.interval_for(report["open"])
+        return report
+
+    # -----------------------
+    # Reconcile
+    # -----------------------
+    def _load_open(self) -> List[dict]:
+        t = Order.__table__
+        stmt = select(t).where(t.c.status.in_(OPEN_STATUSES),
+                               or_(t.c.exchange_order_id.is_(None), ~t.c.exchange_order_id.like("SIM-%")))
+        with self.engine.connect() as conn:
+            return [dict(r) for r in conn.execute(stmt).mappings().all()]
+
+    def _fetch_spot(self, orders: List[dict]) -> Dict[str, dict]:
+        """Exchange rows keyed by exchange id and by client order id."""
+        out: Dict[str, dict] = {}
+        ids = [o["exchange_order_id"] for o in orders if o["exchange_order_id"]]
+        cids = [o["client_id"] for o in orders if not o["exchange_order_id"] and o["client_id"]]
+        size = max(1, settings.RECONCILE_BATCH_SIZE)
+        for key, values in (("ids", ids), ("client_ids", cids)):
+            for i in range(0, len(values), size):
+                for row in self.spot.get_orders_status(**{key: values[i:i + size]}) or []:
+                    _index(out, row)
+        return out
+
+    def _fetch_futures(self, orders: List[dict]) -> Dict[str, dict]:
+        out: Dict[str, dict] = {}
+        wanted = {o["exchange_order_id"] or o["client_id"] for o in orders}
+        size = max(1, settings.RECONCILE_BATCH_SIZE)
+        for page in range(1, settings.RECONCILE_MAX_PAGES + 1):
+            rows = self.futures.list_orders(page=page, size=size) or []
+            for row in rows:
+                _index(out, row)
+            if len(rows) < size or wanted.issubset(out):
+                break
+        return out
+
+    def reconcile(self) -> dict:
+        with span("reconcile"):
+            orders = self._load_open()
+            report = {"open": len(orders), "updated": 0, "filled": 0, "canceled": 0, "partial": 0}
+            if not orders:
+                self.last_run = report
+                return report
+            seen: Dict[str, dict] = {}
+            fetched = set()
+            for market, fetch in (("spot", self._fetch_spot), ("futures", self._fetch_futures)):
+                subset = [o for o in orders if o["market"] == market]
+                if subset:
+                    try:
+                        seen.update({f"{market}:{k}": v for k, v in fetch(subset).items()})
+                        fetched.add(market)
+                    except Exception as e:
+                        logger.warning(f"Order status fetch failed for {market}: {e}")
+            order_updates, pos_updates, new_positions = self._diff(orders, seen, fetched)
+            if order_updates:
+                self.store.apply_changes(order_updates, pos_updates, new_positions=new_positions)
+            for u in order_updates:
+                report["updated"] += 1
+                if u["status"] in report:
+                    report[u["status"]] += 1
+            report["open"] -= sum(1 for u in order_updates if u["status"] not in OPEN_STATUSES)
+            if order_updates:
+                logger.info(f"Reconciled orders: {report}")
+            self.last_run = report
+            return report
+
+    def _diff(self, orders: List[dict], seen: Dict[str, dict], fetched: set):
+        positions = self._open_positions({o["symbol"] for o in orders})
+        order_updates, pos_updates, new_positions = [], [], []
+        now = datetime.now(timezone.utc)
+        grace = timedelta(seconds=settings.RECONCILE_UNKNOWN_GRACE_SECONDS)
+        for o in orders:
+            row = seen.get(f"{o['market']}:{o['exchange_order_id']}") or seen.get(f"{o['market']}:{o['client_id']}")
+            if row is None:
+                created = o["ts_created"].replace(tzinfo=timezone.utc) if o["ts_created"] else now
+                # Only conclude "never arrived" from a successful fetch of that market
+                if o["status"] == "unknown" and o["market"] in fetched and now - created > grace:
+                    order_updates.append({"id": o["id"], "status": "rejected"})
+                continue
+            status = STATUS_MAP.get(str(row.get("status", "")).lower())
+            if status is None:
+                continue
+            filled = filled_qty(row)
+            avg = _f(row.get("avg_price")) or o["price"]
+            exch_id = o["exchange_order_id"] or (str(row["id"]) if row.get("id") is not None else None)
+            if (status, exch_id) == (o["status"], o["exchange_order_id"]) and math.isclose(avg, o["price"] or 0.0):
+                continue
+            order_updates.append({"id": o["id"], "status": status, "price": avg, "exchange_order_id": exch_id})
+            if o.get("reduce_only"):
+                # Closes (kill switch, close all) never open a position. An accepted close's position was closed when
+                # it was sent; an unconfirmed ("unknown") one left it open, so close it once the exchange has the order
+                if o["status"] == "unknown" and status in ("filled", "partial", "new"):
+                    pos_id = closed_position_id(o["client_id"])
+                    pos = _take_position(positions, pos_id) if pos_id is not None else _match_position(positions, o)
+                    if pos is not None:
+                        pos_updates.append({"id": pos["id"], "status": "closed", "ts_close": now})
+                continue
+
+            pos = _match_position(positions, o)
+            if o["status"] == "unknown":
+                # Timed-out submissions were recorded without a position
+                qty = filled if status == "canceled" else o["qty"]
+                if status in ("filled", "partial", "new") or (status == "canceled" and filled > 0):
+                    new_positions.append({"symbol": o["symbol"], "market": o["market"], "side": o["side"],
+                                          "entry_price": avg, "qty": qty, "leverage": _leverage(o),
+                                          "sl": o["sl_price"], "tp": o["tp_price"], "status": "open"})
+            elif pos is not None:
+                if status == "filled":
+                    pos_updates.append({"id": pos["id"], "entry_price": avg})
+                elif status in ("canceled", "rejected") and filled > 0:
+                    pos_updates.append({"id": pos["id"], "entry_price": avg, "qty": filled})
+                elif status in ("canceled", "rejected"):
+                    pos_updates.append({"id": pos["id"], "status": "closed", "ts_close": now})
+        return order_updates, pos_updates, new_positions
+
+    def _open_positions(self, symbols) -> List[dict]:
+        t = Position.__table__
+        with self.engine.connect() as conn:
+            return [dict(r) for r in conn.execute(
+                select(t).where(t.c.status == "open", t.c.symbol.in_(list(symbols))).order_by(t.c.id)).mappings().all()]
+
+
+def _index(out: Dict[str, dict], row: dict) -> None:
+    if row.get("id") is not None:
+        out[str(row["id"])] = row
+    if row.get("client_order_id"):
+        out[str(row["client_order_id"])] = row
+
+
+def _take_position(positions: List[dict], position_id: int) -> dict | None:
+    for i, p in enumerate(positions):
+        if p["id"] == position_id:
+            return positions.pop(i)
+    return None
+
+
+def _match_position(positions: List[dict], order: dict) -> dict | None:
+    """The open position created with this order (same symbol, market and quantity); consumed once matched."""
+    for i, p in enumerate(positions):
+        if p["symbol"] == order["symbol"] and p["market"] == order["market"] and math.isclose(p["qty"], order["qty"], rel_tol=1e-9):
+            return positions.pop(i)
+    return None
+
+
+def _leverage(order: dict) -> int:
+    # Orders do not record leverage; timed-out futures orders were sent with at most MAX_LEVERAGE
+    return 1 if order["market"] == "spot" else settings.MAX_LEVERAGE
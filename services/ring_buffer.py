@@ -0,0 +1,154 @@
+#Description: Fixed-size NumPy ring buffers holding rolling per-(symbol, timeframe) OHLCV windows with zero-copy views.
+
+from threading import Lock, RLock
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ("open", "high", "low", "close", "volume")
+
+
+class CandleRingBuffer:
+    """
+    Rolling OHLCV window of at most `capacity` bars.
+
+    Storage is mirrored: every bar is written at slot i and i + capacity, so the most recent n bars
+    are always one contiguous slice. `view(n)` therefore returns NumPy views (no copy) and
+    `append` is O(1) with no allocation. The price is double storage: memory is fixed at
+    2 * capacity * (8 + 5 * itemsize) bytes, i.e. 38.4 KB per (symbol, timeframe) at the default 400
+    float64 bars, about 38 MB for 1000 keys. RING_BUFFER_BARS and RING_BUFFER_DTYPE="float32"
+    (22.4 KB per key) bound it; RingBufferRegistry.nbytes() reports the live total.
+
+    Writes (append, update_last, upsert, ingest) hold a per-buffer lock, so concurrent fetches of the
+    same key cannot interleave the head index and the mirrored halves. Views are not locked.
+    """
+
+    def __init__(self, capacity: int = 400, dtype=np.float64):
+        self.capacity = int(capacity)
+        self._ts = np.zeros(2 * self.capacity, dtype=np.int64)            # bar open, epoch ms
+        self._data = np.zeros((len(FIELDS), 2 * self.capacity), dtype=dtype)
+        self._head = 0   # next write slot in [0, capacity)
+        self._size = 0
+        self._mu = RLock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return self._ts.nbytes + self._data.nbytes
+
+    @property
+    def last_ts(self) -> int | None:
+        return int(self._ts[self._head - 1 + self.capacity]) if self._size else None
+
+    def _write(self, slot: int, ts_ms: int, o: float, h: float, l: float, c: float, v: float) -> None:
+        d, m = self._data, slot + self.capacity
+        self._ts[slot] = self._ts[m] = ts_ms
+        d[0, slot] = d[0, m] = o
+        d[1, slot] = d[1, m] = h
+        d[2, slot] = d[2, m] = l
+        d[3, slot] = d[3, m] = c
+        d[4, slot] = d[4, m] = v
+
+    def append(self, ts_ms: int, o: float, h: float, l: float, c: float, v: float) -> None:
+        """Add a new bar (call on bar close / new bar open)."""
+        with self._mu:
+            self._write(self._head, ts_ms, o, h, l, c, v)
+            self._head = (self._head + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def update_last(self, ts_ms: int, o: float, h: float, l: float, c: float, v: float) -> None:
+        """Overwrite the most recent bar in place (the forming bar)."""
+        with self._mu:
+            self._write((self._head - 1) % self.capacity, ts_ms, o, h, l, c, v)
+
+    def upsert(self, ts_ms: int, o: float, h: float, l: float, c: float, v: float) -> None:
+        with self._mu:
+            last = self.last_ts
+            if last is None or ts_ms > last:
+                self.append(ts_ms, o, h, l, c, v)
+            elif ts_ms == last:
+                self.update_last(ts_ms, o, h, l, c, v)
+
+    def ingest(self, ts_ms: np.ndarray, ohlcv: np.ndarray) -> int:
+        """
+        Vectorized upsert of a sorted batch (ts_ms shape (k,), ohlcv shape (5, k)).
+        Bars older than the current last bar are ignored. Returns the number of new bars.
+        """
+        with self._mu:
+            return self._ingest(ts_ms, ohlcv)
+
+    def _ingest(self, ts_ms: np.ndarray, ohlcv: np.ndarray) -> int:
+        last = self.last_ts
+        if last is not None:
+            if ts_ms.size and (ts_ms == last).any():
+                i = int(np.nonzero(ts_ms == last)[0][-1])
+                self.update_last(last, *ohlcv[:, i])
+            keep = ts_ms > last
+            ts_ms, ohlcv = ts_ms[keep], ohlcv[:, keep]
+        k = ts_ms.size
+        if k == 0:
+            return 0
+        if k > self.capacity:
+            ts_ms, ohlcv = ts_ms[-self.capacity:], ohlcv[:, -self.capacity:]
+        n = ts_ms.size
+        slots = (self._head + np.arange(n)) % self.capacity
+        for base in (slots, slots + self.capacity):
+            self._ts[base] = ts_ms
+            self._data[:, base] = ohlcv
+        self._head = (self._head + n) % self.capacity
+        self._size = min(self._size + n, self.capacity)
+        return k
+
+    def view(self, n: int | None = None) -> Dict[str, np.ndarray]:
+        """Zero-copy views of the last n bars (oldest first). Valid until the next write."""
+        n = self._size if n is None else min(int(n), self._size)
+        end = self._head + self.capacity
+        out = {"ts": self._ts[end - n:end]}
+        for i, f in enumerate(FIELDS):
+            out[f] = self._data[i, end - n:end]
+        return out
+
+    def to_frame(self, n: int | None = None) -> pd.DataFrame:
+        """DataFrame copy of the last n bars for the UI (tz-aware UTC ts, like get_candles_df)."""
+        v = self.view(n)
+        df = pd.DataFrame({f: v[f].copy() for f in FIELDS})
+        df.insert(0, "ts", pd.to_datetime(v["ts"], unit="ms", utc=True))
+        return df
+
+
+class RingBufferRegistry:
+    """Per-(symbol, timeframe) ring buffers with a fixed capacity and dtype."""
+
+    def __init__(self, capacity: int = 400, dtype=np.float64):
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self._buffers: Dict[Tuple[str, str], CandleRingBuffer] = {}
+        self._lock = Lock()
+
+    def get(self, symbol: str, timeframe: str) -> CandleRingBuffer | None:
+        return self._buffers.get((symbol, timeframe))
+
+    def get_or_create(self, symbol: str, timeframe: str) -> CandleRingBuffer:
+        key = (symbol, timeframe)
+        buf = self._buffers.get(key)
+        if buf is None:
+            with self._lock:
+                buf = self._buffers.setdefault(key, CandleRingBuffer(self.capacity, self.dtype))
+        return buf
+
+    def ingest_frame(self, symbol: str, timeframe: str, df: pd.DataFrame) -> int:
+        """Upsert bars from a ts + OHLCV DataFrame (as returned by get_candles_df)."""
+        if df is None or df.empty:
+            return 0
+        ts = pd.to_datetime(df["ts"], utc=True).dt.tz_convert(None).to_numpy().astype("datetime64[ms]").astype(np.int64)
+        ohlcv = np.vstack([df[f].to_numpy(dtype=self.dtype, na_value=np.nan) for f in FIELDS])
+        return self.get_or_create(symbol, timeframe).ingest(ts, ohlcv)
+
+    def keys(self):
+        return list(self._buffers.keys())
+
+    def nbytes(self) -> int:
+        return sum(b.nbytes for b in list(self._buffers.values()))
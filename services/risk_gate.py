@@ -0,0 +1,236 @@
+#Description: Pre-trade risk gate: incrementally maintained exposure/margin/PnL counters and a constant-time allow/deny/resize check per order.
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Dict, List
+
+from sqlalchemy import func, select
+
+from models.db import engine as default_engine
+from models.orm import Order, Position
+from services.circuit_breaker import VolatilityBreaker
+from services.correlation import CorrelationTracker
+from utils.config import settings
+from utils.logging import logger
+
+
+@dataclass
+class RiskDecision:
+    action: str              # "allow", "resize" or "deny"
+    notional: float          # notional the order may use (0 when denied)
+    reason: str | None = None
+
+
+@dataclass
+class RiskOrder:
+    symbol: str
+    market: str
+    notional: float          # qty * price, levered for futures (as positions record it)
+    leverage: int = 1
+
+
+class RiskGate:
+    """
+    Keeps the book's exposure in counters so that a candidate order is checked with a few dict
+    lookups instead of a query over open positions. The counters are:
+    - notional per asset, for per_asset_cap_pct;
+    - margin per market, against the SPOT/FUTURES_ALLOCATION_PCT share of equity;
+    - today's realized PnL and the open positions' unrealized PnL, for max_daily_loss_pct.
+
+    Fills (on_fill), marks (on_mark) and closes (on_close) update the counters in place. rebuild()
+    reloads them from the database; it runs on first use, at the UTC day rollover and after bulk
+    changes such as reconciliation. Orders whose outcome is unknown (timed out in transit) count as
+    filled until reconciliation finds out what happened to them.
+
+    check_batch() reserves the notional and margin it allows under the same lock as the check, so
+    concurrent batches (or a batch and a manual order) cannot both pass against the same headroom. The
+    caller converts a reservation with on_fill(..., reserved=) or gives it back with release() when the
+    order is not sent or is rejected. Orders are evaluated in sequence against the counters plus the
+    open reservations, the batch's earlier orders included:
+    - an active kill switch or a breached daily loss limit denies every order;
+    - an order on a symbol the volatility breaker has tripped is denied;
+    - an order whose returns correlate above correlation_cap with a held symbol (or an earlier order of
+      the batch) is denied; this is O(holdings) lookups in the CorrelationTracker;
+    - an order that would exceed its asset cap or market margin budget is resized to the headroom;
+    - it is denied instead when the headroom is under RISK_MIN_RESIZE_FRACTION of the request.
+    """
+    _instance = None
+    _lock = Lock()
+
+    def __init__(self, portfolio=None, engine=None, correlation: CorrelationTracker | None = None,
+                 breaker: VolatilityBreaker | None = None):
+        if portfolio is None:
+            from services.portfolio import PortfolioService
+            portfolio = PortfolioService.instance()
+        self.portfolio = portfolio
+        self.engine = engine or default_engine
+        self.correlation = correlation or CorrelationTracker.instance()
+        self.breaker = breaker or VolatilityBreaker.instance()
+        self._mu = Lock()
+        self._notional: Dict[str, float] = {}
+        self._margin: Dict[str, float] = {}
+        self._upnl: Dict[int, float] = {}
+        self._reserved_n: Dict[str, float] = {}   # allowed by check_batch, not yet filled or released
+        self._reserved_m: Dict[str, float] = {}
+        self._upnl_total = 0.0
+        self._upnl_at_open = 0.0      # unrealized PnL carried into the day
+        self._realized = 0.0
+        self._day = None
+        self._day_equity = 0.0
+
+    @classmethod
+    def instance(cls):
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = RiskGate()
+        return cls._instance
+
+    # -----------------------
+    # Counters
+    # -----------------------
+    def rebuild(self) -> None:
+        p = Position.__table__
+        day = datetime.now(timezone.utc).date()
+        start = datetime.combine(day, datetime.min.time())
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(p.c.id, p.c.symbol, p.c.market, p.c.qty, p.c.entry_price, p.c.leverage,
+                                       p.c.unrealized_pnl).where(p.c.status == "open")).all()
+            realized = conn.execute(select(func.coalesce(func.sum(p.c.unrealized_pnl), 0.0)).where(
+                p.c.status == "closed", p.c.ts_close >= start)).scalar()
+            o = Order.__table__
+            unknown = conn.execute(select(o.c.symbol, o.c.market, o.c.qty, o.c.price).where(
+                o.c.status == "unknown", o.c.reduce_only.is_not(True))).all()
+        notional: Dict[str, float] = {}
+        margin: Dict[str, float] = {}
+        upnl: Dict[int, float] = {}
+        for r in rows:
+            n = (r.qty or 0.0) * (r.entry_price or 0.0)
+            notional[r.symbol] = notional.get(r.symbol, 0.0) + n
+            margin[r.market] = margin.get(r.market, 0.0) + n / max(r.leverage or 1, 1)
+            upnl[r.id] = r.unrealized_pnl or 0.0
+        for r in unknown:
+            # Unconfirmed entries may be live; orders do not record leverage, and futures use at most MAX_LEVERAGE
+            n = (r.qty or 0.0) * (r.price or 0.0)
+            notional[r.symbol] = notional.get(r.symbol, 0.0) + n
+            margin[r.market] = margin.get(r.market, 0.0) + n / (1 if r.market == "spot" else max(settings.MAX_LEVERAGE, 1))
+        with self._mu:
+            self._notional, self._margin, self._upnl = notional, margin, upnl
+            self._upnl_total = sum(upnl.values())
+            self._realized = float(realized or 0.0)
+            if self._day != day:
+                self._start_day(day)
+
+    def _start_day(self, day) -> None:
+        self._day = day
+        self._day_equity = self.portfolio.get_equity()
+        self._upnl_at_open = self._upnl_total
+
+    def _roll(self) -> None:
+        if self._day is None:
+            self.rebuild()
+            return
+        day = datetime.now(timezone.utc).date()
+        if day != self._day:
+            with self._mu:
+                self._realized = 0.0
+                self._start_day(day)
+
+    def on_fill(self, symbol: str, market: str, notional: float, leverage: int = 1, reserved: float = 0.0) -> None:
+        """Count a filled (or unconfirmed) order, converting the reservation check_batch made for it."""
+        with self._mu:
+            self._unreserve(symbol, market, reserved, leverage)
+            self._notional[symbol] = self._notional.get(symbol, 0.0) + notional
+            self._margin[market] = self._margin.get(market, 0.0) + notional / max(leverage, 1)
+
+    def release(self, symbol: str, market: str, reserved: float, leverage: int = 1) -> None:
+        """Give back a reservation whose order was not sent or was rejected."""
+        with self._mu:
+            self._unreserve(symbol, market, reserved, leverage)
+
+    def _unreserve(self, symbol: str, market: str, reserved: float, leverage: int) -> None:
+        if reserved > 0:
+            self._reserved_n[symbol] = max(0.0, self._reserved_n.get(symbol, 0.0) - reserved)
+            self._reserved_m[market] = max(0.0, self._reserved_m.get(market, 0.0) - reserved / max(leverage, 1))
+
+    def on_mark(self, position_id: int, unrealized_pnl: float) -> None:
+        with self._mu:
+            self._upnl_total += unrealized_pnl - self._upnl.get(position_id, 0.0)
+            self._upnl[position_id] = unrealized_pnl
+
+    def on_close(self, position_id: int, symbol: str, market: str, notional: float, leverage: int,
+                 realized_pnl: float) -> None:
+        with self._mu:
+            self._notional[symbol] = max(0.0, self._notional.get(symbol, 0.0) - notional)
+            self._margin[market] = max(0.0, self._margin.get(market, 0.0) - notional / max(leverage, 1))
+            self._upnl_total -= self._upnl.pop(position_id, 0.0)
+            self._realized += realized_pnl
+
+    def daily_pnl(self) -> float:
+        return self._realized + self._upnl_total - self._upnl_at_open
+
+    def snapshot(self) -> dict:
+        with self._mu:
+            return {
+                "notional": {k: round(v, 2) for k, v in self._notional.items() if v > 0},
+                "margin": {k: round(v, 2) for k, v in self._margin.items()},
+                "reserved": {k: round(v, 2) for k, v in self._reserved_n.items() if v > 0},
+                "daily_pnl": round(self.daily_pnl(), 2),
+                "realized_today": round(self._realized, 2),
+                "day_start_equity": round(self._day_equity, 2),
+                "correlation": self.correlation.stats(),
+            }
+
+    # -----------------------
+    # Checks
+    # -----------------------
+    def check_batch(self, orders: List[RiskOrder], limits: dict, halted: bool = False) -> List[RiskDecision]:
+        if halted:
+            return [RiskDecision("deny", 0.0, "kill switch on") for _ in orders]
+        self._roll()
+        equity = self.portfolio.get_equity()
+        with self._mu:
+            max_loss = limits.get("max_daily_loss_pct", 100.0) / 100.0 * self._day_equity
+            pnl = self.daily_pnl()
+            if max_loss > 0 and pnl <= -max_loss:
+                reason = f"daily loss {pnl:.2f} reached limit {-max_loss:.2f}"
+                return [RiskDecision("deny", 0.0, reason) for _ in orders]
+            asset_cap = limits.get("per_asset_cap_pct", 100.0) / 100.0 * equity
+            budgets = {"spot": equity * settings.SPOT_ALLOCATION_PCT, "futures": equity * settings.FUTURES_ALLOCATION_PCT}
+            corr_cap = limits.get("correlation_cap", 1.0)
+            held = [s for s, v in self._notional.items() if v > 0]
+            held += [s for s, v in self._reserved_n.items() if v > 0 and s not in held]
+            decisions = []
+            for o in orders:
+                lev = max(o.leverage, 1)
+                if self.breaker.is_tripped(o.symbol):
+                    decisions.append(RiskDecision("deny", 0.0, "volatility breaker tripped"))
+                    continue
+                if corr_cap < 1.0 and o.symbol not in held:
+                    peer, rho = self.correlation.max_correlation(o.symbol, held)
+                    if peer is not None and rho > corr_cap:
+                        decisions.append(RiskDecision("deny", 0.0, f"correlation {rho:.2f} with {peer} above cap {corr_cap:.2f}"))
+                        continue
+                used_n = self._notional.get(o.symbol, 0.0) + self._reserved_n.get(o.symbol, 0.0)
+                used_m = self._margin.get(o.market, 0.0) + self._reserved_m.get(o.market, 0.0)
+                room_n = asset_cap - used_n
+                room_m = (budgets.get(o.market, 0.0) - used_m) * lev
+                allowed = min(o.notional, room_n, room_m)
+                if allowed >= o.notional:
+                    d = RiskDecision("allow", o.notional)
+                elif allowed > 0 and allowed >= o.notional * settings.RISK_MIN_RESIZE_FRACTION:
+                    limit = "asset cap" if room_n <= room_m else f"{o.market} margin budget"
+                    d = RiskDecision("resize", allowed, f"resized {o.notional:.2f} -> {allowed:.2f} by {limit}")
+                else:
+                    limit = "asset cap" if room_n <= room_m else f"{o.market} margin budget"
+                    d = RiskDecision("deny", 0.0, f"{limit} exhausted ({max(allowed, 0.0):.2f} left)")
+                if d.notional > 0:
+                    if o.symbol not in held:
+                        held.append(o.symbol)
+                    self._reserved_n[o.symbol] = self._reserved_n.get(o.symbol, 0.0) + d.notional
+                    self._reserved_m[o.market] = self._reserved_m.get(o.market, 0.0) + d.notional / lev
+                decisions.append(d)
+        denied = sum(1 for d in decisions if d.action == "deny")
+        if denied:
+            logger.info(f"Risk gate denied {denied}/{len(orders)} orders")
+        return decisions
@@ -0,0 +1,172 @@
+#Description: Adaptive scan planning: per-symbol priority from ATR%, volume surge and breakout proximity, under a request budget.
+
+import math
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from services.candle_store import CandleStore
+from utils.config import settings
+from utils.logging import logger
+
+# Component weights of the priority score (each component is in [0, 1])
+W_VOLATILITY = 0.4
+W_VOLUME_SURGE = 0.3
+W_BREAKOUT = 0.3
+
+# Bars a window needs for the default measure_activity lookbacks
+ACTIVITY_BARS = 60
+
+WindowFn = Callable[[str], Dict[str, np.ndarray] | None]
+BulkWindowFn = Callable[[List[str]], Dict[str, Dict[str, np.ndarray]]]
+
+
+@dataclass
+class SymbolActivity:
+    atr_pct: float
+    volume_surge: float     # latest volume / mean of the preceding bars
+    breakout_dist_atr: float  # (recent high - close) / ATR, 0 when at or above the high
+
+
+def measure_activity(window: Dict[str, np.ndarray], atr_len: int = 14, vol_len: int = 20,
+                     breakout_lookback: int = 55) -> SymbolActivity | None:
+    """Activity measures from an OHLCV window (oldest first); None if the window is too short."""
+    h, l, c, v = window["high"], window["low"], window["close"], window["volume"]
+    if c.size < max(atr_len, vol_len) + 2:
+        return None
+    prev_c = c[:-1]
+    tr = np.maximum(h[1:] - l[1:], np.maximum(np.abs(h[1:] - prev_c), np.abs(l[1:] - prev_c)))
+    atr = float(tr[-atr_len:].mean())
+    close = float(c[-1])
+    if close <= 0 or atr <= 0:
+        return None
+    # The forming bar carries partial volume, so take the larger of it and the last closed bar
+    base = float(v[-vol_len - 2:-2].mean())
+    surge = float(max(v[-1], v[-2]) / base) if base > 0 else 1.0
+    hh = float(h[-breakout_lookback - 1:-1].max())
+    return SymbolActivity(atr_pct=atr / close * 100.0, volume_surge=surge, breakout_dist_atr=max(0.0, hh - close) / atr)
+
+
+def priority_scores(activity: Dict[str, SymbolActivity]) -> Dict[str, float]:
+    """
+    Score in [0, 1] per symbol: volatility as a percentile rank across the universe (so the scale
+    adapts to market regime), volume surge saturating at 3x, and breakout proximity decaying with
+    distance in ATRs.
+    """
+    if not activity:
+        return {}
+    symbols = list(activity)
+    atr = np.array([activity[s].atr_pct for s in symbols])
+    ranks = atr.argsort().argsort() / max(len(symbols) - 1, 1)
+    out = {}
+    for s, r in zip(symbols, ranks):
+        a = activity[s]
+        surge = min(max((a.volume_surge - 1.0) / 2.0, 0.0), 1.0)
+        breakout = math.exp(-a.breakout_dist_atr)
+        out[s] = W_VOLATILITY * float(r) + W_VOLUME_SURGE * surge + W_BREAKOUT * breakout
+    return out
+
+
+def shared_windows(market, timeframe: str, store: CandleStore | None = None) -> BulkWindowFn:
+    """
+    Windows for symbols this process holds no candles for (shm readers, scans on queue workers): the
+    shared-memory cache when this process reads one, else the candle store, in one query.
+    """
+    store = store or CandleStore.instance()
+    step = market._parse_timeframe_to_timedelta(timeframe)
+
+    def read(symbols: List[str]) -> Dict[str, Dict[str, np.ndarray]]:
+        out = {}
+        shared = market.shared
+        if shared is not None and not shared.is_writer:
+            for s in symbols:
+                w = shared.read_candles(s, timeframe, max_age_seconds=settings.SHM_CACHE_MAX_AGE_SECONDS)
+                if w is not None:
+                    out[s] = w
+        rest = [s for s in symbols if s not in out]
+        if rest:
+            out.update(store.read_recent(timeframe, datetime.now(timezone.utc) - ACTIVITY_BARS * step, symbols=rest))
+        return out
+
+    return read
+
+
+class AdaptiveScanPlanner:
+    """
+    Chooses which symbols to scan on each tick. A symbol's rescan interval shrinks linearly with its
+    priority, from max_interval (dormant) to min_interval (hot); due symbols are taken hottest and
+    most overdue first until the per-tick share of the request budget is spent. Symbols without a
+    local window are read through fallback_fn (see shared_windows); those still without one are
+    treated as hot so they get measured.
+    """
+
+    def __init__(
+        self,
+        window_fn: WindowFn,
+        budget_per_minute: float | None = None,
+        tick_seconds: float | None = None,
+        min_interval: float | None = None,
+        max_interval: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        fallback_fn: BulkWindowFn | None = None,
+    ):
+        self.window_fn = window_fn
+        self.fallback_fn = fallback_fn
+        self.budget_per_minute = budget_per_minute or settings.SCAN_BUDGET_PER_MINUTE
+        self.tick_seconds = tick_seconds or settings.SCAN_ADAPTIVE_TICK_SECONDS
+        self.min_interval = min_interval or settings.SCAN_MIN_INTERVAL_SECONDS
+        self.max_interval = max_interval or settings.SCAN_MAX_INTERVAL_SECONDS
+        self.clock = clock
+        self._last_scan: Dict[str, float] = {}
+        self._last_plan: List[dict] = []
+        self._empty_warned = -math.inf
+
+    def interval_for(self, score: float) -> float:
+        return self.max_interval - (self.max_interval - self.min_interval) * min(max(score, 0.0), 1.0)
+
+    def plan(self, universe: List[str]) -> List[str]:
+        now = self.clock()
+        windows = {s: self.window_fn(s) for s in universe}
+        missing = [s for s, w in windows.items() if w is None]
+        if missing and self.fallback_fn is not None:
+            try:
+                windows.update(self.fallback_fn(missing))
+            except Exception as e:
+                logger.warning(f"Scan planner could not read shared candles: {e}")
+        activity = {}
+        for s, w in windows.items():
+            a = measure_activity(w) if w is not None else None
+            if a is not None:
+                activity[s] = a
+        scores = priority_scores(activity)
+        if universe and not activity and now - self._empty_warned >= 3600:
+            self._empty_warned = now
+            logger.warning(f"Adaptive scan planner has no candle windows for {len(universe)} symbols; "
+                           f"every symbol is scored as unmeasured, so scans are a plain budget round-robin")
+
+        rows = []
+        for s in universe:
+            score = scores.get(s, 1.0)
+            interval = self.interval_for(score)
+            last = self._last_scan.get(s)
+            overdue = math.inf if last is None else (now - last) / interval
+            rows.append({"symbol": s, "score": round(score, 4), "interval_s": round(interval, 1),
+                         "overdue": overdue, "measured": s in scores})
+        due = [r for r in rows if r["overdue"] >= 1.0]
+        due.sort(key=lambda r: (r["score"], r["overdue"]), reverse=True)
+
+        budget = max(1, int(self.budget_per_minute * self.tick_seconds / 60.0))
+        chosen = [r["symbol"] for r in due[:budget]]
+        for s in chosen:
+            self._last_scan[s] = now
+        for r in rows:
+            r["scheduled"] = r["symbol"] in chosen
+            r["overdue"] = None if math.isinf(r["overdue"]) else round(r["overdue"], 2)
+        self._last_plan = sorted(rows, key=lambda r: r["score"], reverse=True)
+        return chosen
+
+    def get_last_plan(self) -> List[dict]:
+        return [dict(r) for r in self._last_plan]
@@ -0,0 +1,262 @@
+#Description: DB-backed scan work queue: the coordinator shards the universe, workers lease shards and write back signals.
+
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from threading import Event, Thread
+from typing import Callable, List
+
+from sqlalchemy import and_, case, func, or_, select, update
+
+from models.db import engine as default_engine
+from models.orm import ScanJob
+from models.schemas import SignalOut
+from services.signals import SignalService
+from utils.config import settings
+from utils.logging import logger
+
+ScanFn = Callable[[List[str], str, bool, dict | None], List[SignalOut]]
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def score_shard(symbols: List[str], timeframe: str, skip_unchanged: bool, params: dict | None) -> List[SignalOut]:
+    """Score a shard with the submitting engine's signal params, so signal_params changes reach every worker."""
+    svc = SignalService.instance()
+    if params and params != svc.params:
+        svc.params = dict(params)
+    return svc.scan_and_score(symbols, timeframe, skip_unchanged=skip_unchanged)
+
+
+def rank_signals(signals: List[SignalOut]) -> List[SignalOut]:
+    """Same ordering scan_and_score uses, applied across shards."""
+    return sorted(signals, key=lambda s: (s.confidence, s.expected_return_pct), reverse=True)
+
+
+class ScanQueue:
+    """
+    Shards of a scan batch stored in the `scan_jobs` table. Any process sharing DATABASE_URL can
+    work on the queue (SQLite for one host, a server database for several).
+
+    A claim is a conditional UPDATE on a row that is pending or whose lease has expired, so exactly
+    one worker wins it. A worker that dies stops renewing its lease, and the shard becomes claimable
+    again once the lease runs out. Shards of a batch its coordinator gave up on are cancelled, so
+    workers do not spend time on results nobody collects.
+    """
+
+    def __init__(self, engine=None):
+        self.engine = engine or default_engine
+        self.table = ScanJob.__table__
+
+    def submit(self, universe: List[str], timeframe: str, shard_size: int | None = None,
+               skip_unchanged: bool = False, params: dict | None = None) -> str:
+        """Split the universe into shards and enqueue them in one transaction; returns the batch id."""
+        shard_size = max(1, shard_size or settings.SCAN_SHARD_SIZE)
+        batch_id = uuid.uuid4().hex
+        now = _utcnow()
+        rows = [
+            {"batch_id": batch_id, "shard": i, "timeframe": timeframe, "symbols": universe[off:off + shard_size],
+             "skip_unchanged": skip_unchanged, "params": params, "status": "pending", "attempts": 0, "ts_created": now, "ts_updated": now}
+            for i, off in enumerate(range(0, len(universe), shard_size))
+        ]
+        if rows:
+            with self.engine.begin() as conn:
+                conn.execute(self.table.insert(), rows)
+        return batch_id
+
+    def _claimable(self, now: datetime):
+        t = self.table
+        return or_(t.c.status == "pending", and_(t.c.status == "leased", t.c.lease_until < now))
+
+    def claim(self, worker_id: str, lease_seconds: float | None = None, batch_id: str | None = None) -> dict | None:
+        """Lease the oldest claimable shard; returns its row as a dict, or None when nothing is claimable."""
+        t = self.table
+        lease = timedelta(seconds=lease_seconds or settings.SCAN_LEASE_SECONDS)
+        for _ in range(5):
+            now = _utcnow()
+            stmt = select(t).where(self._claimable(now)).order_by(t.c.id).limit(1)
+            if batch_id:
+                stmt = stmt.where(t.c.batch_id == batch_id)
+            # Read outside the write transaction (SQLite cannot upgrade a shared lock under contention);
+            # the conditional UPDATE below decides the race
+            with self.engine.connect() as conn:
+                row = conn.execute(stmt).mappings().first()
+            if row is None:
+                return None
+            with self.engine.begin() as conn:
+                won = conn.execute(
+                    update(t).where(t.c.id == row["id"], self._claimable(now)).values(
+                        status="leased", worker_id=worker_id, lease_until=now + lease,
+                        attempts=t.c.attempts + 1, ts_updated=now)
+                ).rowcount
+            if won:
+                if row["status"] == "leased":
+                    logger.warning(f"Reclaimed scan shard {row['batch_id']}#{row['shard']} from {row['worker_id']}")
+                return dict(row, worker_id=worker_id, attempts=row["attempts"] + 1)
+        return None
+
+    def heartbeat(self, job_id: int, worker_id: str, lease_seconds: float | None = None) -> bool:
+        """Extend our lease; False if the shard was reclaimed by someone else."""
+        t = self.table
+        now = _utcnow()
+        with self.engine.begin() as conn:
+            return bool(conn.execute(
+                update(t).where(t.c.id == job_id, t.c.worker_id == worker_id, t.c.status == "leased").values(
+                    lease_until=now + timedelta(seconds=lease_seconds or settings.SCAN_LEASE_SECONDS), ts_updated=now)
+            ).rowcount)
+
+    def complete(self, job_id: int, worker_id: str, signals: List[SignalOut]) -> bool:
+        t = self.table
+        with self.engine.begin() as conn:
+            return bool(conn.execute(
+                update(t).where(t.c.id == job_id, t.c.worker_id == worker_id, t.c.status == "leased").values(
+                    status="done", result=[s.model_dump(mode="json") for s in signals], error=None,
+                    lease_until=None, ts_updated=_utcnow())
+            ).rowcount)
+
+    def fail(self, job_id: int, worker_id: str, error: str, max_attempts: int | None = None) -> None:
+        """Return the shard to the queue, or mark it failed after max_attempts."""
+        t = self.table
+        max_attempts = max_attempts or settings.SCAN_MAX_ATTEMPTS
+        with self.engine.begin() as conn:
+            conn.execute(
+                update(t).where(t.c.id == job_id, t.c.worker_id == worker_id, t.c.status == "leased").values(
+                    status=case((t.c.attempts >= max_attempts, "failed"), else_="pending"),
+                    error=error[:500], lease_until=None, ts_updated=_utcnow())
+            )
+
+    def cancel(self, batch_id: str) -> int:
+        """Cancel the batch's unfinished shards; a worker still scanning one loses its lease. Returns shards cancelled."""
+        t = self.table
+        with self.engine.begin() as conn:
+            return conn.execute(
+                update(t).where(t.c.batch_id == batch_id, t.c.status.in_(("pending", "leased"))).values(
+                    status="cancelled", lease_until=None, ts_updated=_utcnow())
+            ).rowcount
+
+    def batch_status(self, batch_id: str) -> dict:
+        t = self.table
+        with self.engine.connect() as conn:
+            rows = conn.execute(select(t.c.status, func.count()).where(t.c.batch_id == batch_id).group_by(t.c.status)).all()
+        counts = {"pending": 0, "leased": 0, "done": 0, "failed": 0, "cancelled": 0}
+        counts.update({status: int(n) for status, n in rows})
+        counts["total"] = sum(counts.values())
+        return counts
+
+    def collect(self, batch_id: str) -> List[SignalOut]:
+        """Merge the signals of all finished shards of a batch, ranked like a single scan."""
+        t = self.table
+        with self.engine.connect() as conn:
+            results = conn.execute(select(t.c.result).where(t.c.batch_id == batch_id, t.c.status == "done")).scalars().all()
+        return rank_signals([SignalOut(**d) for res in results for d in (res or [])])
+
+    def purge(self, older_than: timedelta = timedelta(days=1)) -> int:
+        """Delete finished batches' rows older than the cutoff."""
+        t = self.table
+        with self.engine.begin() as conn:
+            return conn.execute(
+                t.delete().where(t.c.status.in_(("done", "failed", "cancelled")), t.c.ts_updated < _utcnow() - older_than)
+            ).rowcount
+
+
+class ScanWorker:
+    """Claims shards, scores them and writes the signals back; renews its lease while scanning."""
+
+    def __init__(self, queue: ScanQueue | None = None, worker_id: str | None = None, scan_fn: ScanFn | None = None):
+        self.queue = queue or ScanQueue()
+        self.worker_id = worker_id or default_worker_id()
+        self.scan_fn = scan_fn or score_shard
+        self.processed = 0
+
+    def process(self, job: dict) -> bool:
+        done = Event()
+
+        def _renew():
+            # Renew at a third of the lease so one missed beat does not lose the shard
+            while not done.wait(settings.SCAN_LEASE_SECONDS / 3):
+                if not self.queue.heartbeat(job["id"], self.worker_id):
+                    logger.warning(f"Lost lease on scan shard {job['batch_id']}#{job['shard']}")
+                    return
+
+        beat = Thread(target=_renew, name="scan-lease", daemon=True)
+        beat.start()
+        try:
+            signals = self.scan_fn(list(job["symbols"]), job["timeframe"], bool(job["skip_unchanged"]), job.get("params"))
+            ok = self.queue.complete(job["id"], self.worker_id, signals)
+        except Exception as e:
+            logger.exception(f"Scan shard {job['batch_id']}#{job['shard']} failed: {e}")
+            self.queue.fail(job["id"], self.worker_id, str(e))
+            ok = False
+        finally:
+            done.set()
+            beat.join()
+        self.processed += 1
+        return ok
+
+    def run_once(self, batch_id: str | None = None) -> bool:
+        """Process one shard if any is claimable; returns whether one was claimed."""
+        job = self.queue.claim(self.worker_id, batch_id=batch_id)
+        if job is None:
+            return False
+        self.process(job)
+        return True
+
+    def run(self, stop: Event, poll_seconds: float | None = None) -> None:
+        logger.info(f"Scan worker {self.worker_id} started.")
+        poll = poll_seconds or settings.SCAN_POLL_SECONDS
+        while not stop.is_set():
+            try:
+                if not self.run_once():
+                    stop.wait(poll)
+            except Exception as e:
+                # Database hiccups must not kill the worker; back off and retry
+                logger.warning(f"Scan worker {self.worker_id} error: {e}")
+                stop.wait(poll)
+        logger.info(f"Scan worker {self.worker_id} stopped after {self.processed} shards.")
+
+
+class ScanCoordinator:
+    """Submits a sharded batch and merges the results; also works shards itself so it never stalls without workers."""
+
+    def __init__(self, queue: ScanQueue | None = None, worker: ScanWorker | None = None):
+        self.queue = queue or ScanQueue()
+        self.worker = worker or ScanWorker(self.queue)
+
+    def run_batch(
+        self,
+        universe: List[str],
+        timeframe: str,
+        skip_unchanged: bool = False,
+        shard_size: int | None = None,
+        timeout: float | None = None,
+        help_out: bool = True,
+        params: dict | None = None,
+    ) -> List[SignalOut]:
+        """Scan the universe through the queue; shards are scored with `params` (default: this process's signal params)."""
+        if params is None:
+            params = dict(SignalService.instance().params)
+        batch_id = self.queue.submit(universe, timeframe, shard_size, skip_unchanged, params)
+        deadline = time.monotonic() + (timeout or settings.SCAN_BATCH_TIMEOUT_SECONDS)
+        while True:
+            status = self.queue.batch_status(batch_id)
+            if status["done"] + status["failed"] >= status["total"] or time.monotonic() >= deadline:
+                break
+            if not (help_out and self.worker.run_once(batch_id=batch_id)):
+                time.sleep(settings.SCAN_POLL_SECONDS)
+        signals = self.queue.collect(batch_id)
+        if status["done"] + status["failed"] < status["total"]:
+            # Timed out: nobody will collect the rest, so workers must not keep scanning it
+            status["cancelled"] = self.queue.cancel(batch_id)
+        self.queue.purge()
+        if status["done"] < status["total"]:
+            logger.warning(f"Scan batch {batch_id} incomplete: {status}")
+        logger.info(f"Scan batch {batch_id}: {status['done']}/{status['total']} shards, {len(signals)} signals.")
+        return signals
@@ -7,41 +7,130 @@ from services.signals import SignalService
 from services.monitor import MonitorService
 from services.execution import ExecutionService
 from services.portfolio import PortfolioService
-from datetime import datetime
+from services.backfill import BackfillService
+from services.scan_queue import ScanCoordinator
+from services.scan_priority import AdaptiveScanPlanner, shared_windows
+from services.reconciler import OrderReconciler
+from services.risk_gate import RiskGate
+from utils.profiling import profiler
+from utils.tracing import span
+from datetime import datetime, timedelta, timezone
 
 _scheduler: BackgroundScheduler | None = None
+_planner: AdaptiveScanPlanner | None = None
 
-def scan_job():
+def next_bar_close(step: timedelta, now: datetime | None = None) -> datetime:
+    """First bar boundary (bars are aligned to the UTC epoch, as on the exchange) strictly after now."""
+    now = now or datetime.now(timezone.utc)
+    step_s = int(step.total_seconds())
+    epoch_s = int(now.timestamp())
+    return datetime.fromtimestamp(epoch_s - epoch_s % step_s + step_s, tz=timezone.utc)
+
+def scan_job(timeframe: str = "1h", skip_unchanged: bool = False, universe: list[str] | None = None):
     try:
-        sig = SignalService.instance()
-        exec = ExecutionService.instance()
-        port = PortfolioService.instance()
-        # Universe default top 20
-        universe = sig.get_universe()[:20]
-        signals = sig.scan_and_score(universe, timeframe="1h")
-        # Auto execute if enabled
-        if port._auto_trade:
-            exec.allocate_and_execute([s for s in signals if s.confidence >= port._confidence_threshold])
+        with span("job.scan"), profiler.profile("scan_job"):
+            sig = SignalService.instance()
+            exec = ExecutionService.instance()
+            port = PortfolioService.instance()
+            # Universe default top 20
+            if universe is None:
+                universe = sig.get_universe()[:20]
+            if settings.SCAN_QUEUE_ENABLED:
+                # Shards go to scan workers (any process on the same DATABASE_URL); results come back merged and ranked
+                signals = ScanCoordinator().run_batch(universe, timeframe, skip_unchanged=skip_unchanged)
+            else:
+                signals = sig.scan_and_score(universe, timeframe=timeframe, skip_unchanged=skip_unchanged)
+            # Auto execute if enabled
+            if port._auto_trade:
+                exec.allocate_and_execute([s for s in signals if s.confidence >= port._confidence_threshold])
     except Exception as e:
         logger.exception(f"Scan job failed: {e}")
 
+def adaptive_scan_job(timeframe: str = "1h"):
+    global _planner
+    try:
+        sig = SignalService.instance()
+        if _planner is None:
+            # Priorities come from the in-memory candle windows every scan refreshes; no extra fetches. Symbols
+            # scanned elsewhere (queue workers, the shm writer) are read from the shared cache or the candle store
+            _planner = AdaptiveScanPlanner(lambda s: sig.market.get_candle_window(s, timeframe),
+                                           fallback_fn=shared_windows(sig.market, timeframe))
+        chosen = _planner.plan(sig.get_universe()[:settings.SCAN_ADAPTIVE_UNIVERSE_SIZE])
+        if chosen:
+            scan_job(timeframe, universe=chosen)
+    except Exception as e:
+        logger.exception(f"Adaptive scan job failed: {e}")
+
+def get_scan_plan() -> list[dict]:
+    """Priority, rescan interval and whether it was picked on the last tick, per symbol (adaptive mode)."""
+    return _planner.get_last_plan() if _planner else []
+
 def monitor_job():
     try:
         mon = MonitorService.instance()
-        mon.monitor_once()
+        with span("job.monitor"), profiler.profile("monitor_job"):
+            mon.monitor_once()
     except Exception as e:
         logger.exception(f"Monitor job failed: {e}")
 
+def reconcile_job():
+    try:
+        # Ticks at the fastest cadence; the reconciler skips ticks while its adaptive interval has not elapsed
+        report = OrderReconciler.instance().run_if_due()
+        if report and report["updated"]:
+            # Fills/partial cancels change position sizes; reload the risk counters once rather than per row
+            RiskGate.instance().rebuild()
+    except Exception as e:
+        logger.exception(f"Reconcile job failed: {e}")
+
+def backfill_job():
+    try:
+        sig = SignalService.instance()
+        report = BackfillService.instance().run(sig.get_universe()[:20], timeframes=["1h"])
+        low = {s: r["1h"]["coverage_pct"] for s, r in report.items() if r["1h"]["coverage_pct"] < 100.0}
+        if low:
+            logger.warning(f"Candle coverage below 100% after backfill: {low}")
+    except Exception as e:
+        logger.exception(f"Backfill job failed: {e}")
+
 def start_scheduler():
     global _scheduler
     if _scheduler:
         return _scheduler
     _scheduler = BackgroundScheduler(timezone="UTC")
-    _scheduler.add_job(scan_job, "interval", seconds=settings.SCAN_INTERVAL_SECONDS, id="scan_job", max_instances=1, coalesce=True)
+    timeframes = [t.strip() for t in settings.SCAN_TIMEFRAMES.split(",") if t.strip()]
+    if settings.SCAN_SCHEDULE_MODE == "adaptive":
+        # Frequent small ticks; the planner decides which symbols are due within the request budget
+        _scheduler.add_job(adaptive_scan_job, "interval", seconds=settings.SCAN_ADAPTIVE_TICK_SECONDS,
+                           kwargs={"timeframe": timeframes[0]}, id="scan_job", max_instances=1, coalesce=True)
+    elif settings.SCAN_SCHEDULE_MODE == "bar_close":
+        # One job per timeframe, firing a few seconds after each bar close instead of on a free-running interval
+        market = SignalService.instance().market
+        for tf in timeframes:
+            step = market._parse_timeframe_to_timedelta(tf)
+            first = next_bar_close(step) + timedelta(seconds=settings.SCAN_SETTLE_SECONDS)
+            _scheduler.add_job(scan_job, "interval", seconds=int(step.total_seconds()), start_date=first,
+                               kwargs={"timeframe": tf, "skip_unchanged": True}, id=f"scan_job_{tf}",
+                               max_instances=1, coalesce=True, misfire_grace_time=int(step.total_seconds() // 2))
+            logger.info(f"Bar-close scan for {tf}: first run {first.isoformat()}")
+    else:
+        _scheduler.add_job(scan_job, "interval", seconds=settings.SCAN_INTERVAL_SECONDS, id="scan_job", max_instances=1, coalesce=True)
     _scheduler.add_job(monitor_job, "interval", seconds=settings.MONITOR_INTERVAL_SECONDS, id="monitor_job", max_instances=1, coalesce=True)
+    if settings.MODE == "live":
+        _scheduler.add_job(reconcile_job, "interval", seconds=settings.RECONCILE_MIN_INTERVAL_SECONDS, id="reconcile_job",
+                           max_instances=1, coalesce=True)
+    _scheduler.add_job(backfill_job, "interval", seconds=settings.BACKFILL_INTERVAL_SECONDS, id="backfill_job", max_instances=1, coalesce=True)
     _scheduler.start()
     logger.info("Scheduler started.")
     return _scheduler
 
+def stop_scheduler(wait: bool = True):
+    """Stop scheduling new runs; with wait=True, block until running jobs finish."""
+    global _scheduler
+    if _scheduler:
+        _scheduler.shutdown(wait=wait)
+        _scheduler = None
+        logger.info("Scheduler stopped.")
+
 def get_scheduler():
     return _scheduler
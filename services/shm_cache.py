@@ -0,0 +1,265 @@
+#Description: Cross-process candle windows and ticker snapshot in memory-mapped files; one writer, lock-free seqlock readers.
+
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from threading import Lock, RLock
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from services.ring_buffer import FIELDS, CandleRingBuffer
+from utils.logging import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, the role must be set explicitly
+    fcntl = None
+
+# Header slots (int64) at the start of every segment
+_SEQ, _HEAD, _SIZE, _CAP, _UPDATED, _ITEMSIZE = range(6)
+_HEADER_LEN = 8
+
+TICKER_CAPACITY = 1 << 22   # bytes reserved for the JSON ticker snapshot
+_READ_RETRIES = 100
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class _Seqlock:
+    """
+    Sequence counter in a shared header: the writer makes it odd while writing and even when
+    done; a reader retries until it sees the same even value before and after copying.
+    """
+
+    def __init__(self, header: np.ndarray):
+        self.header = header
+        self._depth = 0
+
+    @contextmanager
+    def writing(self):
+        self._depth += 1
+        if self._depth == 1:
+            self.header[_SEQ] += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if self._depth == 0:
+                self.header[_UPDATED] = _now_ms()
+                self.header[_SEQ] += 1
+
+    def read(self, fn):
+        """Run fn() under the seqlock; fn must copy what it reads. Returns None if the writer never settles."""
+        for _ in range(_READ_RETRIES):
+            s1 = int(self.header[_SEQ])
+            if s1 & 1:
+                time.sleep(0)
+                continue
+            out = fn()
+            if int(self.header[_SEQ]) == s1:
+                return out
+        return None
+
+
+class SharedCandleRing(CandleRingBuffer):
+    """
+    CandleRingBuffer whose arrays and head/size live in a memory-mapped file, so every process maps
+    the same pages. Writes go through the seqlock; readers use `snapshot` for a consistent copy.
+    """
+
+    def __init__(self, path: Path, capacity: int, dtype, writable: bool):
+        self.path = path
+        self.capacity = int(capacity)
+        dtype = np.dtype(dtype)
+        n = 2 * self.capacity
+        size = 8 * _HEADER_LEN + 8 * n + dtype.itemsize * len(FIELDS) * n
+        if writable and (not path.exists() or path.stat().st_size != size):
+            # Build aside and swap in, so readers still mapping an old layout never see a truncated file
+            tmp = path.with_suffix(".tmp")
+            np.memmap(tmp, dtype=np.uint8, mode="w+", shape=(size,)).flush()
+            os.replace(tmp, path)
+        self.inode = path.stat().st_ino
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r+" if writable else "r", shape=(size,))
+        self._hdr = self._mm[:8 * _HEADER_LEN].view(np.int64)
+        self._ts = self._mm[8 * _HEADER_LEN:8 * (_HEADER_LEN + n)].view(np.int64)
+        self._data = self._mm[8 * (_HEADER_LEN + n):].view(dtype).reshape(len(FIELDS), n)
+        if writable:
+            self._hdr[_CAP], self._hdr[_ITEMSIZE] = self.capacity, dtype.itemsize
+        elif (self._hdr[_CAP], self._hdr[_ITEMSIZE]) != (self.capacity, dtype.itemsize):
+            raise ValueError(f"layout mismatch (capacity {self._hdr[_CAP]}, itemsize {self._hdr[_ITEMSIZE]})")
+        self._seq = _Seqlock(self._hdr)
+        # Taken outside the seqlock: two writer threads must not both bump the sequence
+        self._mu = RLock()
+
+    # head/size are shared state, kept in the header
+    @property
+    def _head(self) -> int:
+        return int(self._hdr[_HEAD])
+
+    @_head.setter
+    def _head(self, value: int) -> None:
+        self._hdr[_HEAD] = value
+
+    @property
+    def _size(self) -> int:
+        return int(self._hdr[_SIZE])
+
+    @_size.setter
+    def _size(self, value: int) -> None:
+        self._hdr[_SIZE] = value
+
+    @property
+    def updated_ms(self) -> int:
+        return int(self._hdr[_UPDATED])
+
+    def append(self, *bar) -> None:
+        with self._mu, self._seq.writing():
+            super().append(*bar)
+
+    def update_last(self, *bar) -> None:
+        with self._mu, self._seq.writing():
+            super().update_last(*bar)
+
+    def ingest(self, ts_ms: np.ndarray, ohlcv: np.ndarray) -> int:
+        with self._mu, self._seq.writing():
+            return super().ingest(ts_ms, ohlcv)
+
+    def snapshot(self, n: int | None = None) -> Dict[str, np.ndarray] | None:
+        """Consistent copy of the last n bars, or None if the writer kept the segment busy."""
+        return self._seq.read(lambda: {k: v.copy() for k, v in self.view(n).items()})
+
+
+class SharedMarketCache:
+    """
+    Memory-mapped segments under `root`: one per (symbol, timeframe) candle window plus a ticker
+    snapshot. Exactly one process is the writer (an exclusive flock on `writer.lock`, or an explicit
+    role); every other process reads the same pages without taking any lock.
+    """
+
+    def __init__(self, root: Path, capacity: int = 400, dtype="float64", role: str = "auto"):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.capacity = capacity
+        self.dtype = np.dtype(dtype)
+        self._rings: Dict[Tuple[str, str], SharedCandleRing] = {}
+        self._lock = Lock()
+        self._lock_file = None
+        self.is_writer = self._claim_writer(role)
+        self._ticker_mm = None
+        logger.info(f"Shared market cache at {self.root} ({'writer' if self.is_writer else 'reader'}).")
+
+    def _claim_writer(self, role: str) -> bool:
+        if role in ("writer", "reader"):
+            return role == "writer"
+        if fcntl is None:
+            return False
+        f = open(self.root / "writer.lock", "a+")
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        # Held for the life of the process; the OS releases it if we die
+        self._lock_file = f
+        return True
+
+    # -----------------------
+    # Candles
+    # -----------------------
+    def _path(self, symbol: str, timeframe: str) -> Path:
+        return self.root / f"{symbol}_{timeframe}.ring"
+
+    def _ring(self, symbol: str, timeframe: str) -> SharedCandleRing | None:
+        key = (symbol, timeframe)
+        ring = self._rings.get(key)
+        path = self._path(symbol, timeframe)
+        if ring is not None and (self.is_writer or not path.exists() or path.stat().st_ino == ring.inode):
+            return ring
+        if not self.is_writer and not path.exists():
+            return None
+        with self._lock:
+            try:
+                ring = SharedCandleRing(path, self.capacity, self.dtype, writable=self.is_writer)
+            except (OSError, ValueError) as e:
+                # Layout written by a writer with another capacity/dtype; wait for it to be rebuilt
+                logger.debug(f"Shared ring {path.name} unavailable: {e}")
+                return None
+            self._rings[key] = ring
+        return ring
+
+    def publish_candles(self, symbol: str, timeframe: str, df: pd.DataFrame) -> int:
+        """Writer only: upsert bars from a ts + OHLCV DataFrame into the shared window."""
+        if not self.is_writer or df is None or df.empty:
+            return 0
+        ts = pd.to_datetime(df["ts"], utc=True).dt.tz_convert(None).to_numpy().astype("datetime64[ms]").astype(np.int64)
+        ohlcv = np.vstack([df[f].to_numpy(dtype=self.dtype, na_value=np.nan) for f in FIELDS])
+        return self._ring(symbol, timeframe).ingest(ts, ohlcv)
+
+    def read_candles(self, symbol: str, timeframe: str, n: int | None = None,
+                     max_age_seconds: float | None = None) -> Dict[str, np.ndarray] | None:
+        """Consistent copy of the last n shared bars; None if absent, shorter than n, or older than max_age."""
+        ring = self._ring(symbol, timeframe)
+        if ring is None or (max_age_seconds is not None and _now_ms() - ring.updated_ms > max_age_seconds * 1000):
+            return None
+        snap = ring.snapshot(n)
+        if snap is None or snap["ts"].size == 0 or (n and snap["ts"].size < n):
+            return None
+        return snap
+
+    def read_candles_df(self, symbol: str, timeframe: str, n: int | None = None,
+                        max_age_seconds: float | None = None) -> pd.DataFrame | None:
+        snap = self.read_candles(symbol, timeframe, n, max_age_seconds)
+        if snap is None:
+            return None
+        df = pd.DataFrame({f: snap[f] for f in FIELDS})
+        df.insert(0, "ts", pd.to_datetime(snap["ts"], unit="ms", utc=True))
+        return df
+
+    # -----------------------
+    # Tickers
+    # -----------------------
+    def _ticker_segment(self):
+        if self._ticker_mm is None:
+            path = self.root / "tickers.snap"
+            size = 8 * _HEADER_LEN + TICKER_CAPACITY
+            if self.is_writer and (not path.exists() or path.stat().st_size != size):
+                np.memmap(path, dtype=np.uint8, mode="w+", shape=(size,)).flush()
+            if not path.exists():
+                return None
+            self._ticker_mm = np.memmap(path, dtype=np.uint8, mode="r+" if self.is_writer else "r", shape=(size,))
+        hdr = self._ticker_mm[:8 * _HEADER_LEN].view(np.int64)
+        return hdr, self._ticker_mm[8 * _HEADER_LEN:], _Seqlock(hdr)
+
+    def publish_tickers(self, rows: List[dict]) -> bool:
+        """Writer only: replace the ticker snapshot with the given rows."""
+        seg = self._ticker_segment() if self.is_writer else None
+        if seg is None:
+            return False
+        payload = json.dumps(rows, separators=(",", ":")).encode()
+        if len(payload) > TICKER_CAPACITY:
+            logger.warning(f"Ticker snapshot of {len(payload)} bytes exceeds shared capacity; not published.")
+            return False
+        hdr, body, lock = seg
+        with lock.writing():
+            body[:len(payload)] = np.frombuffer(payload, dtype=np.uint8)
+            hdr[_SIZE] = len(payload)
+        return True
+
+    def read_tickers(self, max_age_seconds: float | None = None) -> List[dict] | None:
+        seg = self._ticker_segment()
+        if seg is None:
+            return None
+        hdr, body, lock = seg
+        if hdr[_SIZE] == 0 or (max_age_seconds is not None and _now_ms() - int(hdr[_UPDATED]) > max_age_seconds * 1000):
+            return None
+        raw = lock.read(lambda: bytes(body[:int(hdr[_SIZE])]))
+        return json.loads(raw) if raw else None
+
+    def keys(self) -> List[Tuple[str, str]]:
+        return list(self._rings.keys())
@@ -5,6 +5,7 @@ import pandas as pd
 import numpy as np
 import pandas_ta as ta
 
+import time
 from datetime import datetime,timezone,timedelta
 from threading import Lock
 from typing import Dict, Any, List
@@ -12,8 +13,10 @@ from typing import Dict, Any, List
 from utils.logging import logger
 from models.schemas import SignalOut
 from services.market_data import MarketDataService
-from adapters.coindcx_common import CoinDCXBaseAdapter
 from utils.config import settings
+from utils.tracing import span
+from services.event_log import EventRing
+from services.correlation import CorrelationTracker
 
 FALLBACK_UNIVERSE: List[str] = [
     "BTCUSDT", "ETHUSDT", "BNBUSDT", "XRPUSDT", "ADAUSDT", "DOGEUSDT",
@@ -26,7 +29,8 @@ class SignalService:
 
     def __init__(self):
         self.market = MarketDataService.instance()
-        self.coindcx= CoinDCXBaseAdapter(settings.COINDCX_FUT_API_KEY, settings.COINDCX_FUT_API_SECRET)
+        # Same credentials as the market data adapter; reuse it (and its pooled client)
+        self.coindcx = self.market.coindcx
         
         # cache dictionary with default values
         self._universe_cache = {
@@ -65,8 +69,10 @@ class SignalService:
             "macd_slow_length": 26,
             "macd_signal_length": 9,
         }
-        self._logs = []
-
+        self._logs = EventRing(settings.SIGNAL_LOG_BUFFER_SIZE)
+        self.correlation = CorrelationTracker.instance()
+        # Open time of the last bar scored per (symbol, timeframe); lets bar-close scans skip unchanged symbols
+        self._last_scanned_bar: Dict[tuple, pd.Timestamp] = {}
 
     @classmethod
     def instance(cls):
@@ -140,13 +146,14 @@ class SignalService:
 
         return filtered
         
-    def compute_features(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Compute technical features used by the scoring model."""
+    def compute_features(self, df: pd.DataFrame, copy: bool = True) -> pd.DataFrame:
+        """Compute technical features used by the scoring model. Pass copy=False when the caller owns df."""
         if df is None or df.empty:
             return df
 
         p = self.params
-        df = df.copy()
+        if copy:
+            df = df.copy()
 
         ema_fast_len = int(p.get("ema_fast", 20))
         ema_slow_len = int(p.get("ema_slow", 50))
@@ -289,29 +296,88 @@ class SignalService:
         sl = max(0.0000001, sl)
         return tp, sl
 
-    def scan_and_score(self, universe: list[str], timeframe: str) -> list[SignalOut]:
+    def scan_and_score(self, universe: list[str], timeframe: str, skip_unchanged: bool = False) -> list[SignalOut]:
+        """
+        Score every symbol. With skip_unchanged (bar-close scans), each symbol is scored on its last closed
+        bar and left out when that bar was already scored. A symbol whose exchange feed has not rolled to the
+        new bar yet is fetched again every SCAN_SETTLE_SECONDS, for up to SCAN_SETTLE_RETRY_SECONDS, and is
+        scored on the bars it has once that runs out.
+        """
         out: list[SignalOut] = []
-        for symbol in universe:
+        skipped = 0
+        pending = list(universe)
+        deadline = time.monotonic() + settings.SCAN_SETTLE_RETRY_SECONDS
+        while pending:
+            final = not skip_unchanged or time.monotonic() >= deadline
+            retry = []
+            for symbol in pending:
+                with span("scan.symbol", symbol):
+                    sig, state = self._scan_symbol(symbol, timeframe, skip_unchanged, final)
+                skipped += state == "unchanged"
+                if state == "pending":
+                    retry.append(symbol)
+                if sig is not None:
+                    out.append(sig)
+            if retry:
+                time.sleep(max(0.0, min(max(1, settings.SCAN_SETTLE_SECONDS), deadline - time.monotonic())))
+            pending = retry
+        if timeframe == settings.CORRELATION_TIMEFRAME:
+            # All symbols' returns for the new bars go into one update
+            self.correlation.commit()
+        # Sort by confidence and expected return
+        out.sort(key=lambda s: (s.confidence, s.expected_return_pct), reverse=True)
+        msg = f"{datetime.now(timezone.utc)} Generated {len(out)} signals for tf={timeframe}"
+        self._logs.append(msg + (f", {skipped} unchanged skipped" if skipped else ""))
+        return out
+
+    def _scan_symbol(self, symbol: str, timeframe: str, skip_unchanged: bool,
+                     final: bool = True) -> tuple[SignalOut | None, str]:
+        """
+        Signal for one symbol and how it went: "scored", "unchanged" (its last closed bar was already scored)
+        or "pending" (bar-close scan, the feed has not rolled to the new bar yet; only when not final).
+        """
+        with span("scan.candles"):
             df = self.market.get_candles_df(symbol, timeframe, limit=400)
-            df = self.compute_features(df)
-            if df is None or df.empty:
-                continue
+        if df is not None and not df.empty:
+            synthetic = bool(df.attrs.get("warnings"))
+            step = self.market._parse_timeframe_to_timedelta(timeframe)
+            closed = (pd.to_datetime(df["ts"], utc=True) + step <= pd.Timestamp.now(tz="UTC")).to_numpy()
+            if skip_unchanged:
+                # No forming row yet: the exchange has not rolled, and the newest row may still be incomplete
+                if closed[-1] and not final:
+                    return None, "pending"
+                # Bar-close scans score the last closed bar, never the forming one
+                df = df[closed]
+                if df.empty:
+                    return None, "unchanged"
+                last_bar = df["ts"].iloc[-1]
+                if self._last_scanned_bar.get((symbol, timeframe)) == last_bar:
+                    return None, "unchanged"
+                self._last_scanned_bar[(symbol, timeframe)] = last_bar
+            # Synthetic fallback candles (flagged with fetch warnings) must not feed the correlation stats
+            if timeframe == settings.CORRELATION_TIMEFRAME and closed.sum() > 1 and not synthetic:
+                # Only closed bars feed the correlation stats
+                bars = df.iloc[:int(closed.sum())]
+                self.correlation.observe(symbol, bars["ts"].values.astype("datetime64[ms]").astype(np.int64),
+                                         bars["close"].to_numpy(dtype=np.float64))
+        # get_candles_df already hands back a private frame; annotate it in place
+        with span("scan.features"):
+            df = self.compute_features(df, copy=False)
+        if df is None or df.empty:
+            return None, "scored"
+        with span("scan.score"):
             row = df.iloc[-1]
             conf = self.score_row(row)
             tp, sl = self.propose_targets(row)
-            exp_ret_pct = (tp - row["close"]) / row["close"] * 100.0
-            # Use spot for top pairs; map some to futures bucket alternately
-            market = "spot" if hash(symbol) % 2 == 0 else "futures"
-            sig = SignalOut(
-                symbol=symbol, market=market, timeframe=timeframe, ts=pd.Timestamp(row["ts"]).to_pydatetime(),
-                confidence=conf, expected_return_pct=exp_ret_pct, entry=row["close"], tp=tp, sl=sl, side="BUY",
-                rationale=f"EMA trend: {row['ema_fast']:.2f}>{row['ema_slow']:.2f}, RSI: {row['rsi']:.1f}, MACD>Signal: {row['macd']>row['macd_signal']}."
-            )
-            out.append(sig)
-        # Sort by confidence and expected return
-        out.sort(key=lambda s: (s.confidence, s.expected_return_pct), reverse=True)
-        self._logs.append(f"{datetime.now(timezone.utc)} Generated {len(out)} signals for tf={timeframe}")
-        return out
+        exp_ret_pct = (tp - row["close"]) / row["close"] * 100.0
+        # Use spot for top pairs; map some to futures bucket alternately
+        market = "spot" if hash(symbol) % 2 == 0 else "futures"
+        sig = SignalOut(
+            symbol=symbol, market=market, timeframe=timeframe, ts=pd.Timestamp(row["ts"]).to_pydatetime(),
+            confidence=conf, expected_return_pct=exp_ret_pct, entry=row["close"], tp=tp, sl=sl, side="BUY",
+            rationale=f"EMA trend: {row['ema_fast']:.2f}>{row['ema_slow']:.2f}, RSI: {row['rsi']:.1f}, MACD>Signal: {row['macd']>row['macd_signal']}."
+        )
+        return sig, "scored"
 
     def quick_backtest(self, df: pd.DataFrame) -> dict:
         # Simple long-only: buy when score>0.7 and flat; exit on TP/SL or reverse
@@ -357,5 +423,5 @@ class SignalService:
 
 
     def get_recent_logs(self, n=100):
-        return self._logs[-n:]
+        return self._logs.recent(n)
 
@@ -6,7 +6,7 @@ import streamlit as st
 
 from utils.config import settings
 from utils.context import get_app_context
-from services.scheduler import start_scheduler, get_scheduler
+from services.engine_api import get_engine
 from utils.logging import logger
 from models.db import init_db
 
@@ -21,14 +21,26 @@ st.set_page_config(
 if "app_initialized" not in st.session_state:
     init_db()
     ctx = get_app_context()
-    # Start background scheduler
-    start_scheduler()
+    # Attach to the headless engine if one is running (else the scheduler starts in this process)
+    get_engine()
     st.session_state["app_initialized"] = True
-    st.session_state["kill_switch"] = False
-    st.session_state["auto_trade"] = False
-    st.session_state["confidence_threshold"] = settings.CONFIDENCE_THRESHOLD
     logger.info("App initialized")
 
+engine = get_engine()
+
+# The engine owns these controls: every rerun mirrors its current state, so a stale tab never pushes old values
+CONTROLS = ("kill_switch", "auto_trade", "confidence_threshold")
+engine_state = engine.status()
+for key in CONTROLS:
+    st.session_state[key] = engine_state[key]
+st.session_state["confidence_threshold"] = float(st.session_state["confidence_threshold"])
+
+
+def _push_control(key: str):
+    # Only the control the user just changed goes to the engine
+    engine.control(**{key: st.session_state[key]})
+
+
 st.title("Agentic AI Trading System - CoinDCX")
 st.subheader("Live Dashboard and Controls")
 
@@ -36,16 +48,15 @@ st.subheader("Live Dashboard and Controls")
 col1, col2, col3, col4 = st.columns([1,1,2,2])
 
 with col1:
-    st.session_state["kill_switch"] = st.toggle("Kill Switch", value=st.session_state["kill_switch"])
+    st.toggle("Kill Switch", key="kill_switch", on_change=_push_control, args=("kill_switch",))
 with col2:
-    st.session_state["auto_trade"] = st.toggle("Auto-Trade", value=st.session_state["auto_trade"])
+    st.toggle("Auto-Trade", key="auto_trade", on_change=_push_control, args=("auto_trade",))
 with col3:
-    st.session_state["confidence_threshold"] = st.slider(
-        "Confidence Threshold", min_value=0.5, max_value=0.95,
-        value=float(st.session_state["confidence_threshold"]), step=0.01
-    )
+    st.slider("Confidence Threshold", min_value=0.5, max_value=0.95, step=0.01, key="confidence_threshold",
+              on_change=_push_control, args=("confidence_threshold",))
 with col4:
     st.write(f"Mode: {settings.MODE.upper()} | Spot {int(settings.SPOT_ALLOCATION_PCT*100)}% | Fut {int(settings.FUTURES_ALLOCATION_PCT*100)}%")
+    st.caption("Engine: headless" if engine.remote else "Engine: embedded in UI")
 
 st.info("Use the pages sidebar to access Screener, Strategy Config, Portfolio, Backtesting, API & Keys, and Risk Center.")
 
@@ -54,17 +65,10 @@ st.divider()
 # Quick overview (embed dashboard preview)
 from services.portfolio import PortfolioService
 from services.market_data import MarketDataService
-from services.monitor import MonitorService
 from utils.charts import equity_chart, positions_table, exposure_pie
 
 portfolio = PortfolioService.instance()
 market = MarketDataService.instance()
-monitor = MonitorService.instance()
-
-# Update auto-trade and kill-switch in services
-portfolio.set_auto_trade(st.session_state["auto_trade"])
-monitor.set_kill_switch(st.session_state["kill_switch"])
-portfolio.set_confidence_threshold(st.session_state["confidence_threshold"])
 
 # Equity and exposure
 colA, colB = st.columns([2,1])
@@ -81,5 +85,5 @@ st.dataframe(positions_table(portfolio.get_open_positions_df()), use_container_w
 
 # Logs preview
 st.subheader("Recent Events")
-for log in portfolio.get_recent_events(limit=10):
+for log in engine.recent_events(limit=10):
     st.write(f"{log['ts']} [{log['level']}] {log['message']}")
@@ -0,0 +1,54 @@
+#Description: Adapter request scheduling tests using an in-process mock transport (no network).
+
+import threading
+import time
+
+import httpx
+
+from adapters.coindcx_common import CoinDCXBaseAdapter
+from adapters.coindcx_spot import CoinDCXSpotAdapter
+from adapters.http_pool import HttpPool
+from adapters.rate_limit import TokenBucket, ENDPOINT_PUBLIC, PRIORITY_BACKFILL, PRIORITY_ORDER
+
+
+def test_retry_after_429_then_success():
+    hits = []
+    def handler(request):
+        hits.append(time.monotonic())
+        if len(hits) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0.2"})
+        return httpx.Response(200, json=[{"market": "BTCUSDT"}])
+
+    adapter = CoinDCXBaseAdapter("k", "s")
+    adapter.client = httpx.Client(transport=httpx.MockTransport(handler))
+    before = adapter.scheduler.metrics()[ENDPOINT_PUBLIC]
+
+    assert adapter.get("/exchange/ticker", public=True) == [{"market": "BTCUSDT"}]
+    assert len(hits) == 2 and hits[1] - hits[0] >= 0.2
+    after = adapter.scheduler.metrics()[ENDPOINT_PUBLIC]
+    assert after["rate_limited"] == before["rate_limited"] + 1
+    assert after["retries"] == before["retries"] + 1
+
+
+def test_token_bucket_serves_higher_priority_first():
+    bucket = TokenBucket(rate=20, capacity=1)
+    bucket.acquire()  # drain
+    order = []
+    def worker(name, prio):
+        bucket.acquire(prio)
+        order.append(name)
+
+    backfill = [threading.Thread(target=worker, args=(f"bf{i}", PRIORITY_BACKFILL)) for i in range(3)]
+    for t in backfill:
+        t.start()
+    time.sleep(0.01)
+    urgent = threading.Thread(target=worker, args=("order", PRIORITY_ORDER))
+    urgent.start()
+    for t in backfill + [urgent]:
+        t.join()
+    assert order.index("order") <= 1
+
+
+def test_adapters_share_one_pooled_client():
+    a, b = CoinDCXBaseAdapter(), CoinDCXSpotAdapter()
+    assert a.client is b.client is HttpPool.instance().client
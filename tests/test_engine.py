@@ -0,0 +1,783 @@
+#Description: Headless engine tests: control API round trip (local server on an ephemeral port) and scan scheduling.
+
+import os
+import time
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, func, select
+
+from models.orm import Alert, Base, Order, Position
+from models.schemas import SignalOut
+from services.engine_api import EngineApiServer, RemoteEngine
+from services.event_log import AlertWriter, EventRing
+from services.exchange_constraints import ExchangeConstraints
+from services.execution import ExecutionService
+from services.kill_switch import KillSwitchExecutor
+from services.order_store import OrderStore
+from services.reconciler import OrderReconciler
+from services.ring_buffer import RingBufferRegistry
+from services.allocator import Allocator, Candidate, ledoit_wolf
+from services.candle_store import CandleStore
+from services.circuit_breaker import VolatilityBreaker
+from services.correlation import CorrelationTracker
+from services.risk_gate import RiskGate, RiskOrder
+from services.scan_priority import AdaptiveScanPlanner, shared_windows
+from services.scan_queue import ScanCoordinator, ScanQueue, ScanWorker
+from services.scheduler import next_bar_close
+from utils.profiling import JobProfiler
+from utils.tracing import _NOOP, Tracer
+
+
+class _FakeEngine:
+    def __init__(self):
+        self.state = {"kill_switch": False, "auto_trade": False, "confidence_threshold": 0.65}
+        self.executed = []
+
+    def status(self):
+        return dict(self.state)
+
+    def control(self, **changes):
+        self.state.update(changes)
+        return self.status()
+
+    def recent_events(self, limit=20):
+        return [{"ts": "t", "level": "INFO", "message": f"event {i}"} for i in range(limit)]
+
+    def execute(self, signals):
+        self.executed.extend(signals)
+        return {"orders_placed": len(signals), "skipped": 0, "errors": 0}
+
+
+def test_remote_engine_controls_and_actions():
+    fake = _FakeEngine()
+    server = EngineApiServer(fake, host="127.0.0.1", port=0, token="s3cret")
+    server.start()
+    try:
+        url = f"http://127.0.0.1:{server.address[1]}"
+        remote = RemoteEngine(url, token="s3cret")
+        assert remote.available()
+        # Unauthenticated or non-JSON POSTs (e.g. a cross-site text/plain form) never reach the engine
+        assert httpx.post(f"{url}/control", json={"kill_switch": True}).status_code == 401
+        assert httpx.post(f"{url}/control", json={"kill_switch": True}, headers={"X-Engine-Token": "wrong"}).status_code == 401
+        assert httpx.post(f"{url}/control", content='{"kill_switch": true}',
+                          headers={"Content-Type": "text/plain", "X-Engine-Token": "s3cret"}).status_code == 415
+        assert fake.state["kill_switch"] is False
+        state = remote.control(kill_switch=True, unknown_key=1)
+        assert state["kill_switch"] is True and "unknown_key" not in state
+        assert len(remote.recent_events(3)) == 3
+
+        sig = SignalOut(symbol="BTCUSDT", timeframe="1h", ts=datetime.now(timezone.utc), confidence=0.8,
+                        expected_return_pct=2.0, entry=100.0, tp=102.0, sl=99.0)
+        assert remote.execute([sig])["orders_placed"] == 1
+        assert fake.executed[0].symbol == "BTCUSDT" and fake.executed[0].ts == sig.ts
+    finally:
+        server.stop()
+    assert not remote.available()
+
+
+def _fake_scan(symbols, timeframe, skip_unchanged, params=None):
+    return [SignalOut(symbol=s, timeframe=timeframe, ts=datetime.now(timezone.utc), confidence=len(s) / 10,
+                      expected_return_pct=1.0, entry=1.0, tp=1.1, sl=0.9) for s in symbols]
+
+
+def test_next_bar_close_is_utc_aligned():
+    now = datetime(2024, 5, 1, 13, 59, 58, tzinfo=timezone.utc)
+    assert next_bar_close(timedelta(hours=1), now) == datetime(2024, 5, 1, 14, 0, tzinfo=timezone.utc)
+    assert next_bar_close(timedelta(hours=4), now) == datetime(2024, 5, 1, 16, 0, tzinfo=timezone.utc)
+    # Exactly on a boundary: the bar that just closed has already fired, so the next one is due
+    on = datetime(2024, 5, 1, 14, 0, tzinfo=timezone.utc)
+    assert next_bar_close(timedelta(minutes=15), on) == datetime(2024, 5, 1, 14, 15, tzinfo=timezone.utc)
+
+
+def test_scan_queue_reclaims_dead_worker_and_merges_ranked(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue.db'}")
+    Base.metadata.create_all(engine)
+    queue = ScanQueue(engine)
+    universe = ["A", "BBBB", "CC", "DDDDD", "EEE", "F", "GGGGGG"]
+    batch = queue.submit(universe, "1h", shard_size=3)
+    assert queue.batch_status(batch)["total"] == 3
+
+    # A worker leases a shard and dies without completing it
+    dead = queue.claim("dead-worker", lease_seconds=0.2)
+    assert dead is not None and queue.claim("other", lease_seconds=0.2, batch_id="nope") is None
+    time.sleep(0.3)
+
+    worker = ScanWorker(queue, worker_id="live", scan_fn=_fake_scan)
+    while worker.run_once():
+        pass
+    assert worker.processed == 3 and queue.batch_status(batch)["done"] == 3
+    assert queue.complete(dead["id"], "dead-worker", []) is False   # its lease was taken over
+    signals = queue.collect(batch)
+    assert sorted(s.symbol for s in signals) == sorted(universe)
+    assert [s.symbol for s in signals][:2] == ["GGGGGG", "DDDDD"]
+
+    # With no separate workers running, the coordinator works its own batch to completion
+    merged = ScanCoordinator(queue, worker).run_batch(universe[:4], "1h", shard_size=2, timeout=10)
+    assert len(merged) == 4
+
+
+def test_scan_queue_carries_params_and_cancels_timed_out_batches(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'queue_params.db'}")
+    Base.metadata.create_all(engine)
+    queue = ScanQueue(engine)
+    seen = []
+
+    def _scan(symbols, timeframe, skip_unchanged, params):
+        seen.append(params)
+        return _fake_scan(symbols, timeframe, skip_unchanged)
+
+    worker = ScanWorker(queue, worker_id="remote", scan_fn=_scan)
+    # The coordinator's signal params travel with the shards to whichever worker scores them
+    coordinator = ScanCoordinator(queue, worker)
+    assert len(coordinator.run_batch(["A", "BB"], "1h", shard_size=1, timeout=10, params={"ema_fast": 9})) == 2
+    assert seen == [{"ema_fast": 9}, {"ema_fast": 9}]
+
+    # Nobody works this batch; once it times out its shards are cancelled rather than left for workers
+    assert coordinator.run_batch(["C", "DD", "EEE"], "1h", shard_size=1, timeout=0.05, help_out=False, params={}) == []
+    assert queue.claim("late") is None and not worker.run_once()
+    assert seen == [{"ema_fast": 9}, {"ema_fast": 9}]
+
+
+def _window(n=80, vol_mult=1.0, move=0.001, at_high=False):
+    close = 100 * np.cumprod(np.full(n, 1 + move))
+    high, low = close * (1 + 5 * move), close * (1 - 5 * move)
+    if not at_high:
+        high[n // 2] = close.max() * 1.5   # breakout level far above
+    volume = np.full(n, 100.0)
+    volume[-1] *= vol_mult
+    return {"ts": np.arange(n), "open": close, "high": high, "low": low, "close": close, "volume": volume}
+
+
+def test_adaptive_planner_prioritizes_active_symbols_within_budget():
+    windows = {"HOT": _window(vol_mult=4, move=0.01, at_high=True), "MID": _window(move=0.005), "COLD": _window()}
+    now = [0.0]
+    planner = AdaptiveScanPlanner(windows.get, budget_per_minute=2, tick_seconds=60,
+                                  min_interval=60, max_interval=1800, clock=lambda: now[0])
+    assert planner.plan(["COLD", "MID", "HOT", "NEW"]) in (["NEW", "HOT"], ["HOT", "NEW"])  # unmeasured first
+    assert planner.plan(["COLD", "MID", "HOT", "NEW"]) == ["MID", "COLD"]   # never scanned yet, by score
+    plan = {r["symbol"]: r for r in planner.get_last_plan()}
+    assert plan["HOT"]["score"] > plan["MID"]["score"] > plan["COLD"]["score"]
+    assert plan["HOT"]["interval_s"] < 300 < plan["COLD"]["interval_s"]
+    # A few minutes later only the unmeasured and hot symbols are due again
+    now[0] = 240.0
+    assert planner.plan(["COLD", "MID", "HOT", "NEW"]) == ["NEW", "HOT"]
+
+
+def test_adaptive_planner_reads_candle_store_without_local_windows(tmp_path):
+    db = create_engine(f"sqlite:///{tmp_path / 'plan_store.db'}")
+    Base.metadata.create_all(db)
+    store = CandleStore(db)
+    # Scans ran on queue workers: this process holds no windows, the candle store has the bars
+    ts = pd.date_range(end=pd.Timestamp.now(tz="UTC").floor("1h"), periods=80, freq="1h")
+    for s, w in (("HOT", _window(vol_mult=4, move=0.01, at_high=True)), ("COLD", _window())):
+        store.upsert(s, "1h", pd.DataFrame({"ts": ts, **{f: w[f] for f in ("open", "high", "low", "close", "volume")}}))
+    market = SimpleNamespace(shared=None, _parse_timeframe_to_timedelta=lambda tf: timedelta(hours=1))
+
+    planner = AdaptiveScanPlanner(lambda s: None, budget_per_minute=3, tick_seconds=60, min_interval=60,
+                                  max_interval=1800, fallback_fn=shared_windows(market, "1h", store))
+    planner.plan(["COLD", "HOT", "NEW"])
+    plan = {r["symbol"]: r for r in planner.get_last_plan()}
+    assert plan["HOT"]["measured"] and plan["COLD"]["measured"] and not plan["NEW"]["measured"]
+    assert plan["HOT"]["score"] > plan["COLD"]["score"]
+
+
+def test_tracer_attributes_nested_spans_and_exports_prometheus():
+    tr = Tracer(enabled=True, max_symbols=1)
+    with tr.span("scan.symbol", "BTCUSDT"):
+        with tr.span("http.public"):
+            pass
+    with tr.span("scan.symbol", "ETHUSDT"):
+        pass
+    try:
+        with tr.span("order.spot"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    stages = {r["stage"]: r for r in tr.stage_stats()}
+    assert stages["scan.symbol"]["count"] == 2 and stages["order.spot"]["errors"] == 1
+    series = {(r["stage"], r["symbol"]) for r in tr.symbol_stats()}
+    # Nested span inherits the symbol; the second symbol exceeds the cap
+    assert ("http.public", "BTCUSDT") in series and ("scan.symbol", "_other") in series
+
+    text = tr.render_prometheus()
+    assert 'trader_stage_seconds_count{stage="scan.symbol"} 2' in text
+    assert 'trader_stage_seconds_bucket{stage="http.public",le="+Inf"} 1' in text
+    assert 'trader_stage_errors_total{stage="order.spot"} 1' in text
+    assert Tracer(enabled=False).span("x") is _NOOP
+
+
+def _busy(n=20000):
+    return sum(i * i for i in range(n))
+
+
+def test_job_profiler_profiles_armed_runs_only(tmp_path):
+    prof = JobProfiler(out_dir=str(tmp_path))
+    with prof.profile("scan_job"):
+        _busy()
+    assert not list(tmp_path.iterdir())
+
+    prof.arm(["scan_job"], runs=1, tracemalloc_enabled=True)
+    with prof.profile("monitor_job"):
+        _busy()
+    with prof.profile("scan_job"):
+        _busy()
+    with prof.profile("scan_job"):
+        _busy()
+    status = prof.status()
+    assert status["remaining"] == {} and len(status["artifacts"]) == 1
+    summary = (tmp_path / os.path.basename(status["artifacts"][0]["files"][-1])).read_text()
+    assert "_busy" in summary and "Top allocation sites" in summary
+    assert {p.suffix for p in tmp_path.iterdir()} == {".prof", ".tracemalloc", ".txt"}
+
+    prof.arm(["monitor_job"], runs=1, mode="sample")
+    with prof.profile("monitor_job"):
+        t_end = time.time() + 0.1
+        while time.time() < t_end:
+            _busy(2000)
+    art = prof.status()["artifacts"][-1]
+    assert any(f.endswith(".folded") for f in art["files"])
+    assert "_busy" in open(art["files"][0]).read()
+
+
+def test_event_ring_is_bounded_and_alert_writer_batches(tmp_path):
+    ring = EventRing(3)
+    for i in range(5):
+        ring.append(i)
+    assert ring.recent(10) == [2, 3, 4] and ring.recent(2) == [3, 4]
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'alerts.db'}")
+    Base.metadata.create_all(engine)
+    writer = AlertWriter(engine, interval=60.0, batch_size=1000, max_queue=5)
+    writer.start()
+    try:
+        accepted = [writer.submit("INFO", f"event {i}", {"i": i}) for i in range(7)]
+        # A full queue drops instead of blocking the caller
+        assert accepted == [True] * 5 + [False] * 2 and writer.stats()["dropped"] == 2
+        assert writer.flush() == 5
+    finally:
+        writer.stop()
+    with engine.connect() as conn:
+        rows = conn.execute(Alert.__table__.select().order_by(Alert.id)).mappings().all()
+    assert [r["message"] for r in rows] == [f"event {i}" for i in range(5)] and rows[4]["context"] == {"i": 4}
+
+
+class _SlowSpot:
+    def place_market_order(self, symbol, side, qty, client_id):
+        if symbol == "BAD":
+            raise RuntimeError("rejected")
+        if symbol == "DROP":
+            raise httpx.ReadError("connection reset after sending")
+        time.sleep(1.5 if symbol == "HANG" else 0.2)
+        return {"order_id": f"x-{symbol}", "status": "filled", "avg_price": 10.0}
+
+
+class _Portfolio:
+    _confidence_threshold = 0.5
+    config = {"max_positions": 10}
+
+    def __init__(self):
+        self.events = []
+
+    def get_equity(self):
+        return 10000.0
+
+    def adjust_balance(self, market, delta):
+        pass
+
+    def log_event(self, level, message, context=None):
+        self.events.append((level, message))
+
+
+class _Index:
+    def __init__(self, records):
+        self._records = records
+
+    def records(self):
+        return self._records
+
+
+def test_orders_submit_concurrently_and_persist_in_one_batch(tmp_path, monkeypatch):
+    from services import execution
+    db = create_engine(f"sqlite:///{tmp_path / 'orders.db'}")
+    Base.metadata.create_all(db)
+    monkeypatch.setattr(execution.settings, "MODE", "live")
+    monkeypatch.setattr(execution.settings, "ORDER_SUBMIT_TIMEOUT_SECONDS", 0.8)
+
+    svc = ExecutionService.__new__(ExecutionService)
+    svc.portfolio, svc.spot, svc.store = _Portfolio(), _SlowSpot(), OrderStore(db)
+    svc.constraints = ExchangeConstraints(index_fn=lambda: _Index([]), engine=db)
+    svc.monitor = SimpleNamespace(_kill=False, config={"per_asset_cap_pct": 20.0, "max_daily_loss_pct": 10.0})
+    svc.gate = RiskGate(portfolio=svc.portfolio, engine=db)
+    svc.allocator = Allocator(correlation=CorrelationTracker())
+    svc.flattener = KillSwitchExecutor(spot=svc.spot, futures=object(), store=svc.store, engine=db, portfolio=svc.portfolio,
+                                       gate=svc.gate)
+    svc._pool = execution.ThreadPoolExecutor(max_workers=8)
+    symbols = ["AAA", "BBB", "CCC", "DDD", "BAD", "HANG", "DROP"]
+    signals = [SignalOut(symbol=s, timeframe="1h", ts=datetime.now(timezone.utc), confidence=0.9, expected_return_pct=2.0,
+                         entry=10.0, tp=11.0, sl=9.5) for s in symbols]
+
+    t0 = time.perf_counter()
+    out = svc.allocate_and_execute(signals)
+    elapsed = time.perf_counter() - t0
+    assert out == {"orders_placed": 4, "skipped": 0, "denied": 0, "rejected": 0, "errors": 1, "unknown": 2}
+    # Four 0.2s orders in parallel, bounded by the timeout of the hung one rather than their sum
+    assert elapsed < 1.2
+    with db.connect() as conn:
+        statuses = dict(conn.execute(select(Order.symbol, Order.status)).all())
+        positions = conn.execute(select(func.count()).select_from(Position)).scalar()
+    # A transport failure may have reached the exchange: recorded as unknown for reconciliation, like the timeout
+    assert statuses == {"AAA": "filled", "BBB": "filled", "CCC": "filled", "DDD": "filled", "HANG": "unknown", "DROP": "unknown"}
+    assert positions == 4
+    svc._pool.shutdown(wait=True)
+    # Unknown orders hold their exposure until reconciled; the rejected one's reservation was given back
+    exposure = svc.gate.snapshot()
+    assert set(exposure["notional"]) == {"AAA", "BBB", "CCC", "DDD", "HANG", "DROP"} and exposure["reserved"] == {}
+    svc.gate.rebuild()
+    assert svc.gate.snapshot()["notional"] == exposure["notional"]
+
+    with db.connect() as conn:
+        hang_id = conn.execute(select(Order.id).where(Order.symbol == "HANG")).scalar()
+    assert svc.store.update_orders([{"id": hang_id, "status": "canceled"}]) == 1
+    svc.gate.rebuild()
+    assert "HANG" not in svc.gate.snapshot()["notional"]
+    assert svc.store.close_open_positions(symbols=["AAA"]) == 1
+    closed = svc.close_all_positions()
+    assert closed["closed"] == 3 and closed["failed"] == 0 and closed["time_to_flat_ms"] < 1000
+    with db.connect() as conn:
+        assert conn.execute(select(Order.status).where(Order.id == hang_id)).scalar() == "canceled"
+        assert conn.execute(select(func.count()).select_from(Position).where(Position.status == "open")).scalar() == 0
+
+
+class _StatusSpot:
+    def __init__(self):
+        self.calls = []
+
+    def get_orders_status(self, ids=None, client_ids=None):
+        self.calls.append(ids or client_ids)
+        rows = {"1": {"id": "1", "status": "filled", "total_quantity": 2, "remaining_quantity": 0, "avg_price": 10.5},
+                "cli-e": {"id": "5", "client_order_id": "cli-e", "status": "filled", "total_quantity": 1,
+                          "remaining_quantity": 0, "avg_price": 20.0},
+                "cli-i-close": {"id": "8", "client_order_id": "cli-i-close", "status": "filled", "total_quantity": 1,
+                                "remaining_quantity": 0, "avg_price": 12.0}}
+        return [rows[k] for k in (ids or client_ids) if k in rows]
+
+
+class _StatusFutures:
+    def __init__(self):
+        self.calls = 0
+
+    def list_orders(self, page=1, size=100):
+        self.calls += 1
+        return [{"id": "2", "status": "partially_filled", "total_quantity": 4, "remaining_quantity": 1, "avg_price": 30.0},
+                {"id": "3", "status": "cancelled", "total_quantity": 4, "remaining_quantity": 0, "cancelled_quantity": 4},
+                {"id": "4", "status": "cancelled", "total_quantity": 4, "remaining_quantity": 0, "cancelled_quantity": 3,
+                 "avg_price": 40.0},
+                {"id": "6", "status": "filled", "total_quantity": 2, "remaining_quantity": 0, "avg_price": 50.0}]
+
+
+def test_reconciler_applies_fills_partials_and_cancels_in_bulk(tmp_path):
+    db = create_engine(f"sqlite:///{tmp_path / 'recon.db'}")
+    Base.metadata.create_all(db)
+    store = OrderStore(db)
+    old = datetime.now(timezone.utc) - timedelta(hours=1)
+    orders = [("A", "spot", 2.0, "1", "cli-a", "new"), ("B", "futures", 4.0, "2", "cli-b", "new"),
+              ("C", "futures", 4.0, "3", "cli-c", "new"), ("D", "futures", 4.0, "4", "cli-d", "new"),
+              ("E", "spot", 1.0, None, "cli-e", "unknown"), ("F", "spot", 1.0, None, "cli-f", "unknown"),
+              ("G", "spot", 1.0, "SIM-cli-g", "cli-g", "new"), ("H", "futures", 2.0, "7", "cli-h", "filled"),
+              ("I", "spot", 1.0, "9", "cli-i", "filled")]
+    store.record_batch(
+        [dict(symbol=s, market=m, side="BUY", type="market", qty=q, price=10.0, status=st, exchange_order_id=x,
+              tp_price=11.0, sl_price=9.0, client_id=c, ts_created=old) for s, m, q, x, c, st in orders],
+        [dict(symbol=s, market=m, side="BUY", entry_price=10.0, qty=q, leverage=1, sl=9.0, tp=11.0, status="open")
+         for s, m, q, x, c, st in orders if st != "unknown"])
+    # A reduce-only close of H's position, same size: its fill must not rewrite H's entry
+    store.record_batch([dict(symbol="H", market="futures", side="SELL", type="market", qty=2.0, price=10.0, status="new",
+                             exchange_order_id="6", client_id="cli-h-close", reduce_only=True, ts_created=old)], [])
+    # A kill-switch close of I that timed out: once the exchange shows it filled, I's position is closed
+    store.record_batch([dict(symbol="I", market="spot", side="SELL", type="market", qty=1.0, price=10.0, status="unknown",
+                             exchange_order_id=None, client_id="cli-i-close", reduce_only=True, ts_created=old)], [])
+    spot, fut = _StatusSpot(), _StatusFutures()
+    rec = OrderReconciler(spot=spot, futures=fut, store=store, engine=db)
+
+    report = rec.reconcile()
+    # One bulk call per id kind for spot, one page for futures; simulated orders are never polled
+    assert len(spot.calls) == 2 and fut.calls == 1
+    assert report["filled"] == 4 and report["canceled"] == 2 and report["partial"] == 1
+    with db.connect() as conn:
+        status = dict(conn.execute(select(Order.symbol, Order.status).where(Order.reduce_only.is_(False))).all())
+        close_status = conn.execute(select(Order.status).where(Order.client_id == "cli-h-close")).scalar()
+        pos = {r.symbol: r for r in conn.execute(select(Position)).all()}
+    assert status == {"A": "filled", "B": "partial", "C": "canceled", "D": "canceled", "E": "filled",
+                      "F": "rejected", "G": "new", "H": "filled", "I": "filled"}
+    assert close_status == "filled" and (pos["H"].entry_price, pos["H"].status) == (10.0, "open")
+    assert (pos["I"].entry_price, pos["I"].status) == (10.0, "closed")
+    assert pos["A"].entry_price == 10.5 and pos["B"].qty == 4.0
+    assert pos["C"].status == "closed" and (pos["D"].qty, pos["D"].status) == (1.0, "open")
+    assert pos["E"].entry_price == 20.0 and "F" not in pos
+
+    # Only B is still open: the next poll waits longer than with a busy book
+    assert rec.reconcile()["open"] == 1 and rec.reconcile()["updated"] == 0
+    assert rec.interval_for(1) > rec.interval_for(10) > rec.interval_for(100) == rec.interval_for(1000)
+
+
+class _FlattenFutures:
+    def __init__(self):
+        self.canceled, self.closed, self.sent = [], [], []
+        self.stuck = {"STUCK"}  # hangs on the first attempt only
+
+    def cancel_order(self, order_id):
+        time.sleep(0.1)
+        self.canceled.append(order_id)
+        return {"status": "canceled", "order_id": order_id}
+
+    def close_position(self, symbol, side, qty, client_id):
+        self.sent.append(symbol)
+        stuck = symbol in self.stuck
+        self.stuck.discard(symbol)
+        time.sleep(2.0 if stuck else 0.1)
+        self.closed.append((symbol, side, qty))
+        return {"status": "new", "order_id": f"c-{symbol}"}
+
+
+def test_kill_switch_flattens_concurrently_and_blocks_execution(tmp_path, monkeypatch):
+    from services import kill_switch, monitor
+    db = create_engine(f"sqlite:///{tmp_path / 'ks.db'}")
+    Base.metadata.create_all(db)
+    store = OrderStore(db)
+    monkeypatch.setattr(kill_switch.settings, "MODE", "live")
+    monkeypatch.setattr(kill_switch.settings, "KILL_SWITCH_TIMEOUT_SECONDS", 0.6)
+    syms = ["P1", "P2", "P3", "P4", "STUCK"]
+    store.record_batch(
+        [dict(symbol=f"O{i}", market="futures", side="BUY", type="limit", qty=1.0, price=1.0, status="new",
+              exchange_order_id=f"x{i}", tp_price=None, sl_price=None, client_id=f"c{i}") for i in range(4)],
+        [dict(symbol=s, market="futures", side="BUY", entry_price=1.0, qty=2.0, leverage=3, sl=None, tp=None, status="open")
+         for s in syms])
+    fut = _FlattenFutures()
+    ks = KillSwitchExecutor(spot=object(), futures=fut, store=store, engine=db, portfolio=_Portfolio(),
+                            gate=RiskGate(portfolio=_Portfolio(), engine=db))
+
+    t0 = time.perf_counter()
+    report = ks.flatten()
+    # Nine 0.1s requests in parallel; the stuck close is abandoned at the timeout
+    assert time.perf_counter() - t0 < 1.0
+    assert report["orders_canceled"] == 4 and report["positions_closed"] == 4
+    assert [f["symbol"] for f in report["failed"]] == ["STUCK"] and report["failed"][0]["error"] == "timeout"
+    assert all(p["time_to_flat_ms"] < 500 for p in report["positions"])
+    assert ("P1", "sell", 2.0) in fut.closed
+    with db.connect() as conn:
+        open_pos = conn.execute(select(Position.symbol).where(Position.status == "open")).scalars().all()
+        reduce_only = dict(conn.execute(select(Order.symbol, Order.status).where(Order.reduce_only.is_(True))).all())
+        stuck_client = conn.execute(select(Order.client_id).where(Order.symbol == "STUCK")).scalar()
+        canceled = conn.execute(select(func.count()).select_from(Order).where(Order.status == "canceled")).scalar()
+    # The timed-out close may still reach the exchange: it is on record for the reconciler under its client id
+    assert open_pos == ["STUCK"] and canceled == 4
+    assert reduce_only == {"P1": "new", "P2": "new", "P3": "new", "P4": "new", "STUCK": "unknown"}
+    assert stuck_client == report["failed"][0]["client_id"]
+
+    # Engaging the kill switch again while it is on retries what is still open, but never re-sends a close that
+    # may still fill: STUCK waits for reconciliation
+    mon = monitor.MonitorService.__new__(monitor.MonitorService)
+    mon._kill, mon.portfolio = True, _Portfolio()
+    monkeypatch.setattr(monitor.KillSwitchExecutor, "instance", classmethod(lambda cls: ks))
+    mon.set_kill_switch(True)
+    assert mon.last_flatten["positions_closed"] == 0 and fut.sent.count("STUCK") == 1
+    assert [(f["kind"], f["client_id"]) for f in mon.last_flatten["failed"]] == [("close_pending", stuck_client)]
+    # Reconciliation found it never arrived: the next retry sends a new close
+    with db.connect() as conn:
+        stuck_order = conn.execute(select(Order.id).where(Order.client_id == stuck_client)).scalar()
+    store.update_orders([{"id": stuck_order, "status": "rejected"}])
+    mon.set_kill_switch(True)
+    assert mon.last_flatten["positions_closed"] == 1 and mon.last_flatten["failed"] == []
+    assert fut.sent.count("STUCK") == 2
+    with db.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Position).where(Position.status == "open")).scalar() == 0
+
+    svc = ExecutionService.__new__(ExecutionService)
+    svc.monitor = SimpleNamespace(_kill=True)
+    sig = SignalOut(symbol="P9", timeframe="1h", ts=datetime.now(timezone.utc), confidence=0.9, expected_return_pct=2.0,
+                    entry=1.0, tp=1.1, sl=0.9)
+    assert svc.allocate_and_execute([sig])["blocked"] == "kill_switch"
+
+
+def test_risk_gate_counters_and_decisions(tmp_path):
+    db = create_engine(f"sqlite:///{tmp_path / 'gate.db'}")
+    Base.metadata.create_all(db)
+    OrderStore(db).record_batch([], [
+        dict(symbol="BTCUSDT", market="futures", side="BUY", entry_price=100.0, qty=10.0, leverage=5, sl=None, tp=None,
+             status="open", unrealized_pnl=-50.0),
+        dict(symbol="ETHUSDT", market="spot", side="BUY", entry_price=10.0, qty=100.0, leverage=1, sl=None, tp=None,
+             status="open", unrealized_pnl=0.0),
+    ])
+    gate = RiskGate(portfolio=_Portfolio(), engine=db)
+    limits = {"per_asset_cap_pct": 20.0, "max_daily_loss_pct": 10.0}
+    gate.rebuild()
+    snap = gate.snapshot()
+    assert snap["notional"] == {"BTCUSDT": 1000.0, "ETHUSDT": 1000.0} and snap["margin"] == {"futures": 200.0, "spot": 1000.0}
+    # The day starts from the carried-in unrealized PnL
+    assert snap["daily_pnl"] == 0.0
+
+    # Asset cap 2000: BTC has 1000 of headroom; a second ETH order in the batch only gets what the first left
+    d = gate.check_batch([RiskOrder("BTCUSDT", "futures", 1500.0, 5), RiskOrder("SOLUSDT", "spot", 500.0),
+                          RiskOrder("ETHUSDT", "spot", 600.0), RiskOrder("ETHUSDT", "spot", 600.0),
+                          RiskOrder("ETHUSDT", "spot", 600.0)], limits)
+    assert [x.action for x in d] == ["resize", "allow", "allow", "resize", "deny"]
+    assert d[0].notional == 1000.0 and d[3].notional == 400.0
+    # What was allowed stays reserved: a concurrent batch cannot use BTC's headroom again until it is released
+    assert gate.check_batch([RiskOrder("BTCUSDT", "futures", 500.0, 5)], limits)[0].action == "deny"
+    gate.release("BTCUSDT", "futures", 1000.0, 5)
+    assert gate.check_batch([RiskOrder("BTCUSDT", "futures", 500.0, 5)], limits)[0].action == "allow"
+    # A fill converts its reservation: SOL's 500 becomes 500 filled, not 1000
+    gate.on_fill("SOLUSDT", "spot", 500.0, reserved=500.0)
+    assert gate.snapshot()["notional"]["SOLUSDT"] == 500.0 and "SOLUSDT" not in gate.snapshot()["reserved"]
+    assert gate.check_batch([RiskOrder("SOLUSDT", "spot", 100.0)], limits, halted=True)[0].reason == "kill switch on"
+
+    gate.on_fill("SOLUSDT", "spot", 1500.0)
+    assert gate.check_batch([RiskOrder("SOLUSDT", "spot", 100.0)], limits)[0].action == "deny"
+    gate.on_close(1, "BTCUSDT", "futures", 1000.0, 5, realized_pnl=-400.0)
+    gate.on_mark(2, -700.0)
+    # Realized -400 plus 50 recovered from the closed position's carried loss and -700 marked: below -1000
+    assert gate.daily_pnl() == -1050.0
+    d = gate.check_batch([RiskOrder("XRPUSDT", "spot", 10.0)], limits)
+    assert d[0].action == "deny" and "daily loss" in d[0].reason
+
+
+def test_correlation_tracker_incremental_and_gate_cap(tmp_path):
+    rng = np.random.default_rng(7)
+    n = 301
+    ts = np.arange(n, dtype=np.int64) * 3_600_000
+    base = rng.normal(0, 0.01, n - 1)
+    rets = {"AAA": base, "BBB": base + rng.normal(0, 0.002, n - 1), "CCC": rng.normal(0, 0.01, n - 1)}
+    closes = {s: 100.0 * np.exp(np.concatenate(([0.0], np.cumsum(r)))) for s, r in rets.items()}
+
+    tracker = CorrelationTracker(halflife_bars=1000, min_obs=20, max_symbols=8)
+    for s in ("AAA", "CCC"):
+        # History is seeded up to CORRELATION_WARMUP_BARS (200) back
+        assert tracker.observe(s, ts[:-1], closes[s][:-1]) == 200
+    assert tracker.commit() == 200
+    # BBB joins after those bars were committed: it is replayed against the kept history instead of starting cold
+    assert tracker.observe("BBB", ts[:-1], closes["BBB"][:-1]) == 200 and tracker.commit() == 0
+    # With a long half-life the EW estimate is close to the plain sample correlation
+    assert abs(tracker.correlation("AAA", "BBB") - np.corrcoef(rets["AAA"][-201:-1], rets["BBB"][-201:-1])[0, 1]) < 0.02
+    assert abs(tracker.correlation("AAA", "CCC")) < 0.2 and abs(tracker.correlation("BBB", "CCC")) < 0.2
+    # The next bar only adds one return per symbol; re-observing the old window adds nothing
+    assert tracker.observe("AAA", ts, closes["AAA"]) == 1 and tracker.observe("AAA", ts, closes["AAA"]) == 0
+    tracker.commit()
+    assert tracker.max_correlation("BBB", ["AAA", "CCC", "BBB"])[0] == "AAA"
+    assert tracker.correlation("AAA", "ZZZ") is None
+
+    db = create_engine(f"sqlite:///{tmp_path / 'corr.db'}")
+    Base.metadata.create_all(db)
+    OrderStore(db).record_batch([], [dict(symbol="AAA", market="spot", side="BUY", entry_price=10.0, qty=10.0, leverage=1,
+                                          sl=None, tp=None, status="open")])
+    gate = RiskGate(portfolio=_Portfolio(), engine=db, correlation=tracker)
+    limits = {"per_asset_cap_pct": 20.0, "max_daily_loss_pct": 10.0, "correlation_cap": 0.8}
+    d = gate.check_batch([RiskOrder("BBB", "spot", 100.0), RiskOrder("CCC", "spot", 100.0)], limits)
+    assert d[0].action == "deny" and "AAA" in d[0].reason and d[1].action == "allow"
+    assert gate.check_batch([RiskOrder("BBB", "spot", 100.0)], dict(limits, correlation_cap=1.0))[0].action == "allow"
+
+
+def test_correlation_tracker_reads_candle_store_when_scans_run_elsewhere(tmp_path):
+    db = create_engine(f"sqlite:///{tmp_path / 'corr_store.db'}")
+    Base.metadata.create_all(db)
+    store = CandleStore(db)
+    rng = np.random.default_rng(11)
+    # 60 closed 1h bars written by scan workers in another process, plus the forming one
+    now = pd.Timestamp("2024-05-03 12:30", tz="UTC")
+    ts = pd.date_range(end=pd.Timestamp("2024-05-03 12:00", tz="UTC"), periods=61, freq="1h")
+    base = rng.normal(0, 0.01, 61)
+    for s, r in (("AAA", base), ("BBB", base + rng.normal(0, 0.002, 61)), ("LOCAL", rng.normal(0, 0.01, 61))):
+        close = 100.0 * np.exp(np.cumsum(r))
+        store.upsert(s, "1h", pd.DataFrame({"ts": ts, "open": close, "high": close, "low": close, "close": close, "volume": 1.0}))
+
+    tracker = CorrelationTracker(halflife_bars=1000, min_obs=20, max_symbols=8, store=store, step=timedelta(hours=1))
+    # LOCAL is scanned in this process; the store path leaves it to the scans
+    tracker.observe("LOCAL", np.zeros(1, dtype=np.int64), np.ones(1))
+    # The forming bar is skipped and the newest closed bar waits for the next refresh: 58 returns folded
+    assert tracker.refresh(now=now.timestamp()) == 58
+    assert tracker.correlation("AAA", "BBB") > 0.9 and tracker.correlation("AAA", "LOCAL") is None
+    assert tracker.refresh(now=now.timestamp() + 1) == 0
+    assert tracker.refresh(now=now.timestamp() + 3600) == 1
+
+
+def test_allocator_spreads_risk_and_respects_caps():
+    rng = np.random.default_rng(3)
+    common = rng.normal(0, 0.02, (500, 1))
+    # Three alts moving together, one independent low-volatility asset
+    returns = np.hstack([common + rng.normal(0, 0.005, (500, 3)), rng.normal(0, 0.005, (500, 1))])
+    cov, delta = ledoit_wolf(returns)
+    assert 0.0 <= delta <= 1.0 and np.allclose(cov, cov.T)
+
+    cands = [Candidate(s, "spot", 1.0, 0.02) for s in ("ALT1", "ALT2", "ALT3", "CALM")] + [Candidate("PERP", "futures", 1.0, 0.02)]
+    full_cov = np.zeros((5, 5))
+    full_cov[:4, :4] = cov
+    full_cov[4, 4] = 1e-4
+    alloc = Allocator(correlation=CorrelationTracker())
+    budgets = {"spot": 6000.0, "futures": 4000.0}
+
+    rp = alloc.allocate(cands, budgets, asset_cap=10000.0, cov=full_cov, method="risk_parity")
+    assert abs(rp[:4].sum() - 6000.0) < 1e-6 and abs(rp[4] - 4000.0) < 1e-6
+    # Equal risk budgets: the calm, uncorrelated asset takes far more capital than any correlated alt
+    assert rp[3] > 2 * rp[:3].max()
+    contrib = rp[:4] * (cov @ rp[:4])
+    assert np.allclose(contrib / contrib.sum(), 0.25, atol=1e-4)
+
+    capped = alloc.allocate(cands, budgets, asset_cap=2000.0, cov=full_cov, method="risk_parity")
+    assert capped.max() <= 2000.0 + 1e-6 and abs(capped[:4].sum() - 6000.0) < 1e-6 and abs(capped[4] - 2000.0) < 1e-6
+
+    mv = alloc.allocate(cands, budgets, asset_cap=3000.0, cov=full_cov, method="mean_variance")
+    assert mv.max() <= 3000.0 + 1e-6 and abs(mv[:4].sum() - 6000.0) < 1e-6 and mv[3] == mv[:4].max()
+    # The original weighting ignores covariance: equal scores, equal amounts
+    assert np.allclose(alloc.allocate(cands, budgets, asset_cap=10000.0, method="score")[:4], 1500.0)
+
+    big = [Candidate(f"S{i}", "spot", float(rng.uniform(0.1, 1.0)), 0.02) for i in range(100)]
+    big_returns = common + rng.normal(0, 0.01, (500, 100))
+    t0 = time.perf_counter()
+    amounts = alloc.allocate(big, {"spot": 6000.0}, asset_cap=200.0, cov=ledoit_wolf(big_returns)[0], method="risk_parity")
+    assert time.perf_counter() - t0 < 0.25
+    assert abs(amounts.sum() - 6000.0) < 1e-6 and amounts.max() <= 200.0 + 1e-6
+
+
+def test_volatility_breaker_trips_on_atr_multiple_and_pauses_entries(tmp_path):
+    from services import circuit_breaker
+    db = create_engine(f"sqlite:///{tmp_path / 'vol.db'}")
+    Base.metadata.create_all(db)
+    windows = RingBufferRegistry(capacity=64)
+    calm, wild = windows.get_or_create("CALM", "1h"), windows.get_or_create("WILD", "1h")
+    for i in range(30):
+        # True range of 1.0 per bar; the last bar is the forming one
+        calm.append(i * 3_600_000, 100.0, 100.5, 99.5, 100.0, 1.0)
+        wild.append(i * 3_600_000, 50.0, 50.5, 49.5, 50.0, 1.0)
+    breaker = VolatilityBreaker(windows=windows, timeframe="1h", period=14, store=CandleStore(db), step=timedelta(hours=1))
+    t = 29.5 * 3600
+    assert breaker.refresh(now=t) == 2 and breaker.refresh(now=t) == 0
+    assert breaker.atr("CALM") == 1.0
+
+    now = 1_000_000.0
+    assert breaker.evaluate({"CALM": 101.5, "WILD": 53.5, "OTHER": 1.0}, mult=3.0, now=now) == ["WILD"]
+    assert breaker.is_tripped("WILD", now=now + 1) and not breaker.is_tripped("CALM", now=now + 1)
+    # Still spiking: the cooldown restarts but the symbol is not reported again
+    assert breaker.evaluate({"WILD": 54.0}, mult=3.0, now=now + 10) == []
+    assert not breaker.is_tripped("WILD", now=now + 10 + circuit_breaker.settings.VOL_BREAKER_COOLDOWN_SECONDS)
+
+    # A wide closed bar trips the symbol even when price is back at the close
+    calm.append(30 * 3_600_000, 100.0, 104.0, 99.0, 100.0, 1.0)
+    calm.append(31 * 3_600_000, 100.0, 100.0, 100.0, 100.0, 1.0)
+    assert breaker.refresh(now=t + 2 * 3600) == 1
+    assert breaker.evaluate({"CALM": 100.0}, mult=3.0) == ["CALM"]
+
+    gate = RiskGate(portfolio=_Portfolio(), engine=db, correlation=CorrelationTracker(), breaker=breaker)
+    d = gate.check_batch([RiskOrder("CALM", "spot", 100.0), RiskOrder("OTHER", "spot", 100.0)],
+                         {"per_asset_cap_pct": 20.0, "max_daily_loss_pct": 10.0})
+    assert [x.action for x in d] == ["deny", "allow"] and d[0].reason == "volatility breaker tripped"
+
+
+def test_volatility_breaker_reads_candle_store_without_local_windows(tmp_path):
+    db = create_engine(f"sqlite:///{tmp_path / 'vol_store.db'}")
+    Base.metadata.create_all(db)
+    store = CandleStore(db)
+    # Bars fetched by a scan worker in another process: 20 closed 1h bars with a true range of 2.0, plus the forming one
+    now = pd.Timestamp("2024-05-01 12:30", tz="UTC")
+    ts = pd.date_range(end=pd.Timestamp("2024-05-01 12:00", tz="UTC"), periods=21, freq="1h")
+    store.upsert("REMOTE", "1h", pd.DataFrame({"ts": ts, "open": 10.0, "high": 11.0, "low": 9.0, "close": 10.0, "volume": 1.0}))
+    store.upsert("REMOTE", "4h", pd.DataFrame({"ts": ts[-2:], "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1.0}))
+
+    # This process fetched REMOTE once long ago; its stale window must not shadow the store
+    windows = RingBufferRegistry(capacity=8)
+    stale = windows.get_or_create("REMOTE", "1h")
+    for i in range(5):
+        stale.append(i * 3_600_000, 10.0, 10.0, 10.0, 10.0, 1.0)
+    breaker = VolatilityBreaker(windows=windows, timeframe="1h", period=14, store=store, step=timedelta(hours=1))
+    assert breaker.refresh(now=now.timestamp()) == 1 and breaker.atr("REMOTE") == 2.0
+    # The store is read at most every VOL_BREAKER_STORE_REFRESH_SECONDS
+    assert breaker.refresh(now=now.timestamp() + 1) == 0
+    assert breaker.evaluate({"REMOTE": 17.0}, mult=3.0, now=now.timestamp()) == ["REMOTE"]
+
+
+def test_order_failures_classified_unknown_only_when_ambiguous():
+    from adapters.http_pool import outcome_unknown
+    req = httpx.Request("POST", "https://api.example/orders")
+    assert outcome_unknown(httpx.ReadTimeout("slow", request=req))
+    assert outcome_unknown(httpx.RemoteProtocolError("dropped", request=req))
+    assert outcome_unknown(httpx.HTTPStatusError("bad gateway", request=req, response=httpx.Response(502, request=req)))
+    assert not outcome_unknown(httpx.HTTPStatusError("rejected", request=req, response=httpx.Response(400, request=req)))
+    assert not outcome_unknown(httpx.ConnectError("refused", request=req))
+    assert not outcome_unknown(ValueError("bad qty"))
+
+
+def test_constraints_round_spot_only_and_fail_closed_in_live(monkeypatch):
+    from services import execution
+
+    class _Constraints:
+        def __init__(self):
+            self.calls = []
+
+        def check(self, symbols, qty, price):
+            self.calls.append(list(symbols))
+            return SimpleNamespace(qty=np.floor(np.asarray(qty)), price=np.asarray(price), ok=np.ones(len(qty), dtype=bool),
+                                   reasons=[None] * len(qty))
+
+    svc = ExecutionService.__new__(ExecutionService)
+    svc.portfolio, svc.constraints = _Portfolio(), _Constraints()
+    ts = datetime.now(timezone.utc)
+    spot = execution.OrderTicket(SignalOut(symbol="AAA", timeframe="1h", ts=ts, confidence=0.9, expected_return_pct=2.0,
+                                           entry=10.0, tp=11.0, sl=9.5), 2.7)
+    fut = execution.OrderTicket(SignalOut(symbol="B-BBB_USDT", market="futures", timeframe="1h", ts=ts, confidence=0.9,
+                                          expected_return_pct=2.0, entry=10.0, tp=11.0, sl=9.5), 0.35, 5)
+    kept, rejected = svc._apply_constraints([spot, fut])
+    # Spot lot rules never touch the levered futures quantity
+    assert rejected == 0 and svc.constraints.calls == [["AAA"]]
+    assert spot.order_qty == 2.0 and fut.order_qty == 1.75
+
+    def _down(*a):
+        raise RuntimeError("index down")
+    svc.constraints.check = _down
+    monkeypatch.setattr(execution.settings, "MODE", "live")
+    # Live fails closed for the spot orders only; the futures order in the mixed batch is still sent
+    spot2 = execution.OrderTicket(SignalOut(symbol="CCC", timeframe="1h", ts=ts, confidence=0.9, expected_return_pct=2.0,
+                                            entry=10.0, tp=11.0, sl=9.5), 1.0)
+    assert svc._apply_constraints([spot, fut, spot2]) == ([fut], 2)
+    assert svc._apply_constraints([spot]) == ([], 1)
+    monkeypatch.setattr(execution.settings, "MODE", "paper")
+    assert svc._apply_constraints([spot, fut]) == ([spot, fut], 0)
+
+
+class _RollingMarket:
+    """1h candles whose feed rolls to the new bar only from the second fetch on."""
+
+    def __init__(self, now):
+        self.now, self.fetches = now, 0
+
+    def _parse_timeframe_to_timedelta(self, tf):
+        return timedelta(hours=1)
+
+    def get_candles_df(self, symbol, timeframe, limit=400):
+        self.fetches += 1
+        end = self.now.floor("1h") - pd.Timedelta(hours=0 if self.fetches > 1 else 1)
+        ts = pd.date_range(end=end, periods=30, freq="1h")
+        close = np.arange(30, dtype=float) + 100.0
+        return pd.DataFrame({"ts": ts, "open": close, "high": close + 1, "low": close - 1, "close": close, "volume": 1.0})
+
+
+def test_bar_close_scan_scores_closed_bar_and_waits_for_the_roll(monkeypatch):
+    from services import signals
+    svc = signals.SignalService.__new__(signals.SignalService)
+    svc.market = _RollingMarket(pd.Timestamp.now(tz="UTC"))
+    svc.params = {"rr_target": 2.0}
+    svc.correlation = CorrelationTracker()
+    svc._last_scanned_bar, svc._logs = {}, EventRing(10)
+    svc.compute_features = lambda df, copy=False: df.assign(ema_fast=df["close"], ema_slow=df["close"] - 1, rsi=55.0,
+                                                             macd=0.1, macd_signal=0.0, atr=1.0)
+    monkeypatch.setattr(signals.settings, "SCAN_SETTLE_SECONDS", 0)
+    monkeypatch.setattr(signals.settings, "SCAN_SETTLE_RETRY_SECONDS", 5)
+
+    out = svc.scan_and_score(["AAA"], "1h", skip_unchanged=True)
+    # First fetch had no forming row (feed not rolled): fetched again, then scored on the bar that just closed
+    closed_bar = svc.market.now.floor("1h") - pd.Timedelta(hours=1)
+    assert svc.market.fetches == 2 and len(out) == 1 and pd.Timestamp(out[0].ts) == closed_bar
+    # Same closed bar on the next run: skipped, even though the forming bar keeps changing
+    assert svc.scan_and_score(["AAA"], "1h", skip_unchanged=True) == [] and svc.market.fetches == 3
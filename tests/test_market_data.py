@@ -0,0 +1,257 @@
+#Description: Unit tests for market data helpers (no network).
+
+import asyncio
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from models.db import init_db
+from models.orm import Base
+from services.backfill import find_gaps, plan_pages
+from services.candle_store import CandleStore
+from services.exchange_constraints import ExchangeConstraints
+from services.history_loader import HistoryLoader
+from services.market_index import MarketIndex
+from services.ring_buffer import CandleRingBuffer, RingBufferRegistry
+from services.shm_cache import SharedMarketCache, _SEQ
+from utils.singleflight import SingleFlight
+
+MARKETS = [
+    {"symbol": "BTCUSDT", "pair": "B-BTC_USDT", "target_currency_short_name": "BTC", "base_currency_short_name": "USDT",
+     "base_currency_precision": 2, "target_currency_precision": 5, "step": 0.00001, "min_notional": 5, "max_leverage": 10},
+    {"symbol": "ETHINR", "pair": "I-ETH_INR", "target_currency_short_name": "ETH", "base_currency_short_name": "INR",
+     "base_currency_precision": 0, "target_currency_precision": 4, "min_notional": 100},
+]
+
+
+def test_market_index_spellings_and_persistence(tmp_path):
+    calls = []
+    def fetch():
+        calls.append(1)
+        return MARKETS
+
+    idx = MarketIndex(fetch, cache_path=tmp_path / "idx.json", ttl_seconds=3600)
+    for spelling in ["BTCUSDT", "btc/usdt", "BTC_USDT", "B-BTC_USDT", "BTC-USDT"]:
+        rec = idx.lookup(spelling)
+        assert rec is not None and rec.pair == "B-BTC_USDT"
+    rec = idx.lookup("ETHINR")
+    assert rec.tick_size == 1.0 and rec.lot_size == 0.0001 and rec.min_notional == 100.0
+    assert len(calls) == 1
+
+    # A second index warm-starts from disk without calling the API
+    idx2 = MarketIndex(fetch, cache_path=tmp_path / "idx.json", ttl_seconds=3600)
+    assert idx2.lookup("BTC/USDT").leverage_max == 10
+    assert len(calls) == 1
+
+
+def test_singleflight_coalesces_threads_and_asyncio():
+    sf = SingleFlight()
+    runs = []
+    def slow_fetch():
+        runs.append(1)
+        time.sleep(0.2)
+        return "candles"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sf.do("k", slow_fetch))) for _ in range(4)]
+    for t in threads:
+        t.start()
+
+    async def async_callers():
+        await asyncio.sleep(0.05)
+        return await asyncio.gather(*[sf.do_async("k", slow_fetch) for _ in range(3)])
+
+    async_results = asyncio.run(async_callers())
+    for t in threads:
+        t.join()
+
+    assert results == ["candles"] * 4 and list(async_results) == ["candles"] * 3
+    assert len(runs) == 1
+    stats = sf.stats()
+    assert stats["executions"] == 1 and stats["coalesced"] == 6 and stats["in_flight"] == 0
+
+
+def test_history_loader_tail_read_and_mtime_cache(tmp_path):
+    rows = ["ts,open,high,low,close,volume"] + [
+        f"2024-06-01T{h:02d}:00:00Z,{100+h},{101+h},{99+h},{100.5+h},{10*h}" for h in range(24)
+    ]
+    path = tmp_path / "BTCUSDT_1h.csv"
+    path.write_text("\n".join(rows) + "\n")
+
+    loader = HistoryLoader(tmp_path, float_dtype="float32")
+    df = loader.load("BTCUSDT", "1h", limit=5)
+    assert len(df) == 5 and df["close"].iloc[-1] == np.float32(123.5)
+    assert df["close"].dtype == np.float32 and str(df["ts"].dt.tz) == "UTC"
+    assert loader.load("BTCUSDT", "1h", limit=5) is df  # cached
+
+    path.write_text("\n".join(rows[:11]))  # rewritten file (no trailing newline) invalidates the cache
+    df2 = loader.load("BTCUSDT", "1h", limit=5)
+    assert df2 is not df and df2["open"].tolist() == [105, 106, 107, 108, 109]
+    assert len(loader.load("BTCUSDT", "1h")) == 10
+    assert loader.load("ETHUSDT", "1h") is None
+
+
+def test_candle_store_upsert_and_range_read():
+    engine = create_engine("sqlite://", future=True)
+    Base.metadata.create_all(engine)
+    store = CandleStore(engine=engine)
+    ts = pd.date_range("2024-06-01", periods=6, freq="1h", tz="UTC")
+    df = pd.DataFrame({"ts": ts, "open": np.arange(6.0), "high": np.arange(6.0) + 1,
+                       "low": np.arange(6.0) - 1, "close": np.arange(6.0) + 0.5, "volume": np.full(6, 10.0)})
+
+    assert store.upsert("BTCUSDT", "1h", df) == 6
+    # Re-upserting the forming bar overwrites it instead of duplicating
+    assert store.upsert("BTCUSDT", "1h", df.tail(1).assign(close=99.0)) == 1
+    assert store.count("BTCUSDT", "1h") == 6
+
+    tail = store.read_range("BTCUSDT", "1h", limit=3)
+    assert tail["close"].tolist() == [3.5, 4.5, 99.0] and tail["ts"].dtype == np.dtype("datetime64[ms]")
+    window = store.read_range("BTCUSDT", "1h", start=ts[1], end=ts[3])
+    assert window["open"].tolist() == [1.0, 2.0]
+    assert CandleStore.to_frame(tail)["ts"].iloc[-1] == ts[-1]
+
+
+def test_init_db_adds_candle_index_to_pre_index_tables(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}", future=True)
+    with engine.begin() as conn:
+        # The candles table as created before the unique index existed, with a duplicated bar
+        conn.execute(text("CREATE TABLE candles (id INTEGER PRIMARY KEY, symbol VARCHAR, timeframe VARCHAR, ts_open DATETIME, "
+                          "open FLOAT, high FLOAT, low FLOAT, close FLOAT, volume FLOAT)"))
+        conn.execute(text("INSERT INTO candles (symbol, timeframe, ts_open, open, high, low, close, volume) VALUES "
+                          "('BTCUSDT', '1h', '2024-06-01 00:00:00.000000', 1, 2, 0, 1.0, 1), "
+                          "('BTCUSDT', '1h', '2024-06-01 00:00:00.000000', 1, 2, 0, 1.5, 1), "
+                          "('BTCUSDT', '1h', NULL, 1, 2, 0, 1, 1)"))
+    init_db(engine)
+    init_db(engine)
+    store = CandleStore(engine=engine)
+    df = pd.DataFrame({"ts": pd.to_datetime(["2024-06-01 00:00", "2024-06-01 01:00"], utc=True), "open": [1.0, 2.0],
+                       "high": [2.0, 3.0], "low": [0.0, 1.0], "close": [2.5, 3.5], "volume": [1.0, 1.0]})
+    assert store.upsert("BTCUSDT", "1h", df) == 2
+    assert store.read_range("BTCUSDT", "1h", limit=5)["close"].tolist() == [2.5, 3.5]
+
+
+def test_backfill_gap_detection_and_page_plan():
+    step = timedelta(hours=1)
+    hour = 3_600_000
+    start = 1_717_200_000_000 - 1_717_200_000_000 % hour
+    present = np.array([start + i * hour for i in (0, 1, 2, 5, 6, 9)], dtype="datetime64[ms]")
+
+    gaps = find_gaps(present, step, start_ms=start, end_ms=start + 11 * hour)
+    assert gaps == [(start + 3 * hour, start + 4 * hour), (start + 7 * hour, start + 8 * hour),
+                    (start + 10 * hour, start + 11 * hour)]
+    # All three gaps fit into one 10-bar page; a 3-bar page limit needs one request per gap
+    assert plan_pages(gaps, step, page_bars=10) == [(start + 3 * hour, start + 11 * hour)]
+    assert len(plan_pages(gaps, step, page_bars=3)) == 3
+    assert len(plan_pages([(start, start + 24 * hour)], step, page_bars=10)) == 3
+
+
+def test_ring_buffer_wraparound_views_and_forming_bar():
+    buf = CandleRingBuffer(capacity=4)
+    for i in range(6):
+        buf.append(i * 60_000, i, i + 1, i - 1, i + 0.5, 10 * i)
+    v = buf.view()
+    assert list(v["ts"]) == [120_000, 180_000, 240_000, 300_000]
+    assert np.shares_memory(v["close"], buf._data)          # zero-copy window
+    assert list(buf.view(2)["open"]) == [4.0, 5.0]
+
+    buf.upsert(300_000, 5, 7, 4, 6.5, 99)                     # forming bar refresh
+    buf.ingest(np.array([300_000, 360_000]), np.array([[5, 6], [8, 7], [4, 5], [7.5, 6.5], [100, 5]], dtype=float))
+    v = buf.view()
+    assert len(buf) == 4 and list(v["ts"][-2:]) == [300_000, 360_000]
+    assert list(v["close"][-2:]) == [7.5, 6.5]
+    assert buf.nbytes == 2 * 4 * (8 + 5 * 8)
+
+    reg = RingBufferRegistry(capacity=4, dtype="float32")
+    df = buf.to_frame()
+    assert reg.ingest_frame("BTCUSDT", "1m", df) == 4
+    assert reg.get("BTCUSDT", "1m").view()["close"].dtype == np.float32
+
+
+def test_shared_cache_writer_publishes_and_reader_maps(tmp_path):
+    writer = SharedMarketCache(tmp_path, capacity=8, role="writer")
+    reader = SharedMarketCache(tmp_path, capacity=8, role="reader")
+    assert reader.read_candles("BTCUSDT", "1h") is None
+
+    ts = pd.date_range("2024-01-01", periods=5, freq="1h", tz="UTC")
+    df = pd.DataFrame({"ts": ts, "open": 1.0, "high": 2.0, "low": 0.5, "close": np.arange(5.0), "volume": 10.0})
+    assert writer.publish_candles("BTCUSDT", "1h", df) == 5
+    out = reader.read_candles_df("BTCUSDT", "1h", 3, max_age_seconds=60)
+    assert list(out["close"]) == [2.0, 3.0, 4.0] and out["ts"].iloc[-1] == ts[-1]
+    assert reader.read_candles("BTCUSDT", "1h", 6) is None            # not enough bars yet
+
+    # Forming bar refreshed by the writer is visible to the reader without remapping
+    writer.publish_candles("BTCUSDT", "1h", df.tail(1).assign(close=9.0))
+    assert reader.read_candles("BTCUSDT", "1h", 1)["close"][0] == 9.0
+
+    # A reader never returns a torn read while the writer holds the sequence odd
+    ring = writer._ring("BTCUSDT", "1h")
+    ring._hdr[_SEQ] += 1
+    assert reader.read_candles("BTCUSDT", "1h", 1) is None
+    ring._hdr[_SEQ] += 1
+
+    rows = [{"market": "BTCUSDT", "last_price": "60000"}]
+    assert writer.publish_tickers(rows)
+    assert reader.read_tickers(max_age_seconds=60) == rows
+
+
+def test_exchange_constraints_round_and_validate_batch(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'assets.db'}")
+    Base.metadata.create_all(engine)
+    idx = MarketIndex(lambda: MARKETS, cache_path=tmp_path / "idx.json", ttl_seconds=3600)
+    cons = ExchangeConstraints(index_fn=lambda: idx, engine=engine)
+    assert cons.sync() == 2
+
+    chk = cons.check(["BTC/USDT", "ETHINR", "BTCUSDT", "NEWCOIN"],
+                     qty=[0.0123456789, 0.3, 0.000001, 5.0], price=[65000.126, 250.4, 65000.0, 1.23456])
+    assert chk.qty.tolist() == [0.01234, 0.3, 0.0, 5.0]  # floored to the lot; 0.3/0.0001 does not lose a step
+    assert chk.price.tolist() == [65000.13, 250.0, 65000.0, 1.23456]
+    # ETH: 0.3 * 250 = 75 INR < 100 minimum; tiny BTC qty rounds to zero; unknown symbols pass unchanged
+    assert chk.ok.tolist() == [True, False, False, True]
+    assert "below minimum" in chk.reasons[1] and "below lot size" in chk.reasons[2]
+
+    # Index unavailable: constraints come back from the assets table
+    offline = ExchangeConstraints(index_fn=lambda: (_ for _ in ()).throw(RuntimeError("down")), engine=engine)
+    assert offline.sync() == 2 and offline.check(["ETHINR"], [1.23456], [250.0]).qty.tolist() == [1.2345]
+
+
+def test_side_cache_failure_keeps_fetched_candles():
+    from services.market_data import MarketDataService
+
+    class _BrokenWindows:
+        def ingest_frame(self, *a):
+            raise ValueError("ring buffer broken")
+
+    fetched = pd.DataFrame({"ts": pd.date_range("2024-06-01", periods=3, freq="1h", tz="UTC"), "open": [1.0] * 3,
+                            "high": [2.0] * 3, "low": [0.5] * 3, "close": [1.5, 1.6, 1.7], "volume": [1.0] * 3})
+    class _BrokenShared:
+        is_writer = True
+
+        def publish_candles(self, *a):
+            raise OSError("shm full")
+
+    svc = MarketDataService.__new__(MarketDataService)
+    svc.shared, svc.windows, svc._flight = None, _BrokenWindows(), SingleFlight()
+    svc._get_coindcx_candles_stored = lambda symbol, timeframe, limit: fetched
+    df = svc.get_candles_df("BTCUSDT", "1h", limit=3)
+    assert df["close"].tolist() == [1.5, 1.6, 1.7] and "warnings" not in df.attrs
+    # Same for a failing shared-memory publish
+    svc.shared, svc.windows = _BrokenShared(), RingBufferRegistry(capacity=8)
+    df = svc.get_candles_df("BTCUSDT", "1h", limit=3)
+    assert df["close"].tolist() == [1.5, 1.6, 1.7] and len(svc.windows.get("BTCUSDT", "1h")) == 3
+
+
+def test_ring_buffer_concurrent_ingest_stays_consistent():
+    from concurrent.futures import ThreadPoolExecutor
+    reg = RingBufferRegistry(capacity=64)
+    frames = [pd.DataFrame({"ts": pd.date_range("2024-06-01", periods=40 + k, freq="1h", tz="UTC"), "open": 1.0,
+                            "high": 2.0, "low": 0.5, "close": np.arange(40 + k, dtype=float), "volume": 1.0})
+              for k in range(8)]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda f: reg.ingest_frame("BTCUSDT", "1h", f), frames * 25))
+    v = reg.get("BTCUSDT", "1h").view()
+    # Every bar exactly once, in order, and the mirrored halves agree
+    assert len(v["ts"]) == 47 and (np.diff(v["ts"]) == 3_600_000).all() and v["close"].tolist() == list(range(47))
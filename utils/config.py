@@ -28,9 +28,131 @@ class Settings(BaseSettings):
 
     SCAN_INTERVAL_SECONDS: int = Field(default=300)
     MONITOR_INTERVAL_SECONDS: int = Field(default=10)
+    # interval: every SCAN_INTERVAL_SECONDS; bar_close: scan each timeframe just after its bars close (SCAN_SETTLE_SECONDS later);
+    # adaptive: every SCAN_ADAPTIVE_TICK_SECONDS scan the symbols due by volatility priority, within SCAN_BUDGET_PER_MINUTE
+    SCAN_SCHEDULE_MODE: str = Field(default="interval")
+    SCAN_TIMEFRAMES: str = Field(default="1h")
+    SCAN_SETTLE_SECONDS: int = Field(default=5)
+    SCAN_SETTLE_RETRY_SECONDS: int = Field(default=30)  # bar_close: re-fetch symbols whose new bar is not out yet for up to this long
+    SCAN_ADAPTIVE_TICK_SECONDS: int = Field(default=60)
+    SCAN_ADAPTIVE_UNIVERSE_SIZE: int = Field(default=60)
+    SCAN_BUDGET_PER_MINUTE: float = Field(default=20.0)   # symbol scans (one candle request each)
+    SCAN_MIN_INTERVAL_SECONDS: float = Field(default=60.0)    # hottest symbols
+    SCAN_MAX_INTERVAL_SECONDS: float = Field(default=1800.0)  # dormant symbols
+
+    # Sharded scanning through the scan_jobs table (workers: python -m engine --scan-worker)
+    SCAN_QUEUE_ENABLED: bool = Field(default=False)
+    SCAN_SHARD_SIZE: int = Field(default=5)
+    SCAN_LEASE_SECONDS: float = Field(default=60.0)
+    SCAN_MAX_ATTEMPTS: int = Field(default=3)
+    SCAN_POLL_SECONDS: float = Field(default=1.0)
+    SCAN_BATCH_TIMEOUT_SECONDS: float = Field(default=240.0)
 
     MAX_LEVERAGE: int = Field(default=3)
     RISK_PER_TRADE_PCT: float = Field(default=0.0075)
+
+    # Local on-disk caches (market metadata etc.)
+    CACHE_DIR: str = Field(default="./.cache")
+    MARKET_INDEX_TTL_SECONDS: int = Field(default=86400)
+
+    # CoinDCX request budgets (requests/second per endpoint class) and retry policy
+    RATE_LIMIT_PUBLIC_PER_SEC: float = Field(default=10.0)
+    RATE_LIMIT_ORDER_PER_SEC: float = Field(default=8.0)
+    RATE_LIMIT_ACCOUNT_PER_SEC: float = Field(default=4.0)
+    HTTP_MAX_RETRIES: int = Field(default=4)
+
+    # Shared HTTP connection pool
+    HTTP_TIMEOUT_SECONDS: float = Field(default=10.0)
+    HTTP_MAX_CONNECTIONS: int = Field(default=50)
+    HTTP_MAX_KEEPALIVE: int = Field(default=20)
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = Field(default=60.0)
+    HTTP2_ENABLED: bool = Field(default=False)  # requires the optional 'h2' package
+
+    # Historical candle files under data/ (float64|float32)
+    HISTORY_FLOAT_DTYPE: str = Field(default="float64")
+
+    # Candle history gap backfill
+    BACKFILL_INTERVAL_SECONDS: int = Field(default=3600)
+    BACKFILL_LOOKBACK_BARS: int = Field(default=400)
+    BACKFILL_CONCURRENCY: int = Field(default=4)
+
+    # In-memory rolling candle windows per (symbol, timeframe); storage is mirrored for zero-copy views:
+    # 2 * RING_BUFFER_BARS * (8 + 5 * itemsize) bytes per key (38.4 KB at 400 float64 bars, ~38 MB per 1000 keys)
+    RING_BUFFER_BARS: int = Field(default=400)
+    RING_BUFFER_DTYPE: str = Field(default="float64")  # float32 halves memory
+
+    # Cross-process candle/ticker cache (memory-mapped files under CACHE_DIR/shm)
+    SHM_CACHE_ENABLED: bool = Field(default=True)
+    SHM_CACHE_ROLE: str = Field(default="auto")  # auto (first process to lock writes) | writer | reader
+    SHM_CACHE_MAX_AGE_SECONDS: float = Field(default=30.0)
+
+    # Headless engine (python -m engine) local control API
+    ENGINE_API_HOST: str = Field(default="127.0.0.1")
+    ENGINE_API_PORT: int = Field(default=8765)
+    ENGINE_EMBEDDED_FALLBACK: bool = Field(default=True)  # UI runs the scheduler itself when no engine is up
+    ENGINE_API_TOKEN: str = Field(default="")  # shared secret for POSTs; empty: generated into ENGINE_API_TOKEN_FILE
+    ENGINE_API_TOKEN_FILE: str = Field(default=".engine_token")
+
+    # Stage timing spans (GET /metrics on the engine API, Risk Center diagnostics)
+    TRACING_ENABLED: bool = Field(default=True)
+    TRACING_MAX_SYMBOLS: int = Field(default=200)  # per-symbol series beyond this are folded into "_other"
+
+    # Profile the next PROFILE_RUNS runs of the listed jobs (e.g. "scan_job,monitor_job"); also armable from the Risk Center
+    PROFILE_JOBS: str = Field(default="")
+    PROFILE_RUNS: int = Field(default=1)
+    PROFILE_MODE: str = Field(default="cprofile")  # cprofile (exact, higher overhead) | sample (stack sampling)
+    PROFILE_TRACEMALLOC: bool = Field(default=False)
+    PROFILE_DIR: str = Field(default="./.cache/profiles")
+    PROFILE_TOP_N: int = Field(default=30)
+    PROFILE_SAMPLE_INTERVAL_SECONDS: float = Field(default=0.005)
+
+    # In-memory event/log rings for the UI and batched Alert persistence
+    EVENT_BUFFER_SIZE: int = Field(default=1000)
+    SIGNAL_LOG_BUFFER_SIZE: int = Field(default=1000)
+    ALERT_FLUSH_INTERVAL_SECONDS: float = Field(default=2.0)
+    ALERT_BATCH_SIZE: int = Field(default=200)  # flush early once this many alerts are waiting
+    ALERT_QUEUE_MAX: int = Field(default=10000)  # beyond this new alerts are dropped (and counted), never blocking
+
+    # Concurrent order submission in allocate_and_execute
+    ORDER_SUBMIT_CONCURRENCY: int = Field(default=8)
+    ORDER_SUBMIT_TIMEOUT_SECONDS: float = Field(default=10.0)  # per order; unanswered orders are recorded as "unknown"
+
+    # Live order status reconciliation (polls faster the more orders are open)
+    RECONCILE_MIN_INTERVAL_SECONDS: float = Field(default=2.0)   # at RECONCILE_BUSY_ORDERS or more open orders
+    RECONCILE_MAX_INTERVAL_SECONDS: float = Field(default=30.0)  # one open order (or none)
+    RECONCILE_BUSY_ORDERS: int = Field(default=20)
+    RECONCILE_BATCH_SIZE: int = Field(default=100)  # ids per status request / orders per futures page
+    RECONCILE_MAX_PAGES: int = Field(default=5)
+    RECONCILE_UNKNOWN_GRACE_SECONDS: float = Field(default=300.0)  # timed-out orders never found are marked rejected
+
+    # Kill switch: engaging it cancels open orders and closes positions concurrently
+    KILL_SWITCH_FLATTEN: bool = Field(default=True)
+    KILL_SWITCH_CONCURRENCY: int = Field(default=16)
+    KILL_SWITCH_TIMEOUT_SECONDS: float = Field(default=5.0)
+
+    # Pre-trade risk gate: orders whose cap headroom is below this fraction of the request are denied, not resized
+    RISK_MIN_RESIZE_FRACTION: float = Field(default=0.1)
+
+    # Rolling returns correlation for the correlation cap (exponentially weighted, updated as scanned bars close)
+    CORRELATION_TIMEFRAME: str = Field(default="1h")
+    CORRELATION_HALFLIFE_BARS: float = Field(default=48.0)
+    CORRELATION_MIN_OBS: int = Field(default=24)  # pairs with fewer shared bars are not capped
+    CORRELATION_WARMUP_BARS: int = Field(default=200)
+    CORRELATION_MAX_SYMBOLS: int = Field(default=600)
+    CORRELATION_STORE_REFRESH_SECONDS: float = Field(default=60.0)  # how often symbols not scanned here are read from the candle store
+
+    # Allocation across signals within the spot/futures budgets: risk_parity | mean_variance | score
+    ALLOCATION_METHOD: str = Field(default="risk_parity")
+    ALLOCATION_SHRINKAGE: float = Field(default=0.3)  # weight of the constant-variance target in the covariance
+    ALLOCATION_RISK_AVERSION: float = Field(default=5.0)  # mean_variance only
+
+    # Volatility circuit breaker (threshold: vol_spike_atr_mult in the Risk Center)
+    VOL_BREAKER_TIMEFRAME: str = Field(default="1h")
+    VOL_BREAKER_ATR_PERIOD: int = Field(default=14)
+    VOL_BREAKER_STORE_REFRESH_SECONDS: float = Field(default=60.0)  # how often symbols without a local window are read from the candle store
+    VOL_BREAKER_COOLDOWN_SECONDS: float = Field(default=3600.0)  # no new entries on a tripped symbol for this long
+    VOL_BREAKER_TIGHTEN_STOPS: bool = Field(default=False)
+    VOL_BREAKER_STOP_ATR: float = Field(default=1.0)  # tightened stop distance from price, in ATRs
     #TODO check/explain below
     class Config:
         env_file = ".env"
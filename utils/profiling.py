@@ -0,0 +1,198 @@
+#Description: On-demand profiling of scheduler jobs: cProfile or a stdlib sampling profiler, optional tracemalloc, artifacts on disk.
+
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Dict, List
+
+from utils.config import settings
+from utils.logging import logger
+
+MODES = ("cprofile", "sample")
+
+
+class StackSampler:
+    """
+    Samples one thread's Python stack every `interval` seconds from a helper thread. Overhead is bounded
+    by the sampling rate rather than the call rate, so it is the safer choice on a live engine.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_firstlineno}({code.co_name})")
+                frame = frame.f_back
+            # Stored root first, as flame graphs expect
+            self.stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self) -> str:
+        """Collapsed stacks (flamegraph.pl / speedscope input)."""
+        return "".join(f"{';'.join(s)} {n}\n" for s, n in self.stacks.most_common())
+
+    def summary(self, top: int) -> str:
+        own: Counter = Counter()
+        cum: Counter = Counter()
+        for stack, n in self.stacks.items():
+            own[stack[-1]] += n
+            for fn in set(stack):
+                cum[fn] += n
+        total = max(self.samples, 1)
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f} ms", "", "Top functions by own time:"]
+        lines += [f"{n / total * 100:6.1f}%  {fn}" for fn, n in own.most_common(top)]
+        lines += ["", "Top functions by cumulative time:"]
+        lines += [f"{n / total * 100:6.1f}%  {fn}" for fn, n in cum.most_common(top)]
+        return "\n".join(lines) + "\n"
+
+
+class JobProfiler:
+    """
+    Profiles the next N runs of selected jobs. Armed at startup from PROFILE_JOBS/PROFILE_RUNS, or at
+    runtime through arm() (engine control API / Risk Center). Each profiled run writes
+    <job>_<UTC timestamp>.{prof|folded} plus a .txt top-functions summary (and tracemalloc top lines)
+    under PROFILE_DIR.
+
+    Only one run is profiled at a time: the interpreter allows a single active cProfile, and a second
+    job starting meanwhile simply runs unprofiled and keeps its remaining count.
+    """
+
+    def __init__(self, out_dir: str | None = None):
+        self.out_dir = out_dir or settings.PROFILE_DIR
+        self._lock = Lock()
+        self._active = Lock()
+        self._remaining: Dict[str, int] = {}
+        self.mode = "cprofile"
+        self.tracemalloc = False
+        self._artifacts: List[dict] = []
+
+    def arm(self, jobs: List[str], runs: int = 1, mode: str = "cprofile", tracemalloc_enabled: bool = False) -> None:
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode!r}; expected one of {MODES}")
+        with self._lock:
+            self.mode = mode
+            self.tracemalloc = tracemalloc_enabled
+            self._remaining = {j: int(runs) for j in jobs if int(runs) > 0}
+        logger.info(f"Profiler armed: {self._remaining} ({mode}{', tracemalloc' if tracemalloc_enabled else ''})")
+
+    def disarm(self) -> None:
+        with self._lock:
+            self._remaining.clear()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"remaining": dict(self._remaining), "mode": self.mode, "tracemalloc": self.tracemalloc,
+                    "artifacts": list(self._artifacts[-10:])}
+
+    def _take(self, job: str) -> bool:
+        with self._lock:
+            if self._remaining.get(job, 0) <= 0:
+                return False
+            if not self._active.acquire(blocking=False):
+                return False
+            self._remaining[job] -= 1
+            if not self._remaining[job]:
+                del self._remaining[job]
+            return True
+
+    @contextmanager
+    def profile(self, job: str):
+        """Wrap one job run; a no-op unless the job is armed."""
+        if not self._remaining or not self._take(job):
+            yield
+            return
+        mode, with_malloc = self.mode, self.tracemalloc
+        started_malloc = with_malloc and not tracemalloc.is_tracing()
+        if started_malloc:
+            tracemalloc.start(25)
+        prof = sampler = None
+        t0 = time.perf_counter()
+        try:
+            if mode == "sample":
+                sampler = StackSampler(threading.get_ident(), settings.PROFILE_SAMPLE_INTERVAL_SECONDS)
+                sampler.start()
+            else:
+                prof = cProfile.Profile()
+                prof.enable()
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            try:
+                if prof is not None:
+                    prof.disable()
+                if sampler is not None:
+                    sampler.stop()
+                snapshot = tracemalloc.take_snapshot() if with_malloc else None
+                if started_malloc:
+                    tracemalloc.stop()
+                self._write(job, elapsed, prof, sampler, snapshot)
+            except Exception as e:
+                logger.warning(f"Writing profile for {job} failed: {e}")
+            finally:
+                self._active.release()
+
+    def _write(self, job: str, elapsed: float, prof, sampler, snapshot) -> None:
+        os.makedirs(self.out_dir, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+        base = os.path.join(self.out_dir, f"{job}_{stamp}")
+        top = settings.PROFILE_TOP_N
+        files = []
+        parts = [f"{job} run took {elapsed:.3f}s", ""]
+        if prof is not None:
+            prof.dump_stats(base + ".prof")
+            files.append(base + ".prof")
+            buf = io.StringIO()
+            stats = pstats.Stats(prof, stream=buf).strip_dirs()
+            stats.sort_stats("cumulative").print_stats(top)
+            stats.sort_stats("tottime").print_stats(top)
+            parts.append(buf.getvalue())
+        if sampler is not None:
+            with open(base + ".folded", "w") as f:
+                f.write(sampler.folded())
+            files.append(base + ".folded")
+            parts.append(sampler.summary(top))
+        if snapshot is not None:
+            snapshot.dump(base + ".tracemalloc")
+            files.append(base + ".tracemalloc")
+            parts.append("Top allocation sites (live at end of run):")
+            parts += [str(s) for s in snapshot.statistics("lineno")[:top]]
+        with open(base + ".txt", "w") as f:
+            f.write("\n".join(parts) + "\n")
+        files.append(base + ".txt")
+        with self._lock:
+            self._artifacts.append({"job": job, "ts": stamp, "seconds": round(elapsed, 3), "files": files})
+        logger.info(f"Profile of {job} ({elapsed:.2f}s) written to {base}.txt")
+
+
+profiler = JobProfiler()
+if settings.PROFILE_JOBS:
+    profiler.arm([j.strip() for j in settings.PROFILE_JOBS.split(",") if j.strip()], settings.PROFILE_RUNS,
+                 settings.PROFILE_MODE, settings.PROFILE_TRACEMALLOC)
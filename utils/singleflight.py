@@ -0,0 +1,116 @@
+#Description: Singleflight request coalescing; concurrent identical calls (threads or asyncio) share one in-flight execution.
+
+import asyncio
+import inspect
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    __slots__ = ("event", "result", "error", "loop", "future")
+
+    def __init__(self):
+        self.event = Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.future: asyncio.Future | None = None
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls by key.
+
+    The first caller for a key (the leader) runs the function; callers arriving while it is in flight
+    block (threads) or await (asyncio) and receive the same result or exception. Nothing is cached
+    once the call completes, so the next caller after completion triggers a fresh execution.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0, "errors": 0}
+
+    def _join(self, key: Hashable) -> tuple[_Call, bool]:
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats["coalesced"] += 1
+                return call, False
+            call = _Call()
+            self._calls[key] = call
+            self._stats["executions"] += 1
+            return call, True
+
+    def _finish(self, key: Hashable, call: _Call) -> None:
+        with self._lock:
+            if call.error is not None:
+                self._stats["errors"] += 1
+            self._calls.pop(key, None)
+        call.event.set()
+
+    @staticmethod
+    def _outcome(call: _Call) -> Any:
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) once per key among concurrent callers (blocking)."""
+        call, leader = self._join(key)
+        if not leader:
+            call.event.wait()
+            return self._outcome(call)
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+        finally:
+            self._finish(key, call)
+        return self._outcome(call)
+
+    async def do_async(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Async variant. fn may be a coroutine function or a plain callable (run in a worker thread).
+        Shares in-flight calls with do() for the same key.
+        """
+        loop = asyncio.get_running_loop()
+        call, leader = self._join(key)
+        if not leader:
+            if call.future is not None and call.loop is loop:
+                return await asyncio.shield(call.future)
+            # Leader lives in another thread or event loop
+            await loop.run_in_executor(None, call.event.wait)
+            return self._outcome(call)
+
+        call.loop = loop
+        call.future = loop.create_future()
+        try:
+            if inspect.iscoroutinefunction(fn):
+                call.result = await fn(*args, **kwargs)
+            else:
+                call.result = await asyncio.to_thread(fn, *args, **kwargs)
+        except BaseException as e:
+            call.error = e
+        finally:
+            # Same-loop waiters await the future; resolve it before waking thread waiters.
+            if isinstance(call.error, asyncio.CancelledError):
+                call.future.cancel()
+            elif call.error is not None:
+                call.future.set_exception(call.error)
+                call.future.exception()  # mark retrieved so asyncio does not warn when nobody waited
+            else:
+                call.future.set_result(call.result)
+            self._finish(key, call)
+        return self._outcome(call)
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["in_flight"] = len(self._calls)
+        return out
@@ -0,0 +1,197 @@
+#Description: Lightweight stage timing: span context manager/decorator, per-stage and per-symbol histograms, Prometheus text export.
+
+import bisect
+import functools
+import time
+from contextvars import ContextVar
+from threading import Lock
+from typing import Dict, List, Tuple
+
+from utils.config import settings
+
+# Upper bounds (seconds) of the histogram buckets; the last bucket is +Inf
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+OTHER_SYMBOL = "_other"
+
+# Symbol of the enclosing span, so nested stages (HTTP, parsing, DB) are attributed to it
+_current_symbol: ContextVar[str | None] = ContextVar("trace_symbol", default=None)
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimate from bucket upper bounds (what Prometheus' histogram_quantile does, without interpolation)."""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return BUCKETS[i] if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("tracer", "stage", "symbol", "t0", "token")
+
+    def __init__(self, tracer: "Tracer", stage: str, symbol: str | None):
+        self.tracer, self.stage, self.symbol = tracer, stage, symbol
+
+    def __enter__(self):
+        self.token = _current_symbol.set(self.symbol) if self.symbol is not None else None
+        if self.symbol is None:
+            self.symbol = _current_symbol.get()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.t0
+        if self.token is not None:
+            _current_symbol.reset(self.token)
+        self.tracer.record(self.stage, elapsed, self.symbol, error=exc_type is not None)
+        return False
+
+
+class Tracer:
+    """
+    Collects span durations into fixed-bucket histograms per stage and per (stage, symbol).
+    Disabled tracers hand out a shared no-op span, so instrumented code pays one attribute check.
+    Per-symbol series are capped at max_symbols; later symbols are folded into "_other".
+    """
+
+    def __init__(self, enabled: bool = True, max_symbols: int = 200):
+        self.enabled = enabled
+        self.max_symbols = max_symbols
+        self._lock = Lock()
+        self._stages: Dict[str, Histogram] = {}
+        self._symbols: Dict[Tuple[str, str], Histogram] = {}
+        self._known_symbols: set = set()
+        self._errors: Dict[str, int] = {}
+
+    def span(self, stage: str, symbol: str | None = None):
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, stage, symbol)
+
+    def traced(self, stage: str):
+        """Decorator form of span()."""
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                with _Span(self, stage, None):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    def record(self, stage: str, seconds: float, symbol: str | None = None, error: bool = False) -> None:
+        with self._lock:
+            h = self._stages.get(stage)
+            if h is None:
+                h = self._stages[stage] = Histogram()
+            h.observe(seconds)
+            if error:
+                self._errors[stage] = self._errors.get(stage, 0) + 1
+            if symbol is not None:
+                if symbol not in self._known_symbols:
+                    if len(self._known_symbols) >= self.max_symbols:
+                        symbol = OTHER_SYMBOL
+                    else:
+                        self._known_symbols.add(symbol)
+                key = (stage, symbol)
+                hs = self._symbols.get(key)
+                if hs is None:
+                    hs = self._symbols[key] = Histogram()
+                hs.observe(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+            self._symbols.clear()
+            self._known_symbols.clear()
+            self._errors.clear()
+
+    # -----------------------
+    # Export
+    # -----------------------
+    @staticmethod
+    def _row(h: Histogram) -> dict:
+        return {
+            "count": h.count,
+            "mean_ms": round(h.sum / h.count * 1000, 3) if h.count else 0.0,
+            "p50_ms": round(h.quantile(0.5) * 1000, 3),
+            "p95_ms": round(h.quantile(0.95) * 1000, 3),
+            "max_ms": round(h.max * 1000, 3),
+            "total_s": round(h.sum, 3),
+        }
+
+    def stage_stats(self) -> List[dict]:
+        with self._lock:
+            rows = [{"stage": s, **self._row(h), "errors": self._errors.get(s, 0)} for s, h in self._stages.items()]
+        return sorted(rows, key=lambda r: r["total_s"], reverse=True)
+
+    def symbol_stats(self, top: int = 20) -> List[dict]:
+        """Slowest (stage, symbol) series by total time."""
+        with self._lock:
+            rows = [{"stage": st, "symbol": sym, **self._row(h)} for (st, sym), h in self._symbols.items()]
+        return sorted(rows, key=lambda r: r["total_s"], reverse=True)[:top]
+
+    def render_prometheus(self, prefix: str = "trader") -> str:
+        lines: List[str] = []
+
+        def _hist(name: str, series: List[Tuple[str, Histogram]]):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, h in series:
+                cum = 0
+                for bound, c in zip(BUCKETS, h.counts):
+                    cum += c
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cum}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {h.count}')
+                lines.append(f"{name}_sum{{{labels}}} {h.sum:.6f}")
+                lines.append(f"{name}_count{{{labels}}} {h.count}")
+
+        with self._lock:
+            stages = [(f'stage="{s}"', h) for s, h in sorted(self._stages.items())]
+            symbols = [(f'stage="{st}",symbol="{sym}"', h) for (st, sym), h in sorted(self._symbols.items())]
+            errors = sorted(self._errors.items())
+        lines.append(f"# HELP {prefix}_stage_seconds Duration of instrumented stages.")
+        _hist(f"{prefix}_stage_seconds", stages)
+        lines.append(f"# HELP {prefix}_symbol_stage_seconds Duration of instrumented stages per symbol.")
+        _hist(f"{prefix}_symbol_stage_seconds", symbols)
+        lines.append(f"# HELP {prefix}_stage_errors_total Spans that exited with an exception.")
+        lines.append(f"# TYPE {prefix}_stage_errors_total counter")
+        lines.extend(f'{prefix}_stage_errors_total{{stage="{s}"}} {n}' for s, n in errors)
+        return "\n".join(lines) + "\n"
+
+
+tracer = Tracer(enabled=settings.TRACING_ENABLED, max_symbols=settings.TRACING_MAX_SYMBOLS)
+span = tracer.span
+traced = tracer.traced